@@ -0,0 +1,83 @@
+from fastapi import APIRouter, HTTPException, Path, Query
+from fastapi.responses import PlainTextResponse
+from ..models.base import ResponseModel
+from ..db.slowlog import SlowQueries, SLOW_QUERY_MS, SLOW_QUERY_EXPLAIN_RATE, SLOW_QUERY_LOG_SIZE
+from ..db.profiling import Profiler, PROFILING_ENABLED, PROFILE_HEADER
+
+router = APIRouter()
+
+@router.get("/slow-queries",
+    response_model=ResponseModel,
+    responses={
+        200: {"description": "Slow query log retrieved successfully"},
+        500: {"description": "Internal server error"}
+    })
+def get_slow_queries(
+    limit: int = Query(SLOW_QUERY_LOG_SIZE, ge=1, le=SLOW_QUERY_LOG_SIZE, description="Most entries returned, newest first"),
+    plans: bool = Query(True, description="Include captured EXPLAIN (ANALYZE, BUFFERS) plans")
+):
+    """Get the most recent statements slower than SLOW_QUERY_MS and their sampled plans"""
+    try:
+        entries = SlowQueries.entries(limit, plans)
+        return ResponseModel(
+            success=True,
+            message="Slow query log retrieved successfully",
+            data=entries,
+            meta={
+                "count": len(entries),
+                "threshold_ms": SLOW_QUERY_MS,
+                "explain_rate": SLOW_QUERY_EXPLAIN_RATE
+            }
+        )
+
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete("/slow-queries",
+    response_model=ResponseModel,
+    responses={
+        200: {"description": "Slow query log cleared"}
+    })
+def clear_slow_queries():
+    """Empty the slow query log, e.g. before checking a fix"""
+    SlowQueries.clear()
+    return ResponseModel(success=True, message="Slow query log cleared")
+
+@router.get("/profiles",
+    response_model=ResponseModel,
+    responses={
+        200: {"description": "Request profiles retrieved successfully"}
+    })
+def get_profiles():
+    """List the kept request profiles, newest first, without their stacks"""
+    profiles = [profile.summary(stacks=False) for profile in Profiler.profiles()]
+    return ResponseModel(
+        success=True,
+        message="Request profiles retrieved successfully",
+        data=profiles,
+        meta={"count": len(profiles), "enabled": PROFILING_ENABLED, "header": PROFILE_HEADER}
+    )
+
+@router.get("/profiles/{profile_id}",
+    responses={
+        200: {"description": "Request profile"},
+        400: {"description": "Invalid format"},
+        404: {"description": "Profile not found"}
+    })
+def get_profile(
+    profile_id: str = Path(..., description="ID from the X-Profile-ID response header"),
+    format: str = Query("json", description="json, or collapsed for flame graph tools")
+):
+    """Get a request's profile: hottest functions, SQL breakdown and sampled stacks"""
+    if format not in ("json", "collapsed"):
+        raise HTTPException(status_code=400, detail="Invalid format, expected json or collapsed")
+    profile = Profiler.get(profile_id)
+    if profile is None:
+        raise HTTPException(status_code=404, detail=f"Profile {profile_id} not found")
+    if format == "collapsed":
+        return PlainTextResponse(profile.collapsed())
+    return ResponseModel(
+        success=True,
+        message="Request profile retrieved successfully",
+        data=profile.summary()
+    )
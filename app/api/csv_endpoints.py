@@ -1,6 +1,7 @@
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, Header, HTTPException, Query
 from ..models.base import ResponseModel
 from ..crud.csv_import import CSVImport
+from .endpoints import TENANT_HEADER
 from typing import Optional, Dict
 
 router = APIRouter()
@@ -40,14 +41,18 @@ async def import_platform_config(
     responses={
         200: {"description": "Revenue data imported successfully"},
         400: {"description": "Invalid file path or format"},
+        429: {"description": "The tenant's import slots are busy"},
         500: {"description": "Internal server error"}
     })
-async def import_revenue_data(
-    file_path: str = Query(..., description="Path to RevenueSheet.txt file")
+def import_revenue_data(
+    file_path: str = Query(..., description="Path to RevenueSheet.txt file"),
+    tenant_id: Optional[int] = Header(None, alias=TENANT_HEADER, gt=0, description="Tenant importing the file")
 ):
     """Import revenue data from CSV file"""
     try:
-        result = CSVImport.import_revenue_from_csv(file_path)
+        result = CSVImport.import_revenue_from_csv(file_path, tenant_id)
+        if result.get("throttled"):
+            raise HTTPException(status_code=429, detail=result["message"])
         if not result["success"]:
             raise HTTPException(status_code=400, detail=result["message"])
             
@@ -57,7 +62,10 @@ async def import_revenue_data(
             data={
                 "rows_processed": result["rows_processed"],
                 "processing_stats": result.get("processing_stats", {}),
-                "view_refresh": result.get("view_refresh", {})
+                "view_refresh": result.get("view_refresh", {}),
+                "cache_warming": result.get("cache_warming", {}),
+                "job_id": result["job_id"],
+                "telemetry": result["telemetry"]
             }
         )
         
@@ -1,16 +1,30 @@
-from fastapi import APIRouter, Depends, HTTPException, Request, Path
+from fastapi import APIRouter, Depends, Header, HTTPException, Request, Path, Query
 from typing import List, Optional
 from datetime import datetime
-from ..models.base import ResponseModel
+from ..models.base import ResponseModel, EncodedRows
 from ..models.revenue import (
     RevenueOverview, ArtistPerformance, PlatformMetrics,
-    PlatformRevenue, LabelPerformance, TopArtist, GeographicMetrics, PlatformLabelMatrix
+    PlatformRevenue, LabelPerformance, ArtistEarnings, TopArtist, GeographicMetrics, PlatformLabelMatrix,
+    TimeSeriesPoint, RollupRow
 )
 from ..db.database import get_db, execute_query, execute_one
 from ..crud.queries import Queries
+from ..crud.aggregates import AggregateRouter
+from ..crud.periods import period_filters, parse_period, to_period, add_months, months_between, current_period
+from ..crud.timeseries import TimeSeries, MAX_MONTHS
+from ..crud.rollup import Rollup, GROUPABLE
+from ..crud.sketches import DistinctCounts, RELATIVE_ERROR
+from ..crud.pagination import InvalidCursor
+from ..crud.cache import cached
 
 router = APIRouter()
 
+# Most artist IDs accepted by the batch earnings endpoint
+MAX_BATCH_ARTISTS = 500
+
+# Header scoping analytics to one tenant's data; without it they cover the whole platform
+TENANT_HEADER = "X-Tenant-ID"
+
 def validate_month(month: str) -> str:
     """Validate month format"""
     valid_months = {'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 
@@ -26,26 +40,116 @@ def validate_year(year: int) -> int:
         raise HTTPException(status_code=400, detail="Year out of valid range")
     return year
 
+def validate_period(value: Optional[str]) -> Optional[int]:
+    """Validate a YYYY-MM period and convert it to a period key"""
+    if value is None:
+        return None
+    try:
+        return parse_period(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid period format, expected YYYY-MM")
+
+def parse_fields(fields: Optional[str], model) -> Optional[tuple]:
+    """Validate a comma-separated `fields` projection against a response model"""
+    if not fields:
+        return None
+    names = tuple(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in names if name not in model.model_fields]
+    if unknown or not names:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid fields: {', '.join(unknown)}; expected any of {', '.join(model.model_fields)}"
+        )
+    return names
+
+# Tenant header of endpoints served platform-wide only: their sources
+# (platform_config, revenue_rollup, distinct_sketch) carry no tenant key
+PLATFORM_WIDE_TENANT = f"Not supported: platform-wide only, requests sending {TENANT_HEADER} are rejected with 400"
+
+def platform_wide(tenant_id: Optional[int]):
+    """Reject tenant-scoped requests to endpoints only served platform-wide"""
+    if tenant_id is not None:
+        raise HTTPException(status_code=400, detail=f"This endpoint is not available per tenant, omit {TENANT_HEADER}")
+
+def default_period_filters(
+    year: Optional[int],
+    month: Optional[str],
+    period_from: Optional[str],
+    period_to: Optional[str]
+) -> dict:
+    """Period filters defaulting to the current year and month when no range is given"""
+    if period_from is None and period_to is None:
+        year = year or datetime.now().year
+        month = month or datetime.now().strftime('%b')
+    return period_filters(year, month, validate_period(period_from), validate_period(period_to))
+
+def time_series_lookback(params: dict) -> int:
+    """Months before `from` that a time series request reads, for its cache key"""
+    return TimeSeries.lookback(params.get("deltas", False), params.get("rolling"))
+
+def time_series_response(
+    entity: str,
+    key,
+    period_from: Optional[str],
+    period_to: Optional[str],
+    deltas: bool,
+    rolling: Optional[int],
+    tenant_id: Optional[int] = None
+) -> ResponseModel:
+    """Shared body of the time-series endpoints; defaults to the last 12 months"""
+    try:
+        last = validate_period(period_to) or current_period()
+        first = validate_period(period_from) or add_months(last, -11)
+        if not 0 <= months_between(first, last) < MAX_MONTHS:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid period range, expected from <= to and at most {MAX_MONTHS} months"
+            )
+
+        with get_db() as conn:
+            rows, source = TimeSeries.execute(conn, entity, key, first, last, deltas, rolling, tenant_id)
+            if not any(row["total_plays"] or row["total_revenue"] for row in rows):
+                return ResponseModel(
+                    success=False,
+                    message="No time series data found"
+                )
+
+            return ResponseModel(
+                success=True,
+                message="Time series retrieved successfully",
+                data=[TimeSeriesPoint(**row) for row in rows],
+                meta={"source": source, "from": first, "to": last}
+            )
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/revenue/overview/{year}/{month}", 
     response_model=ResponseModel,
     responses={
         200: {"description": "Revenue overview retrieved successfully"},
-        400: {"description": "Invalid year or month format"},
+        400: {"description": "Invalid year or month format, or sent with X-Tenant-ID"},
         404: {"description": "No data found for specified period"},
         500: {"description": "Internal server error"}
     })
-async def get_revenue_overview(
+@cached("/revenue/overview/{year}/{month}")
+def get_revenue_overview(
     year: int = Path(..., description="Year (YYYY)", example=2025),
-    month: str = Path(..., description="Month (Jan-Dec)", example="Jan")
+    month: str = Path(..., description="Month (Jan-Dec)", example="Jan"),
+    tenant_id: Optional[int] = Header(None, alias=TENANT_HEADER, gt=0, description=PLATFORM_WIDE_TENANT)
 ):
-    """Get revenue overview for specified month"""
+    """Get revenue overview for specified month, platform-wide only"""
     try:
+        platform_wide(tenant_id)
         year = validate_year(year)
         month = validate_month(month)
         
+        period = {"period": to_period(year, month)}
         with get_db() as conn:
             # Validate period exists
-            exists = execute_one(conn, Queries.validate_month(), {"year": year, "month": month})
+            exists = execute_one(conn, Queries.validate_month(), period, shared=True)
             if not exists or not exists['exists']:
                 return ResponseModel(
                     success=False,
@@ -53,7 +157,7 @@ async def get_revenue_overview(
                 )
 
             # Get revenue overview
-            data = execute_one(conn, Queries.revenue_overview(), {"year": year, "month": month})
+            data = execute_one(conn, Queries.revenue_overview(), period, shared=True)
             return ResponseModel(
                 success=True,
                 message="Revenue overview retrieved successfully",
@@ -73,14 +177,16 @@ async def get_revenue_overview(
         404: {"description": "Artist not found"},
         500: {"description": "Internal server error"}
     })
-async def get_artist_performance(
-    artist_id: int = Path(..., description="Artist ID", example=1, gt=0)
+@cached("/artist/{artist_id}/performance")
+def get_artist_performance(
+    artist_id: int = Path(..., description="Artist ID", example=1, gt=0),
+    tenant_id: Optional[int] = Header(None, alias=TENANT_HEADER, gt=0, description="Scope to one tenant's data")
 ):
     """Get artist performance metrics"""
     try:
         with get_db() as conn:
             # Validate artist exists
-            exists = execute_one(conn, Queries.validate_artist(), {"artist_id": artist_id})
+            exists = execute_one(conn, Queries.validate_artist(), {"artist_id": artist_id, "tenant_id": tenant_id}, shared=True)
             if not exists or not exists['exists']:
                 return ResponseModel(
                     success=False,
@@ -88,8 +194,11 @@ async def get_artist_performance(
                 )
 
             # Get artist performance
-            data = execute_one(conn, Queries.artist_performance(), {"artist_id": artist_id})
-            if not data:
+            rows, source = AggregateRouter.execute(conn, "artist_performance", {
+                "artist_id": artist_id,
+                "tenant_id": tenant_id
+            })
+            if not rows:
                 return ResponseModel(
                     success=False,
                     message="No performance data found for artist"
@@ -98,7 +207,8 @@ async def get_artist_performance(
             return ResponseModel(
                 success=True,
                 message="Artist performance data retrieved successfully",
-                data=ArtistPerformance(**data)
+                data=ArtistPerformance(**rows[0]),
+                meta={"source": source}
             )
 
     except Exception as e:
@@ -108,14 +218,19 @@ async def get_artist_performance(
     response_model=ResponseModel,
     responses={
         200: {"description": "Platform metrics retrieved successfully"},
+        400: {"description": "Sent with X-Tenant-ID"},
         404: {"description": "No platform metrics available"},
         500: {"description": "Internal server error"}
     })
-async def get_platform_metrics():
-    """Get performance metrics for all platforms"""
+@cached("/platform/metrics")
+def get_platform_metrics(
+    tenant_id: Optional[int] = Header(None, alias=TENANT_HEADER, gt=0, description=PLATFORM_WIDE_TENANT)
+):
+    """Get performance metrics for all platforms, platform-wide only"""
     try:
+        platform_wide(tenant_id)
         with get_db() as conn:
-            data = execute_query(conn, Queries.platform_metrics())
+            data = execute_query(conn, Queries.platform_metrics(), shared=True)
             if not data:
                 return ResponseModel(
                     success=False,
@@ -128,6 +243,8 @@ async def get_platform_metrics():
                 data=[PlatformMetrics(**row) for row in data]
             )
 
+    except HTTPException as he:
+        raise he
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -139,10 +256,14 @@ async def get_platform_metrics():
         404: {"description": "Artist not found"},
         500: {"description": "Internal server error"}
     })
-async def get_artist_earnings(
+@cached("/artists/{artist_id}/earnings")
+def get_artist_earnings(
     artist_id: int = Path(..., description="Artist ID", example=48, gt=0),
     year: Optional[int] = None,
-    month: Optional[str] = None
+    month: Optional[str] = None,
+    period_from: Optional[str] = Query(None, alias="from", description="First period (YYYY-MM)"),
+    period_to: Optional[str] = Query(None, alias="to", description="Last period (YYYY-MM)"),
+    tenant_id: Optional[int] = Header(None, alias=TENANT_HEADER, gt=0, description="Scope to one tenant's data")
 ):
     """Get monthly earnings metrics for an artist"""
     try:
@@ -150,10 +271,11 @@ async def get_artist_earnings(
             year = validate_year(year)
         if month:
             month = validate_month(month)
+        periods = period_filters(year, month, validate_period(period_from), validate_period(period_to))
             
         with get_db() as conn:
             # Validate artist exists
-            exists = execute_one(conn, Queries.validate_artist(), {"artist_id": artist_id})
+            exists = execute_one(conn, Queries.validate_artist(), {"artist_id": artist_id, "tenant_id": tenant_id}, shared=True)
             if not exists or not exists['exists']:
                 return ResponseModel(
                     success=False,
@@ -161,12 +283,12 @@ async def get_artist_earnings(
                 )
 
             # Get artist performance which includes earnings data
-            data = execute_one(conn, Queries.artist_performance(), {
+            rows, source = AggregateRouter.execute(conn, "artist_performance", {
                 "artist_id": artist_id,
-                "year": year,
-                "month": month
+                **periods,
+                "tenant_id": tenant_id
             })
-            if not data:
+            if not rows:
                 return ResponseModel(
                     success=False,
                     message="No earnings data found for artist"
@@ -175,7 +297,8 @@ async def get_artist_earnings(
             return ResponseModel(
                 success=True,
                 message="Artist earnings retrieved successfully",
-                data=ArtistPerformance(**data)
+                data=ArtistPerformance(**rows[0]),
+                meta={"source": source}
             )
 
     except HTTPException as he:
@@ -183,6 +306,79 @@ async def get_artist_earnings(
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/artists/earnings",
+    response_model=ResponseModel,
+    responses={
+        200: {"description": "Artist earnings retrieved, keyed by artist ID"},
+        400: {"description": "Invalid artist IDs or date parameters"},
+        500: {"description": "Internal server error"}
+    })
+@cached("/artists/earnings")
+def get_artists_earnings(
+    artist_ids: str = Query(..., description=f"Comma-separated artist IDs (at most {MAX_BATCH_ARTISTS})", example="48,52"),
+    year: Optional[int] = None,
+    month: Optional[str] = None,
+    period_from: Optional[str] = Query(None, alias="from", description="First period (YYYY-MM)"),
+    period_to: Optional[str] = Query(None, alias="to", description="Last period (YYYY-MM)"),
+    tenant_id: Optional[int] = Header(None, alias=TENANT_HEADER, gt=0, description="Scope to one tenant's data")
+):
+    """Get earnings for many artists with one query; unknown IDs are reported inline"""
+    try:
+        try:
+            ids = list(dict.fromkeys(int(value) for value in artist_ids.split(",") if value.strip()))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid artist IDs, expected comma-separated integers")
+        if not ids or len(ids) > MAX_BATCH_ARTISTS or min(ids) <= 0:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Expected 1 to {MAX_BATCH_ARTISTS} positive artist IDs"
+            )
+        if year:
+            year = validate_year(year)
+        if month:
+            month = validate_month(month)
+        periods = period_filters(year, month, validate_period(period_from), validate_period(period_to))
+
+        with get_db() as conn:
+            existing = {
+                row["artist_id"]
+                for row in execute_query(conn, Queries.existing_artists(), {"artist_ids": ids, "tenant_id": tenant_id}, shared=True)
+            }
+            rows, source = AggregateRouter.execute(conn, "artist_performance_batch", {
+                "artist_ids": ids,
+                **periods,
+                "tenant_id": tenant_id
+            })
+
+        # Rows are ordered by artist and latest period first
+        latest = {}
+        for row in rows:
+            latest.setdefault(row["artist_id"], row)
+        data = {
+            str(artist_id): ArtistEarnings(
+                artist_id=artist_id,
+                found=artist_id in existing,
+                earnings=ArtistPerformance(**latest[artist_id]) if artist_id in latest else None
+            )
+            for artist_id in ids
+        }
+        return ResponseModel(
+            success=True,
+            message="Artist earnings retrieved successfully",
+            data=data,
+            meta={
+                "source": source,
+                "requested": len(ids),
+                "with_earnings": len(latest),
+                "not_found": [artist_id for artist_id in ids if artist_id not in existing]
+            }
+        )
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/platforms/revenue",
     response_model=ResponseModel,
     responses={
@@ -191,10 +387,14 @@ async def get_artist_earnings(
         404: {"description": "No revenue data found"},
         500: {"description": "Internal server error"}
     })
-async def get_platform_revenue(
+@cached("/platforms/revenue")
+def get_platform_revenue(
     year: Optional[int] = None,
     month: Optional[str] = None,
-    platform_name: Optional[str] = None
+    platform_name: Optional[str] = None,
+    period_from: Optional[str] = Query(None, alias="from", description="First period (YYYY-MM)"),
+    period_to: Optional[str] = Query(None, alias="to", description="Last period (YYYY-MM)"),
+    tenant_id: Optional[int] = Header(None, alias=TENANT_HEADER, gt=0, description="Scope to one tenant's data")
 ):
     """Get revenue breakdown by platform"""
     try:
@@ -202,12 +402,13 @@ async def get_platform_revenue(
             year = validate_year(year)
         if month:
             month = validate_month(month)
+        periods = default_period_filters(year, month, period_from, period_to)
             
         with get_db() as conn:
-            data = execute_query(conn, Queries.revenue_by_platform(), {
-                "year": year or datetime.now().year,
-                "month": month or datetime.now().strftime('%b'),
-                "platform_name": platform_name
+            data, source = AggregateRouter.execute(conn, "revenue_by_platform", {
+                **periods,
+                "platform_name": platform_name,
+                "tenant_id": tenant_id
             })
             if not data:
                 return ResponseModel(
@@ -218,7 +419,8 @@ async def get_platform_revenue(
             return ResponseModel(
                 success=True,
                 message="Platform revenue retrieved successfully",
-                data=[PlatformRevenue(**row) for row in data]
+                data=[PlatformRevenue(**row) for row in data],
+                meta={"source": source}
             )
 
     except HTTPException as he:
@@ -234,10 +436,18 @@ async def get_platform_revenue(
         404: {"description": "No performance data found"},
         500: {"description": "Internal server error"}
     })
-async def get_label_performance(
+@cached("/labels/performance")
+def get_label_performance(
     year: Optional[int] = None,
     month: Optional[str] = None,
-    label_id: Optional[int] = None
+    label_id: Optional[int] = None,
+    period_from: Optional[str] = Query(None, alias="from", description="First period (YYYY-MM)"),
+    period_to: Optional[str] = Query(None, alias="to", description="Last period (YYYY-MM)"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size (top N rows)"),
+    cursor: Optional[str] = Query(None, description="Cursor from the previous page's meta.next_cursor"),
+    include_total: bool = Query(False, description="Include an approximate total row count"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to compute and return (default all)"),
+    tenant_id: Optional[int] = Header(None, alias=TENANT_HEADER, gt=0, description="Scope to one tenant's data")
 ):
     """Get revenue and performance metrics by label"""
     try:
@@ -245,13 +455,15 @@ async def get_label_performance(
             year = validate_year(year)
         if month:
             month = validate_month(month)
+        periods = default_period_filters(year, month, period_from, period_to)
+        projection = parse_fields(fields, LabelPerformance)
             
         with get_db() as conn:
-            data = execute_query(conn, Queries.label_performance(), {
-                "year": year or datetime.now().year,
-                "month": month or datetime.now().strftime('%b'),
-                "label_id": label_id
-            })
+            data, meta = AggregateRouter.page(conn, "label_performance", {
+                **periods,
+                "label_id": label_id,
+                "tenant_id": tenant_id
+            }, limit, cursor, include_total, projection)
             if not data:
                 return ResponseModel(
                     success=False,
@@ -261,11 +473,14 @@ async def get_label_performance(
             return ResponseModel(
                 success=True,
                 message="Label performance retrieved successfully",
-                data=[LabelPerformance(**row) for row in data]
+                data=EncodedRows(LabelPerformance, data, projection),
+                meta=meta
             )
 
     except HTTPException as he:
         raise he
+    except InvalidCursor as ic:
+        raise HTTPException(status_code=400, detail=str(ic))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -277,11 +492,19 @@ async def get_label_performance(
         404: {"description": "No data found"},
         500: {"description": "Internal server error"}
     })
-async def get_geographic_analysis(
+@cached("/analytics/geography")
+def get_geographic_analysis(
     year: Optional[int] = None,
     month: Optional[str] = None,
     country_code: Optional[str] = None,
-    isrc: Optional[str] = None
+    isrc: Optional[str] = None,
+    period_from: Optional[str] = Query(None, alias="from", description="First period (YYYY-MM)"),
+    period_to: Optional[str] = Query(None, alias="to", description="Last period (YYYY-MM)"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size (top N rows)"),
+    cursor: Optional[str] = Query(None, description="Cursor from the previous page's meta.next_cursor"),
+    include_total: bool = Query(False, description="Include an approximate total row count"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to compute and return (default all)"),
+    tenant_id: Optional[int] = Header(None, alias=TENANT_HEADER, gt=0, description="Scope to one tenant's data")
 ):
     """Get revenue and performance metrics by geography"""
     try:
@@ -289,14 +512,16 @@ async def get_geographic_analysis(
             year = validate_year(year)
         if month:
             month = validate_month(month)
+        periods = period_filters(year, month, validate_period(period_from), validate_period(period_to))
+        projection = parse_fields(fields, GeographicMetrics)
         with get_db() as conn:
             from ..models.revenue import GeographicMetrics
-            data = execute_query(conn, Queries.geographic_analysis(), {
-                "year": year,
-                "month": month,
+            data, meta = AggregateRouter.page(conn, "geographic_analysis", {
+                **periods,
                 "country_code": country_code,
-                "isrc": isrc
-            })
+                "isrc": isrc,
+                "tenant_id": tenant_id
+            }, limit, cursor, include_total, projection)
             if not data:
                 return ResponseModel(
                     success=False,
@@ -305,10 +530,13 @@ async def get_geographic_analysis(
             return ResponseModel(
                 success=True,
                 message="Geographic analysis retrieved successfully",
-                data=[GeographicMetrics(**row) for row in data]
+                data=EncodedRows(GeographicMetrics, data, projection),
+                meta=meta
             )
     except HTTPException as he:
         raise he
+    except InvalidCursor as ic:
+        raise HTTPException(status_code=400, detail=str(ic))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -320,12 +548,20 @@ async def get_geographic_analysis(
         404: {"description": "No data found"},
         500: {"description": "Internal server error"}
     })
-async def get_platform_label_analysis(
+@cached("/analytics/platform-label")
+def get_platform_label_analysis(
     year: Optional[int] = None,
     month: Optional[str] = None,
     artist_id: Optional[int] = None,
     platform_name: Optional[str] = None,
-    label_name: Optional[str] = None
+    label_name: Optional[str] = None,
+    period_from: Optional[str] = Query(None, alias="from", description="First period (YYYY-MM)"),
+    period_to: Optional[str] = Query(None, alias="to", description="Last period (YYYY-MM)"),
+    limit: Optional[int] = Query(None, ge=1, le=1000, description="Page size (top N rows)"),
+    cursor: Optional[str] = Query(None, description="Cursor from the previous page's meta.next_cursor"),
+    include_total: bool = Query(False, description="Include an approximate total row count"),
+    fields: Optional[str] = Query(None, description="Comma-separated fields to compute and return (default all)"),
+    tenant_id: Optional[int] = Header(None, alias=TENANT_HEADER, gt=0, description="Scope to one tenant's data")
 ):
     """Get cross-analysis of artists across platforms and labels"""
     try:
@@ -333,15 +569,17 @@ async def get_platform_label_analysis(
             year = validate_year(year)
         if month:
             month = validate_month(month)
+        periods = period_filters(year, month, validate_period(period_from), validate_period(period_to))
+        projection = parse_fields(fields, PlatformLabelMatrix)
         with get_db() as conn:
             from ..models.revenue import PlatformLabelMatrix
-            data = execute_query(conn, Queries.platform_label_matrix(), {
-                "year": year,
-                "month": month,
+            data, meta = AggregateRouter.page(conn, "platform_label_matrix", {
+                **periods,
                 "artist_id": artist_id,
                 "platform_name": platform_name,
-                "label_name": label_name
-            })
+                "label_name": label_name,
+                "tenant_id": tenant_id
+            }, limit, cursor, include_total, projection)
             if not data:
                 return ResponseModel(
                     success=False,
@@ -350,8 +588,209 @@ async def get_platform_label_analysis(
             return ResponseModel(
                 success=True,
                 message="Platform-label analysis retrieved successfully",
-                data=[PlatformLabelMatrix(**row) for row in data]
+                data=EncodedRows(PlatformLabelMatrix, data, projection),
+                meta=meta
             )
+    except HTTPException as he:
+        raise he
+    except InvalidCursor as ic:
+        raise HTTPException(status_code=400, detail=str(ic))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/artists/{artist_id}/timeseries",
+    response_model=ResponseModel,
+    responses={
+        200: {"description": "Time series retrieved successfully"},
+        400: {"description": "Invalid period range"},
+        404: {"description": "No time series data found"},
+        500: {"description": "Internal server error"}
+    })
+@cached("/artists/{artist_id}/timeseries", lookback=time_series_lookback)
+def get_artist_timeseries(
+    artist_id: int = Path(..., description="Artist ID", example=48, gt=0),
+    period_from: Optional[str] = Query(None, alias="from", description="First period (YYYY-MM), default 11 months before `to`"),
+    period_to: Optional[str] = Query(None, alias="to", description="Last period (YYYY-MM), default current month"),
+    deltas: bool = Query(False, description="Include month-over-month changes"),
+    rolling: Optional[int] = Query(None, ge=2, le=24, description="Rolling window size in months"),
+    tenant_id: Optional[int] = Header(None, alias=TENANT_HEADER, gt=0, description="Scope to one tenant's data")
+):
+    """Get an artist's monthly revenue series"""
+    return time_series_response("artist", artist_id, period_from, period_to, deltas, rolling, tenant_id)
+
+@router.get("/labels/{label_id}/timeseries",
+    response_model=ResponseModel,
+    responses={
+        200: {"description": "Time series retrieved successfully"},
+        400: {"description": "Invalid period range"},
+        404: {"description": "No time series data found"},
+        500: {"description": "Internal server error"}
+    })
+@cached("/labels/{label_id}/timeseries", lookback=time_series_lookback)
+def get_label_timeseries(
+    label_id: int = Path(..., description="Label ID", example=1, gt=0),
+    period_from: Optional[str] = Query(None, alias="from", description="First period (YYYY-MM), default 11 months before `to`"),
+    period_to: Optional[str] = Query(None, alias="to", description="Last period (YYYY-MM), default current month"),
+    deltas: bool = Query(False, description="Include month-over-month changes"),
+    rolling: Optional[int] = Query(None, ge=2, le=24, description="Rolling window size in months"),
+    tenant_id: Optional[int] = Header(None, alias=TENANT_HEADER, gt=0, description="Scope to one tenant's data")
+):
+    """Get a label's monthly revenue series"""
+    return time_series_response("label", label_id, period_from, period_to, deltas, rolling, tenant_id)
+
+@router.get("/platforms/{platform_name}/timeseries",
+    response_model=ResponseModel,
+    responses={
+        200: {"description": "Time series retrieved successfully"},
+        400: {"description": "Invalid period range"},
+        404: {"description": "No time series data found"},
+        500: {"description": "Internal server error"}
+    })
+@cached("/platforms/{platform_name}/timeseries", lookback=time_series_lookback)
+def get_platform_timeseries(
+    platform_name: str = Path(..., description="Platform name", example="Apple"),
+    period_from: Optional[str] = Query(None, alias="from", description="First period (YYYY-MM), default 11 months before `to`"),
+    period_to: Optional[str] = Query(None, alias="to", description="Last period (YYYY-MM), default current month"),
+    deltas: bool = Query(False, description="Include month-over-month changes"),
+    rolling: Optional[int] = Query(None, ge=2, le=24, description="Rolling window size in months"),
+    tenant_id: Optional[int] = Header(None, alias=TENANT_HEADER, gt=0, description="Scope to one tenant's data")
+):
+    """Get a platform's monthly revenue series"""
+    return time_series_response("platform", platform_name, period_from, period_to, deltas, rolling, tenant_id)
+
+@router.get("/songs/{isrc}/timeseries",
+    response_model=ResponseModel,
+    responses={
+        200: {"description": "Time series retrieved successfully"},
+        400: {"description": "Invalid period range"},
+        404: {"description": "No time series data found"},
+        500: {"description": "Internal server error"}
+    })
+@cached("/songs/{isrc}/timeseries", lookback=time_series_lookback)
+def get_song_timeseries(
+    isrc: str = Path(..., description="Song ISRC", example="INK782201237"),
+    period_from: Optional[str] = Query(None, alias="from", description="First period (YYYY-MM), default 11 months before `to`"),
+    period_to: Optional[str] = Query(None, alias="to", description="Last period (YYYY-MM), default current month"),
+    deltas: bool = Query(False, description="Include month-over-month changes"),
+    rolling: Optional[int] = Query(None, ge=2, le=24, description="Rolling window size in months"),
+    tenant_id: Optional[int] = Header(None, alias=TENANT_HEADER, gt=0, description="Scope to one tenant's data")
+):
+    """Get a song's monthly revenue series"""
+    return time_series_response("isrc", isrc, period_from, period_to, deltas, rolling, tenant_id)
+
+@router.get("/analytics/rollup",
+    response_model=ResponseModel,
+    responses={
+        200: {"description": "Rollup retrieved successfully"},
+        400: {"description": "Invalid dimensions or parameters, or sent with X-Tenant-ID"},
+        404: {"description": "No data found"},
+        500: {"description": "Internal server error"}
+    })
+@cached("/analytics/rollup")
+def get_rollup(
+    group_by: Optional[str] = Query(None, description="Comma-separated dimensions: period, artist, label, platform, country"),
+    year: Optional[int] = None,
+    month: Optional[str] = None,
+    artist_id: Optional[int] = None,
+    label_id: Optional[int] = None,
+    platform_name: Optional[str] = None,
+    country_code: Optional[str] = None,
+    period_from: Optional[str] = Query(None, alias="from", description="First period (YYYY-MM)"),
+    period_to: Optional[str] = Query(None, alias="to", description="Last period (YYYY-MM)"),
+    limit: Optional[int] = Query(None, ge=1, le=10000, description="Maximum number of groups"),
+    tenant_id: Optional[int] = Header(None, alias=TENANT_HEADER, gt=0, description=PLATFORM_WIDE_TENANT)
+):
+    """Slice revenue by any combination of period, artist, label, platform and country, platform-wide only"""
+    try:
+        platform_wide(tenant_id)
+        dimensions = [d.strip() for d in group_by.split(",") if d.strip()] if group_by else []
+        unknown = [d for d in dimensions if d not in GROUPABLE]
+        if unknown or len(set(dimensions)) != len(dimensions):
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid group_by, expected distinct values of: {', '.join(GROUPABLE)}"
+            )
+        if year:
+            year = validate_year(year)
+        if month:
+            month = validate_month(month)
+        periods = period_filters(year, month, validate_period(period_from), validate_period(period_to))
+
+        with get_db() as conn:
+            data = Rollup.execute(conn, dimensions, {
+                **periods,
+                "artist_id": artist_id,
+                "label_id": label_id,
+                "platform_name": platform_name,
+                "country_code": country_code
+            }, limit)
+            if not data or not data[0]["fact_rows"]:
+                return ResponseModel(
+                    success=False,
+                    message="No data found"
+                )
+
+            return ResponseModel(
+                success=True,
+                message="Rollup retrieved successfully",
+                data=EncodedRows(RollupRow, data),
+                meta={"group_by": dimensions, "source": "revenue_rollup"}
+            )
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/analytics/distinct-counts",
+    response_model=ResponseModel,
+    responses={
+        200: {"description": "Distinct counts retrieved successfully"},
+        400: {"description": "Invalid parameters, or sent with X-Tenant-ID"},
+        404: {"description": "No data found"},
+        500: {"description": "Internal server error"}
+    })
+@cached("/analytics/distinct-counts")
+def get_distinct_counts(
+    year: Optional[int] = None,
+    month: Optional[str] = None,
+    platform_name: Optional[str] = None,
+    label_id: Optional[int] = None,
+    period_from: Optional[str] = Query(None, alias="from", description="First period (YYYY-MM)"),
+    period_to: Optional[str] = Query(None, alias="to", description="Last period (YYYY-MM)"),
+    exact: bool = Query(False, description="Count exactly from the fact table instead of merging sketches"),
+    tenant_id: Optional[int] = Header(None, alias=TENANT_HEADER, gt=0, description=PLATFORM_WIDE_TENANT)
+):
+    """Get active artist and unique song counts over any period range, platform-wide only"""
+    try:
+        platform_wide(tenant_id)
+        if platform_name is not None and label_id is not None:
+            raise HTTPException(status_code=400, detail="Filter by platform_name or label_id, not both")
+        if year:
+            year = validate_year(year)
+        if month:
+            month = validate_month(month)
+        periods = default_period_filters(year, month, period_from, period_to)
+        params = {**periods, "platform_name": platform_name, "label_id": label_id}
+
+        with get_db() as conn:
+            if exact:
+                counts = DistinctCounts.exact(conn, params)
+            else:
+                counts = DistinctCounts.approximate(conn, params)
+            if counts["active_artists"] is None:
+                return ResponseModel(
+                    success=False,
+                    message="No data found"
+                )
+
+            return ResponseModel(
+                success=True,
+                message="Distinct counts retrieved successfully",
+                data=counts,
+                meta={"exact": exact, "relative_error": 0.0 if exact else RELATIVE_ERROR}
+            )
+
     except HTTPException as he:
         raise he
     except Exception as e:
@@ -0,0 +1,82 @@
+from fastapi import APIRouter, Header, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import Optional
+from .endpoints import validate_year, validate_month, validate_period, TENANT_HEADER
+from ..crud.export import Export, FORMATS
+from ..crud.periods import period_filters
+
+router = APIRouter()
+
+def export_response(export: str, params: dict, fmt: str, compress: bool, name: str) -> StreamingResponse:
+    """Shared body of the export endpoints"""
+    if fmt not in FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format, expected one of {', '.join(FORMATS)}")
+    if params["period"] is None and params["period_from"] is None and params["period_to"] is None:
+        raise HTTPException(status_code=400, detail="Exports need a year, a year and month, or a from/to range")
+
+    filename = f"{name}.{fmt}" + (".gz" if compress else "")
+    return StreamingResponse(
+        Export.stream(export, params, fmt, compress),
+        media_type="application/gzip" if compress else FORMATS[fmt][0],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+def export_periods(year: Optional[int], month: Optional[str], period_from: Optional[str], period_to: Optional[str]) -> dict:
+    """Validated period filters for an export"""
+    if year:
+        year = validate_year(year)
+    if month:
+        month = validate_month(month)
+    return period_filters(year, month, validate_period(period_from), validate_period(period_to))
+
+@router.get("/geography",
+    responses={
+        200: {"description": "ISRC x country x platform breakdown streamed"},
+        400: {"description": "Invalid parameters"}
+    })
+def export_geography(
+    year: Optional[int] = None,
+    month: Optional[str] = None,
+    country_code: Optional[str] = None,
+    isrc: Optional[str] = None,
+    period_from: Optional[str] = Query(None, alias="from", description="First period (YYYY-MM)"),
+    period_to: Optional[str] = Query(None, alias="to", description="Last period (YYYY-MM)"),
+    format: str = Query("csv", description="csv or ndjson"),
+    compress: bool = Query(False, description="Gzip the export on the fly"),
+    tenant_id: Optional[int] = Header(None, alias=TENANT_HEADER, gt=0, description="Scope to one tenant's data")
+):
+    """Stream the revenue breakdown by ISRC, country and platform"""
+    periods = export_periods(year, month, period_from, period_to)
+    return export_response("geography", {
+        **periods,
+        "country_code": country_code,
+        "isrc": isrc,
+        "tenant_id": tenant_id
+    }, format, compress, "geography")
+
+@router.get("/platform-label",
+    responses={
+        200: {"description": "Artist x platform x label breakdown streamed"},
+        400: {"description": "Invalid parameters"}
+    })
+def export_platform_label(
+    year: Optional[int] = None,
+    month: Optional[str] = None,
+    artist_id: Optional[int] = None,
+    platform_name: Optional[str] = None,
+    label_name: Optional[str] = None,
+    period_from: Optional[str] = Query(None, alias="from", description="First period (YYYY-MM)"),
+    period_to: Optional[str] = Query(None, alias="to", description="Last period (YYYY-MM)"),
+    format: str = Query("csv", description="csv or ndjson"),
+    compress: bool = Query(False, description="Gzip the export on the fly"),
+    tenant_id: Optional[int] = Header(None, alias=TENANT_HEADER, gt=0, description="Scope to one tenant's data")
+):
+    """Stream the revenue breakdown by artist, platform and label"""
+    periods = export_periods(year, month, period_from, period_to)
+    return export_response("platform-label", {
+        **periods,
+        "artist_id": artist_id,
+        "platform_name": platform_name,
+        "label_name": label_name,
+        "tenant_id": tenant_id
+    }, format, compress, "platform-label")
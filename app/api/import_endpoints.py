@@ -1,8 +1,14 @@
-from fastapi import APIRouter, HTTPException, UploadFile, File
+from fastapi import APIRouter, Header, HTTPException, Query, UploadFile, File
 from fastapi.responses import JSONResponse
 from ..models.base import ResponseModel
 from ..crud.csv_import import CSVImport
-from typing import Dict
+from ..crud.data_import import DataImport
+from ..crud.periods import parse_period
+from ..crud.queries import Queries
+from ..crud.telemetry import ImportTelemetry
+from ..db.database import get_db, execute_query
+from .endpoints import TENANT_HEADER
+from typing import Dict, Optional
 
 router = APIRouter()
 
@@ -11,12 +17,18 @@ router = APIRouter()
     responses={
         200: {"description": "Revenue data imported successfully"},
         400: {"description": "Invalid file path or format"},
+        429: {"description": "The tenant's import slots are busy"},
         500: {"description": "Internal server error"}
     })
-async def import_revenue_from_path(file_path: str):
+def import_revenue_from_path(
+    file_path: str,
+    tenant_id: Optional[int] = Header(None, alias=TENANT_HEADER, gt=0, description="Tenant importing the file")
+):
     """Import revenue data from a file path"""
     try:
-        result = CSVImport.import_revenue_from_csv(file_path)
+        result = CSVImport.import_revenue_from_csv(file_path, tenant_id)
+        if result.get("throttled"):
+            raise HTTPException(status_code=429, detail=result["message"])
         if not result["success"]:
             raise HTTPException(status_code=400, detail=result["message"])
             
@@ -26,7 +38,10 @@ async def import_revenue_from_path(file_path: str):
             data={
                 "rows_processed": result["rows_processed"],
                 "processing_stats": result.get("processing_stats", {}),
-                "view_refresh": result.get("view_refresh", {})
+                "view_refresh": result.get("view_refresh", {}),
+                "cache_warming": result.get("cache_warming", {}),
+                "job_id": result["job_id"],
+                "telemetry": result["telemetry"]
             }
         )
         
@@ -40,21 +55,27 @@ async def import_revenue_from_path(file_path: str):
     responses={
         200: {"description": "Revenue data imported successfully"},
         400: {"description": "Invalid file or format"},
+        429: {"description": "The tenant's import slots are busy"},
         500: {"description": "Internal server error"}
     })
-async def import_revenue_file(file: UploadFile = File(...)):
+def import_revenue_file(
+    file: UploadFile = File(...),
+    tenant_id: Optional[int] = Header(None, alias=TENANT_HEADER, gt=0, description="Tenant importing the file")
+):
     """Import revenue data from uploaded file"""
     try:
         # Save uploaded file
         temp_path = f"temp_{file.filename}"
         try:
-            contents = await file.read()
+            contents = file.file.read()
             with open(temp_path, 'wb') as f:
                 f.write(contents)
             
-            # Process file
-            result = CSVImport.import_revenue_from_csv(temp_path)
+            # Process file (a plain function: a throttled import waits in the threadpool)
+            result = CSVImport.import_revenue_from_csv(temp_path, tenant_id)
             
+            if result.get("throttled"):
+                raise HTTPException(status_code=429, detail=result["message"])
             if not result["success"]:
                 raise HTTPException(status_code=400, detail=result["message"])
                 
@@ -64,7 +85,10 @@ async def import_revenue_file(file: UploadFile = File(...)):
                 data={
                     "rows_processed": result["rows_processed"],
                     "processing_stats": result.get("processing_stats", {}),
-                    "view_refresh": result.get("view_refresh", {})
+                    "view_refresh": result.get("view_refresh", {}),
+                    "cache_warming": result.get("cache_warming", {}),
+                    "job_id": result["job_id"],
+                    "telemetry": result["telemetry"]
                 }
             )
             
@@ -79,6 +103,40 @@ async def import_revenue_file(file: UploadFile = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.post("/partitions/{period}/detach",
+    response_model=ResponseModel,
+    responses={
+        200: {"description": "Partition detached"},
+        400: {"description": "Invalid period or no partition for it"},
+        500: {"description": "Internal server error"}
+    })
+def detach_partition(period: str, archive: bool = True):
+    """
+    Detach a month (YYYY-MM) of revenue facts, archiving it by default
+
+    A plain function: the detach and the view refreshes that follow it block,
+    so they run in the threadpool instead of on the event loop.
+    """
+    try:
+        try:
+            period_key = parse_period(period)
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid period format, expected YYYY-MM")
+
+        if not DataImport.detach_partition(period_key, archive):
+            raise HTTPException(status_code=400, detail=f"Could not detach partition for {period}")
+
+        return ResponseModel(
+            success=True,
+            message="Partition archived" if archive else "Partition dropped",
+            data={"period": period, "archived": archive}
+        )
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @router.get("/status/{job_id}",
     response_model=ResponseModel,
     responses={
@@ -86,24 +144,48 @@ async def import_revenue_file(file: UploadFile = File(...)):
         404: {"description": "Job not found"},
         500: {"description": "Internal server error"}
     })
-async def get_import_status(job_id: str):
-    """Get status of an import job"""
+def get_import_status(
+    job_id: str,
+    tenant_id: Optional[int] = Header(None, alias=TENANT_HEADER, gt=0, description="Only the tenant's imports")
+):
+    """Get the status and per-stage telemetry of an import job"""
     try:
-        # Mock implementation - replace with actual status tracking
-        status = {
-            "job_id": job_id,
-            "status": "COMPLETED",
-            "total_records": 1000,
-            "processed": 1000,
-            "failed": 0,
-            "completed_at": "2025-01-01T12:00:00Z"
-        }
-        
+        status = ImportTelemetry.job(job_id, tenant_id)
+        if status is None:
+            raise HTTPException(status_code=404, detail=f"Import job {job_id} not found")
+
         return ResponseModel(
             success=True,
             message="Import job status retrieved",
             data=status
         )
-        
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/history",
+    response_model=ResponseModel,
+    responses={
+        200: {"description": "Import history retrieved"},
+        500: {"description": "Internal server error"}
+    })
+def get_import_history(
+    limit: int = Query(20, ge=1, le=500, description="Most imports returned, newest first"),
+    tenant_id: Optional[int] = Header(None, alias=TENANT_HEADER, gt=0, description="Only the tenant's imports")
+):
+    """Get recent imports with the wall time, rows/sec and peak memory of each stage"""
+    try:
+        with get_db() as conn:
+            rows = execute_query(conn, Queries.import_history(), {"tenant_id": tenant_id, "limit": limit})
+
+        return ResponseModel(
+            success=True,
+            message="Import history retrieved",
+            data=rows,
+            meta={"count": len(rows)}
+        )
+
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
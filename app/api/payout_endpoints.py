@@ -0,0 +1,115 @@
+from fastapi import APIRouter, Header, HTTPException, Path, Query
+from decimal import Decimal
+from typing import Optional
+from ..models.base import ResponseModel
+from ..models.revenue import PayoutDue, PayoutLedgerEntry
+from ..db.database import get_db, execute_query, execute_one
+from ..crud.queries import Queries
+from ..crud.data_import import DataImport
+from .endpoints import TENANT_HEADER
+
+router = APIRouter()
+
+# Most rows returned by the due-payouts and ledger endpoints
+MAX_PAYOUT_ROWS = 1000
+
+@router.get("/due",
+    response_model=ResponseModel,
+    responses={
+        200: {"description": "Artists due a payout retrieved successfully"},
+        500: {"description": "Internal server error"}
+    })
+def get_payouts_due(
+    limit: int = Query(100, ge=1, le=MAX_PAYOUT_ROWS, description="Most artists returned, largest balance first"),
+    tenant_id: Optional[int] = Header(None, alias=TENANT_HEADER, gt=0, description="Only the tenant's artists")
+):
+    """Get the artists whose unpaid royalties reached their payment threshold"""
+    try:
+        with get_db() as conn:
+            rows = execute_query(conn, Queries.payouts_due(), {"tenant_id": tenant_id, "limit": limit})
+
+        return ResponseModel(
+            success=True,
+            message="Payouts due retrieved successfully",
+            data=[PayoutDue(**row) for row in rows],
+            meta={"count": len(rows)}
+        )
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/{artist_id}",
+    response_model=ResponseModel,
+    responses={
+        200: {"description": "Payout balance and ledger retrieved successfully"},
+        404: {"description": "No payout balance for the artist"},
+        500: {"description": "Internal server error"}
+    })
+def get_artist_payouts(
+    artist_id: int = Path(..., description="Artist ID", example=48, gt=0),
+    limit: int = Query(100, ge=1, le=MAX_PAYOUT_ROWS, description="Most ledger entries returned, newest first"),
+    tenant_id: Optional[int] = Header(None, alias=TENANT_HEADER, gt=0, description="Only the tenant's artists")
+):
+    """Get an artist's payout balance and latest ledger entries"""
+    try:
+        with get_db() as conn:
+            balance = execute_one(conn, Queries.payout_balance(), {"artist_id": artist_id, "tenant_id": tenant_id})
+            if not balance:
+                raise HTTPException(status_code=404, detail=f"No payout balance for artist {artist_id}")
+            entries = execute_query(conn, Queries.payout_ledger(), {
+                "artist_id": artist_id, "tenant_id": tenant_id, "limit": limit
+            })
+
+        return ResponseModel(
+            success=True,
+            message="Payout ledger retrieved successfully",
+            data={
+                "balance": balance,
+                "entries": [PayoutLedgerEntry(**entry) for entry in entries]
+            }
+        )
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/{artist_id}",
+    response_model=ResponseModel,
+    responses={
+        200: {"description": "Payout recorded"},
+        404: {"description": "No payout balance for the artist"},
+        409: {"description": "Payout exceeds the artist's balance"},
+        500: {"description": "Internal server error"}
+    })
+def record_payout(
+    artist_id: int = Path(..., description="Artist ID", example=48, gt=0),
+    amount: Decimal = Query(..., gt=0, description="Amount paid out"),
+    reference: Optional[str] = Query(None, description="Payment reference"),
+    tenant_id: Optional[int] = Header(None, alias=TENANT_HEADER, gt=0, description="Only the tenant's artists")
+):
+    """Record a payout made to an artist, debiting their balance"""
+    try:
+        with get_db() as conn:
+            balance = execute_one(conn, Queries.payout_balance(), {"artist_id": artist_id, "tenant_id": tenant_id})
+        if not balance:
+            raise HTTPException(status_code=404, detail=f"No payout balance for artist {artist_id}")
+        if amount > balance["balance"]:
+            raise HTTPException(status_code=409, detail=f"Payout exceeds the balance of {balance['balance']}")
+
+        # The procedure re-checks the balance under a row lock
+        if not DataImport.record_payout(artist_id, amount, reference):
+            raise HTTPException(status_code=409, detail="Payout exceeds the artist's current balance")
+
+        return ResponseModel(
+            success=True,
+            message="Payout recorded",
+            data={"artist_id": artist_id, "amount": amount, "balance": balance["balance"] - amount}
+        )
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
@@ -0,0 +1,115 @@
+from fastapi import APIRouter, BackgroundTasks, Header, HTTPException, Path, Query
+from fastapi.responses import FileResponse
+from typing import Optional
+from ..models.base import ResponseModel
+from ..crud.statements import Statements, STATEMENT_FORMATS, statement_dir
+from ..crud.periods import parse_period
+from .endpoints import TENANT_HEADER
+
+router = APIRouter()
+
+def statement_period(period: str) -> int:
+    """Validate a YYYY-MM statement period"""
+    try:
+        return parse_period(period)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid period format, expected YYYY-MM")
+
+def generate_statements(period: int, fmt: str, tenant_id: Optional[int]):
+    """Background body of a statement run"""
+    try:
+        Statements.generate(period, fmt, tenant_id)
+    except Exception as e:
+        print(f"Error generating statements for {period}: {e}")
+
+@router.post("/{period}",
+    response_model=ResponseModel,
+    status_code=202,
+    responses={
+        202: {"description": "Statement generation started"},
+        400: {"description": "Invalid period or format"},
+        409: {"description": "Statements for the period are already being generated"},
+        500: {"description": "Internal server error"}
+    })
+def start_statements(
+    background_tasks: BackgroundTasks,
+    period: str = Path(..., description="Statement period (YYYY-MM)", example="2024-06"),
+    format: str = Query("csv", description="csv or json"),
+    tenant_id: Optional[int] = Header(None, alias=TENANT_HEADER, gt=0, description="Only the tenant's artists")
+):
+    """Generate the statement of every artist with revenue in a month"""
+    try:
+        period_key = statement_period(period)
+        if format not in STATEMENT_FORMATS:
+            raise HTTPException(status_code=400, detail=f"Invalid format, expected one of {', '.join(STATEMENT_FORMATS)}")
+        if Statements.running(period_key, tenant_id):
+            raise HTTPException(status_code=409, detail=f"Statements for {period} are already being generated")
+
+        background_tasks.add_task(generate_statements, period_key, format, tenant_id)
+        return ResponseModel(
+            success=True,
+            message="Statement generation started",
+            data={"period": period_key, "format": format, "directory": str(statement_dir(period_key, tenant_id))}
+        )
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/{period}",
+    response_model=ResponseModel,
+    responses={
+        200: {"description": "Summary of the last statement run"},
+        400: {"description": "Invalid period"},
+        404: {"description": "No statements generated for the period"},
+        500: {"description": "Internal server error"}
+    })
+def get_statements_summary(
+    period: str = Path(..., description="Statement period (YYYY-MM)", example="2024-06"),
+    tenant_id: Optional[int] = Header(None, alias=TENANT_HEADER, gt=0, description="Only the tenant's artists")
+):
+    """Get the summary of a month's statements and whether a run is in progress"""
+    try:
+        period_key = statement_period(period)
+        summary = Statements.summary(period_key, tenant_id)
+        running = Statements.running(period_key, tenant_id)
+        if summary is None and not running:
+            raise HTTPException(status_code=404, detail=f"No statements generated for {period}")
+
+        return ResponseModel(
+            success=True,
+            message="Statement generation in progress" if running else "Statements generated",
+            data=summary,
+            meta={"running": running}
+        )
+
+    except HTTPException as he:
+        raise he
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/{period}/{artist_id}",
+    responses={
+        200: {"description": "Artist statement file"},
+        400: {"description": "Invalid period or format"},
+        404: {"description": "No statement for the artist"}
+    })
+def get_artist_statement(
+    period: str = Path(..., description="Statement period (YYYY-MM)", example="2024-06"),
+    artist_id: int = Path(..., description="Artist ID", gt=0),
+    format: str = Query("csv", description="csv or json"),
+    tenant_id: Optional[int] = Header(None, alias=TENANT_HEADER, gt=0, description="Only the tenant's artists")
+):
+    """Download an artist's statement for a month"""
+    period_key = statement_period(period)
+    if format not in STATEMENT_FORMATS:
+        raise HTTPException(status_code=400, detail=f"Invalid format, expected one of {', '.join(STATEMENT_FORMATS)}")
+    path = statement_dir(period_key, tenant_id) / f"{artist_id}.{format}"
+    if not path.exists():
+        raise HTTPException(status_code=404, detail=f"No {format} statement for artist {artist_id} in {period}")
+    return FileResponse(
+        path,
+        media_type="text/csv" if format == "csv" else "application/json",
+        filename=f"statement-{period}-{artist_id}.{format}"
+    )
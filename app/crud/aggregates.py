@@ -0,0 +1,594 @@
+import logging
+import re
+from typing import Any, Dict, List, Optional, Tuple
+import psycopg
+from ..db.database import execute_query, execute_one
+from .queries import Queries
+from .pagination import encode_cursor, decode_cursor
+
+logger = logging.getLogger(__name__)
+
+# Measures every source can re-aggregate with SUM
+SUM_MEASURES = {"plays", "revenue", "royalty"}
+
+# Filter parameters that are not plain equality on a column of the same name
+RANGE_FILTERS = {
+    "period_from": ("period", ">="),
+    "period_to": ("period", "<="),
+    # A list of values, matched with = ANY(array)
+    "artist_ids": ("artist_id", "= ANY")
+}
+
+# Filter every routed query accepts: sources without the column are
+# platform-wide and cannot answer tenant-scoped queries
+TENANT_FILTER = "tenant_id"
+
+# Columns determined by another grouping column; they can leave a query's
+# GROUP BY (and their joins) without changing its grain
+DEPENDENT_COLUMNS = {
+    "year": "period",
+    "month": "period",
+    "artist_name": "artist_id",
+    "label_name": "label_id",
+    "song_name": "isrc",
+    "region": "country_code"
+}
+
+# Text columns that keyset sort keys compare and order bytewise (the "C"
+# collation), as the snapshot orders Python strings, so a cursor issued by
+# one source continues at the same row on any other
+TEXT_COLUMNS = {
+    "isrc", "song_name", "artist_name", "label_name", "platform_name", "country_code", "region"
+}
+
+# Measures derived from other measures once they are aggregated
+DERIVED_MEASURES = {
+    "royalty_percentage": "ROUND({royalty} * 100.0 / NULLIF({revenue}, 0), 2)"
+}
+
+
+def _alias(expr: str, name: str) -> str:
+    """Render a select-list entry, omitting redundant aliases"""
+    return expr if expr == name else f"{expr} AS {name}"
+
+
+def _sort_expr(expr: str, col: str) -> str:
+    """Sort-key expression, bytewise for text columns"""
+    return f'{expr} COLLATE "C"' if col in TEXT_COLUMNS else expr
+
+
+def _grouped(query: "AggregateQuery", predicates: List[Tuple[str, str, str]]) -> set:
+    """Columns pinned by the query: grouped on, or filtered to a single value"""
+    return set(query.group_by) | {col for col, op, _ in predicates if op == "="}
+
+
+class Source:
+    """
+    A relation able to answer aggregate queries over the revenue facts
+
+    Aggregated sources (materialized views) are grouped by `keys`; their
+    `counts` are precomputed distinct counts that are only valid at that
+    grain. Detail sources hold one row per fact, so they can always be
+    re-grouped and compute `counts` as COUNT(DISTINCT expr).
+    """
+
+    def __init__(
+        self,
+        name: str,
+        relation: str,
+        columns: Dict[str, str],
+        sums: Dict[str, str],
+        keys: Tuple[str, ...] = (),
+        counts: Optional[Dict[str, str]] = None,
+        detail: bool = False,
+        joins: Optional[Dict[str, Tuple[str, Optional[str]]]] = None,
+        rank: int = 0
+    ):
+        self.name = name
+        self.relation = relation
+        self.columns = columns
+        self.sums = sums
+        self.keys = keys
+        self.counts = counts or {}
+        self.detail = detail
+        self.joins = joins or {}
+        self.rank = rank
+
+    def needs_regroup(self, grouped: set) -> bool:
+        """Whether answering at the `grouped` grain requires re-aggregating rows"""
+        return self.detail or not set(self.keys) <= grouped
+
+    def can_answer(self, query: "AggregateQuery", predicates: List[Tuple[str, str, str]]) -> bool:
+        """Check that every column and measure of the query is available here"""
+        needed = set(query.group_by) | {col for col, _, _ in predicates}
+        if not needed <= set(self.columns):
+            return False
+
+        regroup = self.needs_regroup(_grouped(query, predicates))
+        for measure in query.measures.values():
+            if measure in DERIVED_MEASURES:
+                if not {"revenue", "royalty"} <= set(self.sums):
+                    return False
+            elif measure in SUM_MEASURES:
+                if measure not in self.sums:
+                    return False
+            elif measure not in self.counts or (regroup and not self.detail):
+                # Distinct counts cannot be added up across rows
+                return False
+        return True
+
+    def render(
+        self,
+        query: "AggregateQuery",
+        predicates: List[Tuple[str, str, str]],
+        limit: Optional[int] = None,
+        keyset: bool = False
+    ) -> str:
+        """
+        Render the SQL answering `query` from this source
+
+        With `keyset`, only rows sorting after the `after_N` parameters
+        (the sort key of the previous page's last row) are returned.
+        """
+        regroup = self.needs_regroup(_grouped(query, predicates))
+
+        def sum_expr(measure: str) -> str:
+            column = self.sums[measure]
+            return f"SUM({column})" if regroup else column
+
+        exprs = {col: self.columns[col] for col in query.group_by}
+        for alias, measure in query.measures.items():
+            if measure in SUM_MEASURES:
+                expr = sum_expr(measure)
+            elif measure in DERIVED_MEASURES:
+                expr = DERIVED_MEASURES[measure].format(
+                    royalty=sum_expr("royalty"), revenue=sum_expr("revenue")
+                )
+            elif self.detail:
+                expr = f"COUNT(DISTINCT {self.counts[measure]})"
+            else:
+                expr = self.counts[measure]
+            exprs[alias] = expr
+        select = [_alias(expr, name) for name, expr in exprs.items()]
+
+        where = [
+            f"{self.columns[col]} {op}(%({param})s)" if op == "= ANY" else f"{self.columns[col]} {op} %({param})s"
+            for col, op, param in predicates
+        ]
+        group_by = [self.columns[col] for col in query.group_by] if regroup else []
+        having = []
+        if keyset:
+            # Row comparison on the full sort key; aggregated keys go in HAVING,
+            # so a regrouped source aggregates every matching row on each page
+            row = ", ".join(_sort_expr(exprs[col], col) for col in query.sort_key)
+            after = ", ".join(f"%(after_{i})s" for i in range(len(query.sort_key)))
+            (having if regroup else where).append(f"({row}) < ({after})")
+
+        sql = "SELECT\n    " + ",\n    ".join(select)
+        sql += f"\nFROM {self.relation}"
+        sql += self._render_joins(select + where + group_by)
+        if where:
+            sql += "\nWHERE " + "\n  AND ".join(where)
+        if group_by:
+            sql += "\nGROUP BY " + ", ".join(group_by)
+        if having:
+            sql += "\nHAVING " + "\n  AND ".join(having)
+        order_by = [f"{_sort_expr(exprs[col], col)} DESC" for col in query.sort_key] or list(query.order_by)
+        if order_by:
+            sql += "\nORDER BY " + ", ".join(order_by)
+        limit = limit or query.limit
+        if limit:
+            sql += f"\nLIMIT {int(limit)}"
+        return sql + ";"
+
+    def _render_joins(self, expressions: List[str]) -> str:
+        """Emit only the joins referenced by the given expressions"""
+        if not self.joins:
+            return ""
+        text = " ".join(expressions)
+        needed = {alias for alias in self.joins if re.search(rf"\b{alias}\.", text)}
+        for alias in list(needed):
+            parent = self.joins[alias][1]
+            while parent:
+                needed.add(parent)
+                parent = self.joins[parent][1]
+        return "".join(
+            f"\n{clause}" for alias, (clause, _) in self.joins.items() if alias in needed
+        )
+
+
+class AggregateQuery:
+    """Grouping, measures and filters requested by an endpoint"""
+
+    def __init__(
+        self,
+        group_by: Tuple[str, ...],
+        measures: Dict[str, str],
+        filters: Tuple[str, ...] = (),
+        order_by: Tuple[str, ...] = (),
+        limit: Optional[int] = None,
+        sort_key: Tuple[str, ...] = ()
+    ):
+        self.group_by = group_by
+        self.measures = measures
+        self.filters = filters if TENANT_FILTER in filters else (*filters, TENANT_FILTER)
+        self.order_by = order_by
+        self.limit = limit
+        # Unique descending sort key enabling keyset pagination; replaces order_by
+        self.sort_key = sort_key
+
+    def project(self, fields: Tuple[str, ...]) -> "AggregateQuery":
+        """
+        The query reduced to the output columns in `fields`
+
+        Unrequested measures are dropped, and so are grouping columns that
+        depend on another one; the grain, sort key and ordering columns stay.
+        """
+        keep = set(fields) | set(self.sort_key) | {item.split()[0] for item in self.order_by}
+        return AggregateQuery(
+            group_by=tuple(
+                col for col in self.group_by
+                if col in keep or DEPENDENT_COLUMNS.get(col) not in self.group_by
+            ),
+            measures={alias: measure for alias, measure in self.measures.items() if alias in keep},
+            filters=self.filters,
+            order_by=self.order_by,
+            limit=self.limit,
+            sort_key=self.sort_key
+        )
+
+    def predicates(self, params: Dict[str, Any]) -> List[Tuple[str, str, str]]:
+        """(column, operator, parameter) for each filter given a value in `params`"""
+        return [
+            (*RANGE_FILTERS.get(param, (param, "=")), param)
+            for param in self.filters
+            if params.get(param) is not None
+        ]
+
+
+# Sources in preference order; the fact table is the last resort
+SOURCES = [
+    Source(
+        name="mv_label_performance",
+        relation="analytics.mv_label_performance",
+        keys=("period", "label_id"),
+        columns={
+            "period": "period", "year": "year", "month": "month",
+            "label_id": "label_id", "label_name": "label_name"
+        },
+        sums={"plays": "total_plays", "revenue": "total_revenue", "royalty": "total_royalties"},
+        counts={"artists": "unique_artists", "songs": "unique_songs"},
+        rank=1
+    ),
+    Source(
+        name="mv_platform_revenue",
+        relation="analytics.mv_platform_revenue",
+        # Within a month each platform has a single effective revenue share
+        keys=("period", "platform_name"),
+        columns={
+            "period": "period", "year": "year", "month": "month",
+            "platform_name": "platform_name",
+            "revenue_share_percentage": "revenue_share_percentage"
+        },
+        sums={"plays": "total_plays", "revenue": "total_revenue", "royalty": "total_royalties"},
+        counts={"songs": "songs_played", "isrcs": "songs_played", "artists": "unique_artists"},
+        rank=1
+    ),
+    Source(
+        name="mv_artist_earnings",
+        relation="analytics.mv_artist_earnings",
+        keys=("period", "artist_id"),
+        columns={
+            "period": "period", "year": "year", "month": "month",
+            "tenant_id": "tenant_id", "artist_id": "artist_id", "artist_name": "artist_name"
+        },
+        sums={"plays": "total_plays", "revenue": "total_revenue", "royalty": "total_royalties"},
+        counts={"songs": "unique_songs", "platforms": "platform_count"},
+        rank=2
+    ),
+    Source(
+        name="mv_artist_platform_label",
+        relation="analytics.mv_artist_platform_label",
+        keys=("period", "artist_id", "platform_name", "label_id"),
+        columns={
+            "period": "period", "year": "year", "month": "month",
+            "tenant_id": "tenant_id", "artist_id": "artist_id", "artist_name": "artist_name",
+            "platform_name": "platform_name",
+            "label_id": "label_id", "label_name": "label_name"
+        },
+        sums={"plays": "total_plays", "revenue": "total_revenue", "royalty": "total_royalties"},
+        counts={"songs": "unique_songs"},
+        rank=3
+    ),
+    Source(
+        name="mv_isrc_geo_platform",
+        relation="analytics.mv_isrc_geo_platform",
+        keys=("period", "isrc", "country_code", "platform_name"),
+        columns={
+            "period": "period", "year": "year", "month": "month",
+            "isrc": "isrc", "song_name": "song_name",
+            "tenant_id": "tenant_id", "artist_name": "artist_name",
+            "country_code": "country_code", "region": "region",
+            "platform_name": "platform_name"
+        },
+        sums={"plays": "total_plays", "revenue": "total_revenue", "royalty": "total_royalties"},
+        rank=4
+    ),
+    Source(
+        name="mv_artist_dashboard",
+        relation="analytics.mv_artist_dashboard",
+        detail=True,
+        columns={
+            "period": "period", "year": "year", "month": "month",
+            "tenant_id": "tenant_id", "artist_id": "artist_id", "artist_name": "artist_name",
+            "label_id": "label_id", "label_name": "label_name",
+            "isrc": "isrc", "platform_name": "service"
+        },
+        sums={"plays": "plays", "revenue": "revenue", "royalty": "royalty"},
+        counts={
+            "songs": "isrc", "isrcs": "isrc", "platforms": "service",
+            "artists": "artist_id", "labels": "label_id"
+        },
+        rank=5
+    ),
+    Source(
+        name="fact_monthly_revenue",
+        relation="analytics.fact_monthly_revenue fr",
+        detail=True,
+        columns={
+            "period": "fr.period", "year": "fr.year", "month": "fr.month",
+            "tenant_id": "fr.tenant_id", "artist_id": "fr.artist_id", "artist_name": "a.artist_name",
+            "label_id": "s.label_id", "label_name": "l.label_name",
+            "platform_name": "p.platform_name",
+            "revenue_share_percentage": "p.revenue_share_percentage",
+            "country_code": "g.country_code", "region": "g.region",
+            "isrc": "s.isrc", "song_name": "s.title"
+        },
+        sums={"plays": "fr.total_plays", "revenue": "fr.revenue_amount", "royalty": "fr.royalty_amount"},
+        counts={
+            "songs": "fr.song_id", "isrcs": "s.isrc", "platforms": "fr.platform_id",
+            "artists": "fr.artist_id", "labels": "s.label_id"
+        },
+        joins={
+            "s": ("JOIN whitelabel.song s ON fr.song_id = s.song_id", None),
+            "a": ("JOIN whitelabel.artist a ON fr.artist_id = a.artist_id", None),
+            "l": ("JOIN whitelabel.label l ON s.label_id = l.label_id", "s"),
+            "p": ("JOIN analytics.platform_config p ON fr.platform_id = p.platform_id", None),
+            "g": ("JOIN analytics.dim_geography g ON fr.geography_id = g.geography_id", None)
+        },
+        rank=99
+    )
+]
+
+FACT_SOURCE = SOURCES[-1]
+
+TOTALS = {"total_plays": "plays", "total_revenue": "revenue", "total_royalties": "royalty"}
+
+# Endpoint queries answered through the router, keyed like their `Queries` counterparts
+ROUTED_QUERIES = {
+    "top_artists": AggregateQuery(
+        group_by=("artist_id", "artist_name"),
+        measures={"total_songs": "songs", **TOTALS},
+        filters=("period", "period_from", "period_to", "month"),
+        order_by=("total_revenue DESC",),
+        limit=10
+    ),
+    "label_performance": AggregateQuery(
+        group_by=("label_id", "label_name"),
+        measures={"total_artists": "artists", "total_songs": "songs", **TOTALS},
+        filters=("period", "period_from", "period_to", "month", "label_id"),
+        sort_key=("total_revenue", "label_id")
+    ),
+    "revenue_by_platform": AggregateQuery(
+        group_by=("platform_name",),
+        measures={**TOTALS, "unique_tracks": "isrcs"},
+        filters=("period", "period_from", "period_to", "month", "platform_name")
+    ),
+    "geographic_analysis": AggregateQuery(
+        group_by=(
+            "period", "year", "month", "isrc", "song_name", "artist_name",
+            "country_code", "region", "platform_name"
+        ),
+        measures=dict(TOTALS),
+        filters=("period", "period_from", "period_to", "month", "country_code", "isrc"),
+        sort_key=("total_revenue", "isrc", "country_code", "platform_name", "period")
+    ),
+    "platform_label_matrix": AggregateQuery(
+        group_by=(
+            "period", "year", "month", "platform_name", "label_id", "label_name",
+            "artist_id", "artist_name"
+        ),
+        measures={"unique_songs": "songs", **TOTALS},
+        filters=("period", "period_from", "period_to", "month", "artist_id", "platform_name", "label_name"),
+        sort_key=("total_revenue", "artist_id", "platform_name", "label_id", "period")
+    ),
+    "artist_performance": AggregateQuery(
+        group_by=("artist_id", "artist_name", "label_id", "label_name", "period", "year", "month"),
+        measures={
+            "songs": "songs",
+            "platforms": "platforms",
+            "plays": "plays",
+            "revenue": "revenue",
+            "royalty": "royalty",
+            "royalty_percentage": "royalty_percentage"
+        },
+        filters=("artist_id", "period", "period_from", "period_to", "month"),
+        order_by=("period DESC",),
+        limit=1
+    ),
+    # artist_performance for many artists at once; callers keep each artist's first row
+    "artist_performance_batch": AggregateQuery(
+        group_by=("artist_id", "artist_name", "label_id", "label_name", "period", "year", "month"),
+        measures={
+            "songs": "songs",
+            "platforms": "platforms",
+            "plays": "plays",
+            "revenue": "revenue",
+            "royalty": "royalty",
+            "royalty_percentage": "royalty_percentage"
+        },
+        filters=("artist_ids", "period", "period_from", "period_to", "month"),
+        order_by=("artist_id", "period DESC")
+    ),
+    # Full breakdowns streamed by the export endpoints, in natural key order
+    "geography_export": AggregateQuery(
+        group_by=(
+            "period", "year", "month", "isrc", "song_name", "artist_name",
+            "country_code", "region", "platform_name"
+        ),
+        measures=dict(TOTALS),
+        filters=("period", "period_from", "period_to", "month", "country_code", "isrc"),
+        order_by=("period", "isrc", "country_code", "platform_name")
+    ),
+    "platform_label_export": AggregateQuery(
+        group_by=(
+            "period", "year", "month", "platform_name", "label_id", "label_name",
+            "artist_id", "artist_name"
+        ),
+        measures={"unique_songs": "songs", **TOTALS},
+        filters=("period", "period_from", "period_to", "month", "artist_id", "platform_name", "label_name"),
+        order_by=("period", "artist_id", "platform_name", "label_id")
+    ),
+    # Monthly totals of a single entity, wrapped by `TimeSeries`
+    "artist_timeseries": AggregateQuery(
+        group_by=("period",),
+        measures=dict(TOTALS),
+        filters=("artist_id", "period_from", "period_to"),
+        order_by=("period",)
+    ),
+    "label_timeseries": AggregateQuery(
+        group_by=("period",),
+        measures=dict(TOTALS),
+        filters=("label_id", "period_from", "period_to"),
+        order_by=("period",)
+    ),
+    "platform_timeseries": AggregateQuery(
+        group_by=("period",),
+        measures=dict(TOTALS),
+        filters=("platform_name", "period_from", "period_to"),
+        order_by=("period",)
+    ),
+    "isrc_timeseries": AggregateQuery(
+        group_by=("period",),
+        measures=dict(TOTALS),
+        filters=("isrc", "period_from", "period_to"),
+        order_by=("period",)
+    )
+}
+
+
+class AggregateRouter:
+    """Routes endpoint queries to the smallest fresh aggregate able to answer them"""
+
+    @staticmethod
+    def candidates(query: AggregateQuery, predicates: List[Tuple[str, str, str]]) -> List[Source]:
+        """Sources able to answer the query, in static preference order"""
+        return [source for source in SOURCES if source.can_answer(query, predicates)]
+
+    @staticmethod
+    def fresh_views(conn: psycopg.Connection) -> Dict[str, float]:
+        """Estimated row counts of the materialized views refreshed since the last fact load"""
+        rows = execute_query(conn, Queries.aggregate_freshness())
+        return {
+            row["relation_name"]: row["estimated_rows"]
+            for row in rows
+            if row["is_fresh"]
+        }
+
+    @staticmethod
+    def plan(
+        conn: psycopg.Connection,
+        name: str,
+        params: Dict[str, Any],
+        limit: Optional[int] = None,
+        keyset: bool = False,
+        fields: Optional[Tuple[str, ...]] = None
+    ) -> Tuple[str, Source]:
+        """Pick the source for a routed query, projected onto `fields` if given, and render its SQL"""
+        query = ROUTED_QUERIES[name].project(fields) if fields else ROUTED_QUERIES[name]
+        predicates = query.predicates(params)
+
+        views = [s for s in AggregateRouter.candidates(query, predicates) if s is not FACT_SOURCE]
+        if views:
+            fresh = AggregateRouter.fresh_views(conn)
+            stale = [s.name for s in views if s.name not in fresh]
+            if stale:
+                logger.warning("Skipping stale aggregates for %s: %s", name, ", ".join(stale))
+            views = [s for s in views if s.name in fresh]
+            # Prefer the smallest view by planner estimate; unanalyzed views report -1
+            views.sort(key=lambda s: (fresh[s.name] if fresh[s.name] >= 0 else float("inf"), s.rank))
+
+        source = views[0] if views else FACT_SOURCE
+        if keyset and source is FACT_SOURCE:
+            logger.warning("Paging %s from the fact table: each page re-aggregates every matching fact", name)
+        return source.render(query, predicates, limit, keyset), source
+
+    @staticmethod
+    def execute(conn: psycopg.Connection, name: str, params: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], str]:
+        """Run a routed query, returning its rows and the name of the source used"""
+        from .snapshot import SnapshotEngine
+        answered = SnapshotEngine.execute(name, params)
+        if answered is not None:
+            return answered[0], "snapshot"
+
+        sql, source = AggregateRouter.plan(conn, name, params)
+        return execute_query(conn, sql, params, shared=True, name=f"{name}/{source.name}"), source.name
+
+    @staticmethod
+    def estimate_rows(conn: psycopg.Connection, sql: str, params: Dict[str, Any]) -> int:
+        """Planner estimate of the rows a query returns, without running it"""
+        plan = execute_one(conn, "EXPLAIN (FORMAT JSON) " + sql, params, name="estimate_rows")
+        return int(plan["QUERY PLAN"][0]["Plan"]["Plan Rows"])
+
+    @staticmethod
+    def page(
+        conn: psycopg.Connection,
+        name: str,
+        params: Dict[str, Any],
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None,
+        include_total: bool = False,
+        fields: Optional[Tuple[str, ...]] = None
+    ) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Run a routed query one keyset page at a time
+
+        Returns the rows and pagination meta: the source used, the cursor of
+        the next page (None on the last page) and, on request, the total row
+        count (a planner estimate unless served from the snapshot). With
+        `fields`, only those columns (plus the sort key) are computed.
+
+        Raises:
+            InvalidCursor: if the cursor is invalid for this query
+        """
+        from .snapshot import SnapshotEngine
+        query = ROUTED_QUERIES[name].project(fields) if fields else ROUTED_QUERIES[name]
+        params = dict(params)
+        values = decode_cursor(cursor, len(query.sort_key)) if cursor else None
+        if values:
+            params.update({f"after_{i}": value for i, value in enumerate(values)})
+
+        # Fetch one extra row to learn whether another page follows
+        fetch = limit + 1 if limit else None
+        answered = SnapshotEngine.execute(name, params, fetch, values, fields)
+        if answered is not None:
+            rows, total = answered
+            source = None
+        else:
+            sql, source = AggregateRouter.plan(conn, name, params, fetch, keyset=bool(cursor), fields=fields)
+            rows = execute_query(conn, sql, params, shared=True, name=f"{name}/{source.name}")
+
+        meta = {"source": source.name if source else "snapshot", "limit": limit, "next_cursor": None}
+        if limit and len(rows) > limit:
+            rows = rows[:limit]
+            meta["next_cursor"] = encode_cursor([rows[-1][col] for col in query.sort_key])
+        if include_total and source is None:
+            # The snapshot groups every row anyway, so its total is exact
+            meta["total_count"] = total
+            meta["total_is_estimate"] = False
+        elif include_total:
+            meta["total_count"] = AggregateRouter.estimate_rows(
+                conn, source.render(query, query.predicates(params)), params
+            )
+            meta["total_is_estimate"] = True
+        return rows, meta
@@ -0,0 +1,316 @@
+import functools
+import hashlib
+import inspect
+import json
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional, Tuple
+import psycopg
+from fastapi import Request, Response
+from pydantic.fields import FieldInfo
+from pydantic_core import PydanticUndefined
+from ..db.database import DB_CONFIG, get_db
+from ..models.base import ResponseModel, encode_response
+from .periods import add_months, current_period, months_between, parse_period, to_period
+from .snapshot import SnapshotEngine
+
+try:
+    import redis
+except ImportError:  # optional: the shared tier stays disabled without redis-py
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# Response caching; entries are invalidated by data generations, never by age
+CACHE_ENABLED = os.getenv("CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "2048"))
+
+# Optional shared tier (e.g. redis://localhost:6379/0); the TTL only bounds memory
+CACHE_REDIS_URL = os.getenv("CACHE_REDIS_URL")
+CACHE_SHARED_TTL = int(os.getenv("CACHE_SHARED_TTL", "86400"))
+
+# Encoded bodies are sent as they are
+JSON_RESPONSE = functools.partial(Response, media_type="application/json")
+
+# Clients may keep responses but must revalidate them with If-None-Match
+CACHE_CONTROL = "private, no-cache"
+
+# Channel notified by analytics.bump_data_generation
+GENERATION_CHANNEL = "data_generation"
+
+# Seconds to wait before reconnecting a lost generation listener
+LISTENER_RETRY = 5.0
+
+# Longest period range keyed by per-period generations; wider ranges use the global one
+MAX_KEYED_PERIODS = 120
+
+
+class Generations:
+    """
+    Process-local copy of analytics.data_generation, keyed by (tenant, period)
+
+    A background LISTEN connection reloads it whenever an import commits,
+    in any process, and has the analytics snapshot reloaded too. While the
+    listener is down the copy is not trusted and caching is bypassed.
+    """
+
+    _generations: Dict[Tuple[int, int], int] = {}
+    _live = False
+    _started = False
+    _lock = threading.Lock()
+
+    @staticmethod
+    def reload(conn: Optional[psycopg.Connection] = None):
+        """Replace the local copy with the table contents"""
+        if conn is None:
+            with get_db() as conn:
+                return Generations.reload(conn)
+        with conn.cursor() as cur:
+            cur.execute("SELECT tenant_id, period, generation FROM analytics.data_generation;")
+            Generations._generations = {(tenant, period): generation for tenant, period, generation in cur.fetchall()}
+
+    @staticmethod
+    def start():
+        """Start the listener thread once per process"""
+        with Generations._lock:
+            if Generations._started:
+                return
+            Generations._started = True
+        threading.Thread(target=Generations._listen, name="generation-listener", daemon=True).start()
+
+    @staticmethod
+    def _listen():
+        """Keep the local copy in sync with committed generation bumps"""
+        while True:
+            try:
+                with psycopg.connect(**DB_CONFIG, autocommit=True) as conn:
+                    conn.execute(f"LISTEN {GENERATION_CHANNEL};")
+                    # Load after LISTEN so no bump can fall in between
+                    Generations.reload(conn)
+                    Generations._live = True
+                    SnapshotEngine.schedule_reload(Generations.latest())
+                    for _ in conn.notifies():
+                        Generations.reload(conn)
+                        SnapshotEngine.schedule_reload(Generations.latest())
+            except Exception as e:
+                logger.warning("Generation listener lost, bypassing response cache: %s", e)
+            Generations._live = False
+            time.sleep(LISTENER_RETRY)
+
+    @staticmethod
+    def live() -> bool:
+        """Whether the local copy is known to be current"""
+        return Generations._live
+
+    @staticmethod
+    def latest() -> int:
+        """Generation bumped by every import, of any tenant"""
+        return Generations._generations.get((0, 0), 0)
+
+    @staticmethod
+    def token(periods: Optional[Iterable[int]], tenant_id: Optional[int] = None) -> str:
+        """Generation token for a set of periods (None: any period) of one tenant (None: all tenants)"""
+        current = Generations._generations
+        tenant = tenant_id or 0
+        prefix = f"t{tenant}" if tenant else ""
+        if periods is None:
+            return f"{prefix}g{current.get((tenant, 0), 0)}"
+        return f"{prefix}p" + ".".join(str(current.get((tenant, period), 0)) for period in periods)
+
+
+def dependent_periods(params: Dict[str, Any], lookback: int = 0) -> Optional[Tuple[int, ...]]:
+    """
+    Periods an endpoint's response depends on, from its raw parameters
+
+    Only explicit ranges and year/month pairs are narrowed down; anything
+    else (defaults, bare months, no period at all) depends on every period.
+    `lookback` months before the range are included too, for endpoints that
+    read them (e.g. time series deltas and rolling sums).
+    """
+    try:
+        first = parse_period(params["period_from"]) if params.get("period_from") else None
+        last = parse_period(params["period_to"]) if params.get("period_to") else None
+    except ValueError:
+        return None
+    year, month = params.get("year"), params.get("month")
+    if first is None and last is None and year and month:
+        try:
+            first = last = to_period(year, month)
+        except ValueError:
+            return None
+    elif first is None and last is None and year:
+        first, last = year * 100 + 1, year * 100 + 12
+    if first is not None and lookback:
+        first = add_months(first, -lookback)
+
+    if first is None or last is None or not 0 <= months_between(first, last) < MAX_KEYED_PERIODS:
+        return None
+    return tuple(add_months(first, i) for i in range(months_between(first, last) + 1))
+
+
+class LRUCache:
+    """Thread-safe in-process LRU of response objects"""
+
+    def __init__(self, max_entries: int):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, Any]" = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[Any]:
+        with self.lock:
+            value = self.entries.get(key)
+            if value is not None:
+                self.entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any):
+        with self.lock:
+            self.entries[key] = value
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class ResponseCache:
+    """
+    Two-tier cache of encoded JSON bodies keyed by endpoint, parameters and data generation
+
+    Bodies are stored as bytes and served as they are, so a hit builds no
+    models and encodes nothing.
+    """
+
+    local = LRUCache(CACHE_MAX_ENTRIES)
+    shared = redis.Redis.from_url(CACHE_REDIS_URL) if redis is not None and CACHE_REDIS_URL else None
+    hits = 0
+    misses = 0
+    _lock = threading.Lock()
+
+    @staticmethod
+    def key(endpoint: str, params: Dict[str, Any], lookback: int = 0) -> str:
+        """
+        Cache key: endpoint, normalized parameters (tenant included), current
+        month and the generations of the periods read (see dependent_periods)
+        """
+        normalized = json.dumps(
+            {k: v for k, v in sorted(params.items()) if v is not None}, default=str, separators=(",", ":")
+        )
+        digest = hashlib.sha1(normalized.encode()).hexdigest()
+        # Endpoints defaulting to the current month change when the month does
+        token = Generations.token(dependent_periods(params, lookback), params.get("tenant_id"))
+        return f"royalty-cache:{endpoint}:{digest}:{current_period()}:{token}"
+
+    @staticmethod
+    def get(key: str) -> Optional[bytes]:
+        body = ResponseCache.local.get(key)
+        if body is None and ResponseCache.shared is not None:
+            try:
+                body = ResponseCache.shared.get(key)
+            except Exception as e:
+                logger.warning("Shared cache read failed: %s", e)
+            if body is not None:
+                ResponseCache.local.set(key, body)
+        with ResponseCache._lock:
+            if body is None:
+                ResponseCache.misses += 1
+            else:
+                ResponseCache.hits += 1
+        return body
+
+    @staticmethod
+    def set(key: str, body: bytes):
+        ResponseCache.local.set(key, body)
+        if ResponseCache.shared is not None:
+            try:
+                ResponseCache.shared.set(key, body, ex=CACHE_SHARED_TTL)
+            except Exception as e:
+                logger.warning("Shared cache write failed: %s", e)
+
+
+def etag(key: str) -> str:
+    """Weak ETag for a cache key; it changes whenever the key's generations do"""
+    return 'W/"' + hashlib.sha1(key.encode()).hexdigest()[:24] + '"'
+
+
+def etag_matches(if_none_match: Optional[str], tag: str) -> bool:
+    """Whether an If-None-Match header matches an ETag (weak comparison)"""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    return "*" in candidates or any(candidate.removeprefix("W/") == tag.removeprefix("W/") for candidate in candidates)
+
+
+def cached(endpoint: str, lookback: Optional[Callable[[Dict[str, Any]], int]] = None) -> Callable:
+    """
+    Cache an endpoint's encoded response until the data it depends on changes
+
+    `lookback` gives, from a request's parameters, the months before its
+    period range that the endpoint also reads.
+
+    ResponseModel results are encoded once and returned as raw JSON
+    responses, skipping FastAPI's response_model validation and encoding;
+    the cache stores and serves those bytes. Responses carry an ETag derived
+    from the same key, and requests whose If-None-Match still matches are
+    answered with 304 before the endpoint runs. Only successful responses are
+    stored and tagged. The generation token is taken before the endpoint
+    runs, so a response computed while an import commits is stored under the
+    older generation. Neither caching nor ETags apply while the generation
+    listener is down. Endpoints are plain functions, run in the threadpool so
+    that identical concurrent requests can share queries (see SingleFlight).
+    """
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(request: Request, **kwargs):
+            Generations.start()
+            if not Generations.live():
+                result = func(**kwargs)
+                return JSON_RESPONSE(encode_response(result)) if isinstance(result, ResponseModel) else result
+
+            key = ResponseCache.key(endpoint, kwargs, lookback(kwargs) if lookback else 0)
+            headers = {"ETag": etag(key), "Cache-Control": CACHE_CONTROL}
+            if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+                return Response(status_code=304, headers=headers)
+
+            body = ResponseCache.get(key) if CACHE_ENABLED else None
+            if body is None:
+                result = func(**kwargs)
+                if not isinstance(result, ResponseModel):
+                    return result
+                body = encode_response(result)
+                # Failures are neither stored nor tagged, so the next request retries
+                if not result.success:
+                    return JSON_RESPONSE(body)
+                if CACHE_ENABLED:
+                    ResponseCache.set(key, body)
+            return JSON_RESPONSE(body, headers=headers)
+
+        def warm(**kwargs) -> bool:
+            """Compute and store the response for a request, filling in parameter defaults"""
+            kwargs = {**defaults, **kwargs}
+            key = ResponseCache.key(endpoint, kwargs, lookback(kwargs) if lookback else 0)
+            result = func(**kwargs)
+            if isinstance(result, ResponseModel) and result.success:
+                ResponseCache.set(key, encode_response(result))
+                return True
+            return False
+
+        # Let FastAPI inject the request next to the endpoint's own parameters
+        signature = inspect.signature(func)
+        defaults = {}
+        for name, parameter in signature.parameters.items():
+            default = parameter.default.default if isinstance(parameter.default, FieldInfo) else parameter.default
+            if default not in (inspect.Parameter.empty, PydanticUndefined, Ellipsis):
+                defaults[name] = default
+        wrapper.warm = warm
+        wrapper.__signature__ = signature.replace(parameters=[
+            *signature.parameters.values(),
+            inspect.Parameter("request", inspect.Parameter.KEYWORD_ONLY, annotation=Request),
+        ])
+        return wrapper
+    return decorator
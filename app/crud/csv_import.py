@@ -1,8 +1,11 @@
 import csv
-from typing import List, Dict, Any
+import time
+from typing import List, Dict, Any, Optional
 from datetime import datetime
 from pathlib import Path
-from .data_import import DataImport
+from .data_import import DataImport, ImportThrottle, ImportThrottled
+from .warming import CacheWarmer
+from .telemetry import ImportTelemetry
 
 class CSVImport:
     """Handles importing data from CSV files"""
@@ -97,62 +100,102 @@ class CSVImport:
         return platform_configs
 
     @staticmethod
-    def import_revenue_from_csv(file_path: str) -> Dict[str, Any]:
-        """Import revenue data from CSV file"""
-        try:
-            # Read CSV file
-            revenue_data = CSVImport.read_revenue_csv(file_path)
-            if not revenue_data:
-                return {
-                    "success": False,
-                    "message": "No valid data found in CSV file",
-                    "rows_processed": 0
-                }
+    def import_revenue_from_csv(file_path: str, tenant_id: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Import revenue data from CSV file, as one tenant if given
 
-            # Stage the data
-            success = DataImport.stage_revenue_data(revenue_data)
-            if not success:
-                return {
+        The result carries the import's `job_id` and the `telemetry` of each
+        stage (parse, wait for a slot, stage, ETL, each view refresh, cache
+        warming), which is also saved to analytics.import_history.
+        """
+        with ImportTelemetry(tenant_id, Path(file_path).name) as telemetry:
+            try:
+                # Read CSV file
+                with telemetry.stage("parse") as stage:
+                    revenue_data = CSVImport.read_revenue_csv(file_path)
+                    stage["rows"] = len(revenue_data)
+                if not revenue_data:
+                    return telemetry.finish({
+                        "success": False,
+                        "message": "No valid data found in CSV file",
+                        "rows_processed": 0
+                    })
+
+                # At most TENANT_IMPORT_CONCURRENCY imports per tenant load at once
+                waiting = time.perf_counter()
+                with ImportThrottle.slot(tenant_id):
+                    telemetry.record("wait", time.perf_counter() - waiting)
+                    return telemetry.finish(CSVImport._load_revenue(revenue_data, tenant_id, telemetry))
+
+            except ImportThrottled as e:
+                telemetry.record("wait", time.perf_counter() - waiting)
+                return telemetry.finish({
                     "success": False,
-                    "message": "Failed to stage revenue data",
+                    "throttled": True,
+                    "message": str(e),
                     "rows_processed": 0
-                }
-
-            # Process the staged data
-            stats = DataImport.process_staged_revenue()
-            if "ERROR" in stats:
-                return {
+                })
+            except Exception as e:
+                return telemetry.finish({
                     "success": False,
-                    "message": f"Error processing data: {stats['ERROR']}",
-                    "rows_processed": len(revenue_data)
-                }
+                    "message": str(e),
+                    "rows_processed": 0
+                })
 
-            # Refresh materialized views
-            view_results = DataImport.refresh_materialized_views()
-            if not all(view_results.values()):
-                return {
-                    "success": True,
-                    "message": "Data imported but some views failed to refresh",
-                    "rows_processed": len(revenue_data),
-                    "processing_stats": stats,
-                    "view_refresh": view_results
-                }
+    @staticmethod
+    def _load_revenue(
+        revenue_data: List[Dict[str, Any]],
+        tenant_id: Optional[int],
+        telemetry: ImportTelemetry
+    ) -> Dict[str, Any]:
+        """Stage, process and publish parsed revenue rows"""
+        rows = len(revenue_data)
 
+        # Stage the data
+        with telemetry.stage("stage", rows):
+            success = DataImport.stage_revenue_data(revenue_data, tenant_id)
+        if not success:
             return {
-                "success": True,
-                "message": "Revenue data imported successfully",
-                "rows_processed": len(revenue_data),
-                "processing_stats": stats,
-                "view_refresh": view_results
+                "success": False,
+                "message": "Failed to stage revenue data",
+                "rows_processed": 0
             }
 
-        except Exception as e:
+        # Process the staged data
+        with telemetry.stage("etl", rows):
+            stats = DataImport.process_staged_revenue(tenant_id)
+        if "ERROR" in stats:
             return {
                 "success": False,
-                "message": str(e),
-                "rows_processed": 0
+                "message": f"Error processing data: {stats['ERROR']}",
+                "rows_processed": rows
             }
 
+        # Refresh materialized views
+        view_results = DataImport.refresh_materialized_views(telemetry)
+
+        # Precompute the hot responses the import invalidated
+        with telemetry.stage("warm"):
+            cache_warming = CacheWarmer.warm([row["id"] for row in revenue_data], tenant_id)
+        if not all(view_results.values()):
+            return {
+                "success": True,
+                "message": "Data imported but some views failed to refresh",
+                "rows_processed": rows,
+                "processing_stats": stats,
+                "view_refresh": view_results,
+                "cache_warming": cache_warming
+            }
+
+        return {
+            "success": True,
+            "message": "Revenue data imported successfully",
+            "rows_processed": rows,
+            "processing_stats": stats,
+            "view_refresh": view_results,
+            "cache_warming": cache_warming
+        }
+
     @staticmethod
     def import_platforms_from_csv(file_path: str) -> Dict[str, Any]:
         """Import platform configurations from CSV file"""
@@ -1,6 +1,63 @@
-from typing import List, Dict, Any
+import os
+import threading
+from contextlib import contextmanager, nullcontext
+from typing import List, Dict, Any, Optional
 from datetime import datetime
+from decimal import Decimal
 from ..db.database import get_db, execute_query
+from .snapshot import SnapshotEngine
+from .cache import Generations
+
+# Imports running at once for one tenant, and across all tenants
+TENANT_IMPORT_CONCURRENCY = int(os.getenv("TENANT_IMPORT_CONCURRENCY", "1"))
+IMPORT_CONCURRENCY = int(os.getenv("IMPORT_CONCURRENCY", "2"))
+
+# Seconds an import waits for a free slot before it is turned away
+IMPORT_WAIT = float(os.getenv("IMPORT_WAIT", "30"))
+
+
+class ImportThrottled(Exception):
+    """No import slot became free in time"""
+
+
+class ImportThrottle:
+    """
+    Caps concurrent imports per tenant and overall
+
+    A tenant importing a large file holds its own slot, so further imports of
+    that tenant queue behind it instead of piling onto the database while
+    other tenants' imports still get through.
+    """
+
+    _tenants: Dict[Optional[int], threading.BoundedSemaphore] = {}
+    _all = threading.BoundedSemaphore(IMPORT_CONCURRENCY)
+    _lock = threading.Lock()
+
+    @staticmethod
+    @contextmanager
+    def slot(tenant_id: Optional[int] = None):
+        """
+        Hold an import slot of a tenant (None: imports without a tenant)
+
+        Raises:
+            ImportThrottled: if no slot frees up within IMPORT_WAIT seconds
+        """
+        with ImportThrottle._lock:
+            tenant = ImportThrottle._tenants.setdefault(
+                tenant_id, threading.BoundedSemaphore(TENANT_IMPORT_CONCURRENCY)
+            )
+        if not tenant.acquire(timeout=IMPORT_WAIT):
+            raise ImportThrottled(f"Tenant {tenant_id} already has {TENANT_IMPORT_CONCURRENCY} import(s) running")
+        try:
+            if not ImportThrottle._all.acquire(timeout=IMPORT_WAIT):
+                raise ImportThrottled(f"{IMPORT_CONCURRENCY} imports are already running")
+            try:
+                yield
+            finally:
+                ImportThrottle._all.release()
+        finally:
+            tenant.release()
+
 
 class DataImport:
     """Handles data import and ETL processes"""
@@ -42,7 +99,7 @@ class DataImport:
             return False
 
     @staticmethod
-    def stage_revenue_data(revenue_data: List[Dict[str, Any]]) -> bool:
+    def stage_revenue_data(revenue_data: List[Dict[str, Any]], tenant_id: Optional[int] = None) -> bool:
         """
         Stage revenue data for processing
         
@@ -55,6 +112,7 @@ class DataImport:
                 "revenue": float,
                 "artist_id": int
             }
+            tenant_id: Tenant importing the rows (None: each artist's own)
         """
         query = """
         INSERT INTO analytics.stg_revenue_import (
@@ -72,6 +130,7 @@ class DataImport:
             total,
             royalty,
             userid,
+            tenant_id,
             status
         ) VALUES (
             %(id)s,
@@ -88,6 +147,7 @@ class DataImport:
             %(total)s,
             %(royalty)s,
             %(userid)s,
+            %(tenant_id)s,
             'PENDING'
         );
         """
@@ -95,7 +155,7 @@ class DataImport:
         try:
             with get_db() as conn:
                 with conn.cursor() as cur:
-                    cur.executemany(query, revenue_data)
+                    cur.executemany(query, [{**row, "tenant_id": tenant_id} for row in revenue_data])
                     conn.commit()
                     return True
         except Exception as e:
@@ -103,14 +163,18 @@ class DataImport:
             return False
 
     @staticmethod
-    def process_staged_revenue() -> Dict[str, int]:
-        """Process staged revenue data"""
+    def process_staged_revenue(tenant_id: Optional[int] = None) -> Dict[str, int]:
+        """Process staged revenue data, of one tenant only if given"""
+        params = {"tenant_id": tenant_id}
         try:
             with get_db() as conn:
                 # Call the ETL stored procedure
                 with conn.cursor() as cur:
-                    cur.execute("CALL analytics.process_revenue_import();")
+                    cur.execute("CALL analytics.process_revenue_import(%(tenant_id)s::int);", params)
                     conn.commit()
+                # Don't wait for the notification to stop serving cached responses
+                Generations.reload(conn)
+                SnapshotEngine.schedule_reload(Generations.latest())
 
                 # Get processing statistics
                 stats_query = """
@@ -118,9 +182,10 @@ class DataImport:
                     status,
                     COUNT(*) as count
                 FROM analytics.stg_revenue_import
+                WHERE %(tenant_id)s::int IS NULL OR tenant_id = %(tenant_id)s::int
                 GROUP BY status;
                 """
-                stats = execute_query(conn, stats_query)
+                stats = execute_query(conn, stats_query, params, name="import_stats")
                 
                 return {row['status']: row['count'] for row in stats}
 
@@ -129,10 +194,12 @@ class DataImport:
             return {"ERROR": str(e)}
 
     @staticmethod
-    def refresh_materialized_views() -> Dict[str, bool]:
-        """Refresh all materialized views"""
+    def refresh_materialized_views(telemetry=None) -> Dict[str, bool]:
+        """Refresh all materialized views, timing each as an import stage if telemetry is given"""
         views = [
             'mv_revenue_overview',
+            'mv_artist_dashboard',
+            'mv_platform_analytics',
             'mv_artist_earnings',
             'mv_platform_revenue',
             'mv_artist_performance',
@@ -145,12 +212,82 @@ class DataImport:
         with get_db() as conn:
             for view in views:
                 try:
-                    with conn.cursor() as cur:
+                    with telemetry.stage(f"refresh:{view}") if telemetry else nullcontext(), conn.cursor() as cur:
                         cur.execute(f"REFRESH MATERIALIZED VIEW CONCURRENTLY analytics.{view};")
+                        cur.execute("""
+                        INSERT INTO analytics.refresh_log (relation_name, refreshed_at)
+                        VALUES (%(view)s, now())
+                        ON CONFLICT (relation_name) DO UPDATE SET refreshed_at = EXCLUDED.refreshed_at;
+                        """, {"view": view})
                         conn.commit()
                         results[view] = True
                 except Exception as e:
+                    conn.rollback()
                     print(f"Error refreshing {view}: {e}")
                     results[view] = False
         
         return results
+
+    @staticmethod
+    def detach_partition(period: int, archive: bool = True) -> bool:
+        """
+        Detach a month from the partitioned fact table
+
+        The views are refreshed afterwards so routed queries don't fall back
+        to the fact table until the next import.
+
+        Args:
+            period: YYYYMM period key of the month to detach
+            archive: Move the partition to analytics_archive instead of dropping it
+        """
+        try:
+            with get_db() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "CALL analytics.detach_fact_partition(%(period)s, %(archive)s);",
+                        {"period": period, "archive": archive}
+                    )
+                    conn.commit()
+                    Generations.reload(conn)
+                    SnapshotEngine.schedule_reload(Generations.latest())
+        except Exception as e:
+            print(f"Error detaching partition for {period}: {e}")
+            return False
+
+        refreshed = DataImport.refresh_materialized_views()
+        if not all(refreshed.values()):
+            print(f"Views still stale after detaching {period}: {[v for v, ok in refreshed.items() if not ok]}")
+        return True
+
+    @staticmethod
+    def record_payout(artist_id: int, amount: Decimal, reference: Optional[str] = None) -> bool:
+        """
+        Debit a payout from an artist's balance and record it in the ledger
+
+        Fails when the amount exceeds the artist's balance.
+        """
+        try:
+            with get_db() as conn:
+                with conn.cursor() as cur:
+                    cur.execute(
+                        "CALL analytics.record_payout(%(artist_id)s, %(amount)s, %(reference)s);",
+                        {"artist_id": artist_id, "amount": amount, "reference": reference}
+                    )
+                    conn.commit()
+                    return True
+        except Exception as e:
+            print(f"Error recording payout for artist {artist_id}: {e}")
+            return False
+
+    @staticmethod
+    def rebuild_payout_balances() -> bool:
+        """Recompute every payout balance from the fact table and recorded payouts"""
+        try:
+            with get_db() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("CALL analytics.rebuild_payout_balances();")
+                    conn.commit()
+                    return True
+        except Exception as e:
+            print(f"Error rebuilding payout balances: {e}")
+            return False
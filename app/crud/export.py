@@ -0,0 +1,61 @@
+import os
+import zlib
+from typing import Any, Dict, Iterator
+import psycopg
+from ..db.database import get_db
+from .aggregates import AggregateRouter
+
+# Routed queries behind each export
+EXPORTS = {
+    "geography": "geography_export",
+    "platform-label": "platform_label_export"
+}
+
+# COPY options per format. NDJSON is one row_to_json() per line written as a
+# CSV field whose quote and delimiter are control characters, which JSON
+# always escapes, so the lines come out verbatim (text format would double
+# every backslash).
+FORMATS = {
+    "csv": ("text/csv", "FORMAT csv, HEADER"),
+    "ndjson": ("application/x-ndjson", "FORMAT csv, QUOTE e'\\x01', DELIMITER e'\\x02'")
+}
+
+# Compression level of gzip exports; lower trades size for throughput
+EXPORT_GZIP_LEVEL = int(os.getenv("EXPORT_GZIP_LEVEL", "6"))
+
+
+class Export:
+    """Streams full analytics breakdowns with COPY ... TO STDOUT"""
+
+    @staticmethod
+    def render(sql: str, fmt: str) -> str:
+        """COPY statement for a routed query in the given format"""
+        sql = sql.strip().rstrip(";")
+        if fmt == "ndjson":
+            sql = f"SELECT row_to_json(export_row) FROM ({sql}) export_row"
+        return f"COPY ({sql}) TO STDOUT WITH ({FORMATS[fmt][1]});"
+
+    @staticmethod
+    def copy(conn: psycopg.Connection, export: str, params: Dict[str, Any], fmt: str) -> Iterator[memoryview]:
+        """Yield the blocks of an export as COPY delivers them"""
+        sql, _ = AggregateRouter.plan(conn, EXPORTS[export], params)
+        with conn.cursor() as cur:
+            with cur.copy(Export.render(sql, fmt), params) as copy:
+                yield from copy
+
+    @staticmethod
+    def stream(export: str, params: Dict[str, Any], fmt: str, compress: bool = False) -> Iterator[bytes]:
+        """
+        Yield an export as it is produced, optionally gzip-compressed
+
+        Memory stays constant: blocks are forwarded as they arrive, on a
+        connection held for the duration of the stream.
+        """
+        with get_db() as conn:
+            compressor = zlib.compressobj(EXPORT_GZIP_LEVEL, zlib.DEFLATED, 31) if compress else None
+            for block in Export.copy(conn, export, params, fmt):
+                data = compressor.compress(block) if compressor else bytes(block)
+                if data:
+                    yield data
+            if compressor:
+                yield compressor.flush()
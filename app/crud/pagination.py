@@ -0,0 +1,45 @@
+import base64
+import json
+from decimal import Decimal
+from typing import Any, List
+
+
+class InvalidCursor(ValueError):
+    """Raised when a pagination cursor cannot be decoded"""
+
+
+def encode_cursor(values: List[Any]) -> str:
+    """Encode the sort key of the last returned row as an opaque cursor"""
+    encoded = [{"d": str(v)} if isinstance(v, Decimal) else v for v in values]
+    raw = json.dumps(encoded, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    """
+    Decode a cursor produced by `encode_cursor`
+
+    Raises:
+        InvalidCursor: if the cursor is malformed or does not match the sort key size
+    """
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (ValueError, TypeError) as e:
+        raise InvalidCursor(f"Invalid cursor: {e}")
+
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursor("Invalid cursor: sort key mismatch")
+    decoded = []
+    for v in values:
+        if isinstance(v, dict):
+            if set(v) != {"d"} or not isinstance(v["d"], str):
+                raise InvalidCursor("Invalid cursor: malformed decimal")
+            try:
+                v = Decimal(v["d"])
+            except ArithmeticError as e:
+                raise InvalidCursor(f"Invalid cursor: {e}")
+        elif v is not None and not isinstance(v, (str, int, float)):
+            raise InvalidCursor("Invalid cursor: sort key values must be scalars")
+        decoded.append(v)
+    return decoded
@@ -0,0 +1,66 @@
+from typing import Any, Dict, Optional
+from datetime import datetime
+
+MONTHS = ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+          'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')
+
+
+def to_period(year: int, month: str) -> int:
+    """Convert a year and 'Mon' month to a YYYYMM period key"""
+    return year * 100 + MONTHS.index(month) + 1
+
+
+def from_period(period: int) -> tuple:
+    """Convert a YYYYMM period key back to (year, 'Mon')"""
+    return period // 100, MONTHS[period % 100 - 1]
+
+
+def parse_period(value: str) -> int:
+    """Parse a 'YYYY-MM' string into a YYYYMM period key"""
+    parsed = datetime.strptime(value, '%Y-%m')
+    return parsed.year * 100 + parsed.month
+
+
+def format_period(period: int) -> str:
+    """Format a YYYYMM period key as 'YYYY-MM'"""
+    return f"{period // 100:04d}-{period % 100:02d}"
+
+
+def add_months(period: int, months: int) -> int:
+    """Shift a YYYYMM period key by a number of months (negative goes back)"""
+    index = (period // 100) * 12 + period % 100 - 1 + months
+    return (index // 12) * 100 + index % 12 + 1
+
+
+def months_between(period_from: int, period_to: int) -> int:
+    """Number of months from one period key to another (0 for the same month)"""
+    return (period_to // 100 - period_from // 100) * 12 + period_to % 100 - period_from % 100
+
+
+def current_period() -> int:
+    """Period key of the current month"""
+    now = datetime.now()
+    return now.year * 100 + now.month
+
+
+def period_filters(
+    year: Optional[int] = None,
+    month: Optional[str] = None,
+    period_from: Optional[int] = None,
+    period_to: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Translate year/month and from/to parameters into period filters
+
+    A full year and month pins a single period, a bare year becomes a
+    period range, and a bare month can only be matched on the month column.
+    """
+    filters = {"period": None, "period_from": period_from, "period_to": period_to, "month": None}
+    if year and month:
+        filters["period"] = to_period(year, month)
+    elif year:
+        filters["period_from"] = max(period_from or 0, year * 100 + 1)
+        filters["period_to"] = min(period_to or year * 100 + 12, year * 100 + 12)
+    elif month:
+        filters["month"] = month
+    return filters
@@ -1,3 +1,5 @@
+from ..db.metrics import Metrics
+
 class Queries:
     """SQL queries for analytics"""
 
@@ -8,22 +10,32 @@ class Queries:
         SELECT EXISTS (
             SELECT 1 
             FROM analytics.fact_monthly_revenue
-            WHERE year = %(year)s 
-            AND month = %(month)s
+            WHERE period = %(period)s
         ) as exists;
         """
 
     @staticmethod
     def validate_artist():
-        """Check if artist exists"""
+        """Check if artist exists (within the tenant, if one is given)"""
         return """
         SELECT EXISTS (
             SELECT 1 
             FROM whitelabel.artist
             WHERE artist_id = %(artist_id)s
+            AND (%(tenant_id)s::int IS NULL OR tenant_id = %(tenant_id)s::int)
         ) as exists;
         """
 
+    @staticmethod
+    def existing_artists():
+        """Artist IDs of a list that exist (within the tenant, if one is given)"""
+        return """
+        SELECT artist_id
+        FROM whitelabel.artist
+        WHERE artist_id = ANY(%(artist_ids)s)
+        AND (%(tenant_id)s::int IS NULL OR tenant_id = %(tenant_id)s::int);
+        """
+
     @staticmethod
     def revenue_overview():
         """Get revenue overview for a specific month"""
@@ -43,8 +55,7 @@ class Queries:
             earliest_record,
             latest_record
         FROM analytics.mv_revenue_overview
-        WHERE year = %(year)s 
-        AND month = %(month)s;
+        WHERE period = %(period)s;
         """
 
     @staticmethod
@@ -56,6 +67,7 @@ class Queries:
             a.artist_name,
             l.label_id,
             l.label_name,
+            fr.period,
             fr.year,
             fr.month,
             COUNT(DISTINCT s.song_id) AS songs,
@@ -69,8 +81,8 @@ class Queries:
         JOIN whitelabel.artist a ON fr.artist_id = a.artist_id
         JOIN whitelabel.label l ON s.label_id = l.label_id
         WHERE a.artist_id = %(artist_id)s
-        GROUP BY a.artist_id, a.artist_name, l.label_id, l.label_name, fr.year, fr.month
-        ORDER BY fr.year DESC, fr.month DESC
+        GROUP BY a.artist_id, a.artist_name, l.label_id, l.label_name, fr.period, fr.year, fr.month
+        ORDER BY fr.period DESC
         LIMIT 1;
         """
 
@@ -93,8 +105,7 @@ class Queries:
             earliest_record,
             latest_record
         FROM analytics.mv_platform_analytics
-        WHERE year = EXTRACT(YEAR FROM CURRENT_DATE)
-        AND month = TO_CHAR(CURRENT_DATE, 'Mon');
+        WHERE period = analytics.to_period(CURRENT_DATE);
         """
 
     @staticmethod
@@ -110,8 +121,7 @@ class Queries:
         FROM analytics.fact_monthly_revenue fr
         JOIN analytics.platform_config pc ON fr.platform_id = pc.platform_id
         JOIN whitelabel.song ws ON fr.song_id = ws.song_id
-        WHERE fr.year = %(year)s
-        AND fr.month = %(month)s
+        WHERE fr.period = %(period)s
         GROUP BY pc.platform_name;
         """
 
@@ -129,8 +139,7 @@ class Queries:
         FROM analytics.fact_monthly_revenue fr
         JOIN whitelabel.song ws ON fr.song_id = ws.song_id
         JOIN whitelabel.artist wa ON ws.artist_id = wa.artist_id
-        WHERE fr.year = %(year)s
-        AND fr.month = %(month)s
+        WHERE fr.period = %(period)s
         GROUP BY wa.artist_id, wa.artist_name
         ORDER BY total_revenue DESC
         LIMIT 10;
@@ -151,8 +160,7 @@ class Queries:
         FROM analytics.fact_monthly_revenue fr
         JOIN whitelabel.song ws ON fr.song_id = ws.song_id
         JOIN whitelabel.label wl ON ws.label_id = wl.label_id
-        WHERE fr.year = %(year)s
-        AND fr.month = %(month)s
+        WHERE fr.period = %(period)s
         GROUP BY wl.label_id, wl.label_name
         ORDER BY total_revenue DESC;
         """
@@ -162,6 +170,7 @@ class Queries:
         """Get revenue and performance metrics by geography"""
         return """
         SELECT 
+            fr.period,
             fr.year,
             fr.month,
             s.isrc,
@@ -178,11 +187,12 @@ class Queries:
         JOIN whitelabel.artist a ON fr.artist_id = a.artist_id
         JOIN analytics.dim_geography g ON fr.geography_id = g.geography_id
         JOIN analytics.platform_config p ON fr.platform_id = p.platform_id
-        WHERE fr.year = COALESCE(%(year)s::int, fr.year)
+        WHERE fr.period = COALESCE(%(period)s::int, fr.period)
+          AND fr.period BETWEEN COALESCE(%(period_from)s::int, 0) AND COALESCE(%(period_to)s::int, 999999)
           AND fr.month = COALESCE(%(month)s::varchar, fr.month)
           AND g.country_code = COALESCE(%(country_code)s::varchar, g.country_code)
           AND s.isrc = COALESCE(%(isrc)s::varchar, s.isrc)
-        GROUP BY fr.year, fr.month, s.isrc, s.title, a.artist_name, g.country_code, g.region, p.platform_name
+        GROUP BY fr.period, fr.year, fr.month, s.isrc, s.title, a.artist_name, g.country_code, g.region, p.platform_name
         ORDER BY total_revenue DESC;
         """
 
@@ -191,6 +201,7 @@ class Queries:
         """Get revenue, plays, and royalty by platform and label, including year, month, artist, and unique_songs for model compatibility"""
         return """
         SELECT
+            fr.period,
             fr.year,
             fr.month,
             p.platform_name,
@@ -207,6 +218,166 @@ class Queries:
         JOIN whitelabel.label l ON s.label_id = l.label_id
         JOIN analytics.platform_config p ON fr.platform_id = p.platform_id
         JOIN whitelabel.artist a ON fr.artist_id = a.artist_id
-        GROUP BY fr.year, fr.month, p.platform_name, l.label_id, l.label_name, a.artist_id, a.artist_name
+        GROUP BY fr.period, fr.year, fr.month, p.platform_name, l.label_id, l.label_name, a.artist_id, a.artist_name
         ORDER BY total_revenue DESC;
         """
+
+    @staticmethod
+    def distinct_sketches():
+        """Get the distinct-count sketches of a dimension value over a period set"""
+        return """
+        SELECT metric, registers
+        FROM analytics.distinct_sketch
+        WHERE dimension = %(dimension)s
+        AND dimension_value = %(dimension_value)s
+        AND period = COALESCE(%(period)s::int, period)
+        AND period BETWEEN COALESCE(%(period_from)s::int, 0) AND COALESCE(%(period_to)s::int, 999999)
+        AND (%(month_number)s::int IS NULL OR period %% 100 = %(month_number)s::int);
+        """
+
+    @staticmethod
+    def distinct_counts():
+        """Get exact distinct artist and song counts over a period set"""
+        return """
+        SELECT 
+            COUNT(DISTINCT fr.artist_id) AS active_artists,
+            COUNT(DISTINCT fr.song_id) AS unique_songs
+        FROM analytics.fact_monthly_revenue fr
+        JOIN whitelabel.song s ON fr.song_id = s.song_id
+        JOIN analytics.platform_config p ON fr.platform_id = p.platform_id
+        WHERE fr.period = COALESCE(%(period)s::int, fr.period)
+        AND fr.period BETWEEN COALESCE(%(period_from)s::int, 0) AND COALESCE(%(period_to)s::int, 999999)
+        AND (%(month_number)s::int IS NULL OR fr.period %% 100 = %(month_number)s::int)
+        AND p.platform_name = COALESCE(%(platform_name)s, p.platform_name)
+        AND s.label_id = COALESCE(%(label_id)s::int, s.label_id);
+        """
+
+    @staticmethod
+    def aggregate_freshness():
+        """Get materialized views with their freshness against the last fact load"""
+        return """
+        SELECT 
+            r.relation_name,
+            r.refreshed_at >= f.refreshed_at AS is_fresh,
+            COALESCE(c.reltuples, -1) AS estimated_rows
+        FROM analytics.refresh_log r
+        CROSS JOIN (
+            SELECT refreshed_at
+            FROM analytics.refresh_log
+            WHERE relation_name = 'fact_monthly_revenue'
+        ) f
+        LEFT JOIN pg_class c ON c.oid = to_regclass('analytics.' || r.relation_name)
+        WHERE r.relation_name <> 'fact_monthly_revenue';
+        """
+
+    @staticmethod
+    def imported_scope():
+        """Periods and artists of the staged rows an import processed, by royalty"""
+        return """
+        SELECT
+            analytics.to_period(month) AS period,
+            userid AS artist_id,
+            SUM(royalty) AS royalty
+        FROM analytics.stg_revenue_import
+        WHERE id = ANY(%(ids)s)
+        AND status = 'PROCESSED'
+        GROUP BY 1, 2;
+        """
+
+    @staticmethod
+    def statement_lines():
+        """Statement lines of every artist for a period, sorted by artist"""
+        return """
+        SELECT
+            fr.artist_id,
+            a.artist_name,
+            s.isrc,
+            s.title AS song_name,
+            p.platform_name,
+            g.country_code,
+            SUM(fr.total_plays) AS plays,
+            SUM(fr.revenue_amount) AS revenue,
+            SUM(fr.royalty_amount) AS royalty
+        FROM analytics.fact_monthly_revenue fr
+        JOIN whitelabel.artist a ON fr.artist_id = a.artist_id
+        JOIN whitelabel.song s ON fr.song_id = s.song_id
+        JOIN analytics.platform_config p ON fr.platform_id = p.platform_id
+        LEFT JOIN analytics.dim_geography g ON fr.geography_id = g.geography_id
+        WHERE fr.period = %(period)s
+        AND (%(tenant_id)s::int IS NULL OR fr.tenant_id = %(tenant_id)s::int)
+        GROUP BY fr.artist_id, a.artist_name, s.isrc, s.title, p.platform_name, g.country_code
+        ORDER BY fr.artist_id, s.isrc, p.platform_name, g.country_code;
+        """
+
+    @staticmethod
+    def payouts_due():
+        """Artists whose carried-forward balance reached their payment threshold"""
+        return """
+        SELECT
+            b.artist_id,
+            a.artist_name,
+            b.tenant_id,
+            b.balance,
+            b.payment_threshold,
+            b.earned,
+            b.paid,
+            b.last_period,
+            b.updated_at
+        FROM analytics.payout_balance b
+        JOIN whitelabel.artist a ON b.artist_id = a.artist_id
+        WHERE b.balance >= b.payment_threshold
+        AND (%(tenant_id)s::int IS NULL OR b.tenant_id = %(tenant_id)s::int)
+        ORDER BY b.balance DESC, b.artist_id
+        LIMIT %(limit)s;
+        """
+
+    @staticmethod
+    def payout_balance():
+        """Payout balance of one artist (within the tenant, if one is given)"""
+        return """
+        SELECT artist_id, tenant_id, balance, payment_threshold, earned, paid, last_period, updated_at
+        FROM analytics.payout_balance
+        WHERE artist_id = %(artist_id)s
+        AND (%(tenant_id)s::int IS NULL OR tenant_id = %(tenant_id)s::int);
+        """
+
+    @staticmethod
+    def payout_ledger():
+        """Latest payout ledger entries of an artist (within the tenant, if one is given), newest first"""
+        return """
+        SELECT l.entry_id, l.entry_type, l.amount, l.balance_after, l.first_period, l.last_period,
+               l.reference, l.created_at
+        FROM analytics.payout_ledger l
+        JOIN whitelabel.artist a ON a.artist_id = l.artist_id
+        WHERE l.artist_id = %(artist_id)s
+        AND (%(tenant_id)s::int IS NULL OR a.tenant_id = %(tenant_id)s::int)
+        ORDER BY l.entry_id DESC
+        LIMIT %(limit)s;
+        """
+
+    @staticmethod
+    def import_job():
+        """One import's status and stage telemetry (if it belongs to the tenant, when one is given)"""
+        return """
+        SELECT job_id::text, tenant_id, source, status, message, rows_processed AS rows,
+               started_at, finished_at, seconds, stages
+        FROM analytics.import_history
+        WHERE job_id = %(job_id)s::uuid
+        AND (%(tenant_id)s::int IS NULL OR tenant_id = %(tenant_id)s::int);
+        """
+
+    @staticmethod
+    def import_history():
+        """Latest imports with their stage telemetry (of one tenant, if given), newest first"""
+        return """
+        SELECT job_id::text, tenant_id, source, status, message, rows_processed AS rows,
+               started_at, finished_at, seconds, stages
+        FROM analytics.import_history
+        WHERE %(tenant_id)s::int IS NULL OR tenant_id = %(tenant_id)s::int
+        ORDER BY started_at DESC
+        LIMIT %(limit)s;
+        """
+
+
+# Time every query under its method name
+Metrics.name_queries(Queries)
@@ -0,0 +1,99 @@
+from typing import Any, Dict, List, Optional, Tuple
+import psycopg
+from ..db.database import execute_query
+from .periods import MONTHS
+
+# Cube dimensions in GROUPING() argument order, mapped to their rollup column
+DIMENSIONS = {
+    "artist": "artist_id",
+    "label": "label_id",
+    "platform": "platform_name",
+    "country": "country_code"
+}
+
+# Every rollup row is per period; other dimensions may be rolled up
+GROUPABLE = ("period",) + tuple(DIMENSIONS)
+
+# Display names joined in when their dimension is grouped
+NAMES = {
+    "artist": ("a.artist_name", "LEFT JOIN whitelabel.artist a ON a.artist_id = r.artist_id"),
+    "label": ("l.label_name", "LEFT JOIN whitelabel.label l ON l.label_id = r.label_id")
+}
+
+
+class Rollup:
+    """Answers group-by/filter combinations over the period x CUBE(...) rollup table"""
+
+    @staticmethod
+    def grouping_set(dimensions: set) -> int:
+        """GROUPING() bitmask of the rollup rows keeping exactly `dimensions`"""
+        bits = 0
+        for position, dimension in enumerate(DIMENSIONS):
+            if dimension not in dimensions:
+                bits |= 1 << (len(DIMENSIONS) - 1 - position)
+        return bits
+
+    @staticmethod
+    def render(group_by: List[str], params: Dict[str, Any], limit: Optional[int] = None) -> Tuple[str, Dict[str, Any]]:
+        """
+        Render the rollup query for `group_by` and the filters in `params`
+
+        Filtered dimensions are kept in the grouping set (pinned to one value)
+        so the lookup stays on a single set; only periods are summed up.
+        """
+        filtered = {dim for dim, column in DIMENSIONS.items() if params.get(column) is not None}
+        kept = (set(group_by) | filtered) - {"period"}
+        params = {**params, "grouping_set": Rollup.grouping_set(kept)}
+
+        where = ["r.grouping_set = %(grouping_set)s"]
+        for dimension, column in DIMENSIONS.items():
+            if dimension not in kept:
+                where.append(f"r.{column} IS NULL")
+            elif dimension in filtered:
+                where.append(f"r.{column} = %({column})s")
+        if params.get("period") is not None:
+            where.append("r.period = %(period)s")
+        if params.get("period_from") is not None:
+            where.append("r.period >= %(period_from)s")
+        if params.get("period_to") is not None:
+            where.append("r.period <= %(period_to)s")
+        if params.get("month") is not None:
+            params["month_number"] = MONTHS.index(params["month"]) + 1
+            where.append("r.period %% 100 = %(month_number)s")
+
+        columns, joins = [], []
+        for dimension in group_by:
+            columns.append("r.period" if dimension == "period" else f"r.{DIMENSIONS[dimension]}")
+            if dimension in NAMES:
+                name, join = NAMES[dimension]
+                columns.append(name)
+                joins.append(join)
+
+        select = columns + [
+            "SUM(r.fact_rows) AS fact_rows",
+            "SUM(r.total_plays) AS total_plays",
+            "SUM(r.total_revenue) AS total_revenue",
+            "SUM(r.total_royalties) AS total_royalties"
+        ]
+        sql = "SELECT\n    " + ",\n    ".join(select)
+        sql += "\nFROM analytics.revenue_rollup r"
+        sql += "".join(f"\n{join}" for join in joins)
+        sql += "\nWHERE " + "\n  AND ".join(where)
+        if columns:
+            sql += "\nGROUP BY " + ", ".join(columns)
+        order_by = (["r.period"] if "period" in group_by else []) + ["total_revenue DESC"]
+        sql += "\nORDER BY " + ", ".join(order_by)
+        if limit:
+            sql += f"\nLIMIT {int(limit)}"
+        return sql + ";", params
+
+    @staticmethod
+    def execute(
+        conn: psycopg.Connection,
+        group_by: List[str],
+        params: Dict[str, Any],
+        limit: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Run a rollup query"""
+        sql, params = Rollup.render(group_by, params, limit)
+        return execute_query(conn, sql, params, shared=True, name="rollup")
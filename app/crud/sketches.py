@@ -0,0 +1,82 @@
+import math
+from typing import Any, Dict, Iterable, Optional
+import psycopg
+from ..db.database import execute_query, execute_one
+from .queries import Queries
+from .periods import MONTHS
+
+# Must match the register count used by analytics.hll_set in db_setup.sql
+PRECISION = 12
+REGISTERS = 1 << PRECISION
+
+# Relative standard error of a HyperLogLog estimate (~1.6%); about 99.7%
+# of estimates fall within three times this of the exact count
+RELATIVE_ERROR = round(1.04 / math.sqrt(REGISTERS), 4)
+
+# Counted entities, mapped to the response field they fill
+METRICS = {"artists": "active_artists", "songs": "unique_songs"}
+
+
+# 2^-rank for every possible register value
+INVERSE_POWERS = [2.0 ** -rank for rank in range(64)]
+
+
+def merge(sketches: Iterable[bytes]) -> bytes:
+    """Union of sketches: the register-wise maximum"""
+    sketches = list(sketches)
+    if len(sketches) == 1:
+        return bytes(sketches[0])
+    return bytes(map(max, *sketches))
+
+
+def estimate(registers: bytes) -> int:
+    """HyperLogLog cardinality estimate, with linear counting for small sets"""
+    alpha = 0.7213 / (1 + 1.079 / REGISTERS)
+    raw = alpha * REGISTERS * REGISTERS / sum(map(INVERSE_POWERS.__getitem__, registers))
+    empty = registers.count(0)
+    if raw <= 2.5 * REGISTERS and empty:
+        return round(REGISTERS * math.log(REGISTERS / empty))
+    return round(raw)
+
+
+def sketch_params(params: Dict[str, Any]) -> Dict[str, Any]:
+    """Resolve the sketch dimension from platform/label filters and add month_number"""
+    if params.get("platform_name") is not None and params.get("label_id") is not None:
+        raise ValueError("Distinct counts can be filtered by platform or by label, not both")
+
+    if params.get("platform_name") is not None:
+        dimension, value = "platform", params["platform_name"]
+    elif params.get("label_id") is not None:
+        dimension, value = "label", str(params["label_id"])
+    else:
+        dimension, value = "all", ""
+
+    month = params.get("month")
+    return {
+        **params,
+        "dimension": dimension,
+        "dimension_value": value,
+        "month_number": MONTHS.index(month) + 1 if month else None
+    }
+
+
+class DistinctCounts:
+    """Distinct artist and song counts over arbitrary period sets"""
+
+    @staticmethod
+    def approximate(conn: psycopg.Connection, params: Dict[str, Any]) -> Dict[str, Optional[int]]:
+        """Merge the per-period sketches and estimate each count"""
+        rows = execute_query(conn, Queries.distinct_sketches(), sketch_params(params), shared=True)
+        counts = {}
+        for metric, field in METRICS.items():
+            sketches = [bytes(row["registers"]) for row in rows if row["metric"] == metric]
+            counts[field] = estimate(merge(sketches)) if sketches else None
+        return counts
+
+    @staticmethod
+    def exact(conn: psycopg.Connection, params: Dict[str, Any]) -> Dict[str, Optional[int]]:
+        """COUNT(DISTINCT) over the fact table"""
+        row = execute_one(conn, Queries.distinct_counts(), sketch_params(params), shared=True)
+        if not row or not row["active_artists"]:
+            return {field: None for field in METRICS.values()}
+        return {field: row[field] for field in METRICS.values()}
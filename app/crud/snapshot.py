@@ -0,0 +1,449 @@
+import logging
+import os
+import threading
+import time
+from decimal import Decimal, ROUND_HALF_UP
+from typing import Any, Dict, List, Optional, Tuple
+import psycopg
+from ..db.database import get_db
+from .aggregates import AggregateQuery, ROUTED_QUERIES, SUM_MEASURES, DERIVED_MEASURES
+from .periods import MONTHS
+
+try:
+    import numpy as np
+except ImportError:  # optional: the engine stays disabled without NumPy
+    np = None
+
+logger = logging.getLogger(__name__)
+
+# Serve routed queries from an in-memory columnar snapshot of the fact table
+SNAPSHOT_ENABLED = os.getenv("SNAPSHOT_ENGINE", "false").lower() in ("1", "true", "yes")
+
+# Snapshots older than this (seconds) are not served and get reloaded
+SNAPSHOT_MAX_AGE = float(os.getenv("SNAPSHOT_MAX_AGE", "3600"))
+
+# Money is loaded as integer micro-units (the DECIMAL(15,6) scale) so sums are exact
+MONEY_SCALE = 6
+
+# Fact rows fetched per round trip while loading
+LOAD_BATCH = 100000
+
+# Columns only available through the geography join; rows without one drop out
+GEOGRAPHY_COLUMNS = {"country_code", "region"}
+
+# Fact columns, in the order Snapshot expects them; money as integer micro-units.
+# Only facts of released songs, like the materialized views the router serves
+FACTS_QUERY = f"""
+SELECT
+    fr.period,
+    fr.song_id,
+    fr.artist_id,
+    fr.platform_id,
+    COALESCE(fr.geography_id, 0),
+    fr.total_plays,
+    (fr.revenue_amount * 1e{MONEY_SCALE})::bigint,
+    (fr.royalty_amount * 1e{MONEY_SCALE})::bigint,
+    fr.tenant_id
+FROM analytics.fact_monthly_revenue fr
+JOIN whitelabel.song ws ON fr.song_id = ws.song_id
+WHERE ws.status = 'Released';
+"""
+
+# Data generation bumped by every import, read in the same database snapshot
+# as the facts so a loaded snapshot knows which imports it includes
+GENERATION_QUERY = """
+SELECT COALESCE(MAX(generation), 0)
+FROM analytics.data_generation
+WHERE tenant_id = 0 AND period = 0;
+"""
+
+# Dimension tables, each sorted by id
+DIMENSION_QUERIES = {
+    "songs": "SELECT song_id AS id, isrc, title, label_id FROM whitelabel.song ORDER BY song_id;",
+    "artists": "SELECT artist_id AS id, artist_name AS name FROM whitelabel.artist ORDER BY artist_id;",
+    "labels": "SELECT label_id AS id, label_name AS name FROM whitelabel.label ORDER BY label_id;",
+    "platforms": """
+        SELECT platform_id AS id, platform_name AS name, revenue_share_percentage AS share
+        FROM analytics.platform_config ORDER BY platform_id;
+    """,
+    "geographies": """
+        SELECT geography_id AS id, country_code, region
+        FROM analytics.dim_geography ORDER BY geography_id;
+    """
+}
+
+
+class Column:
+    """A dictionary-encoded column: one code per fact row into sorted unique values"""
+
+    def __init__(self, codes, values):
+        self.codes = codes
+        self.values = values
+        self._index = None
+
+    @classmethod
+    def encode(cls, per_row) -> "Column":
+        """Dictionary-encode a per-row array"""
+        values, codes = np.unique(per_row, return_inverse=True)
+        return cls(codes.astype(np.int32), values)
+
+    @classmethod
+    def lookup(cls, dimension_values, dimension_codes) -> "Column":
+        """Encode a dimension attribute reached through per-row dimension positions"""
+        if not len(dimension_values):
+            dimension_values = np.array([None], dtype=object)
+        values, attribute_codes = np.unique(dimension_values, return_inverse=True)
+        return cls(attribute_codes.astype(np.int32)[dimension_codes], values)
+
+    def code_of(self, value: Any) -> int:
+        """Code of a value, -1 when no row has it"""
+        if self._index is None:
+            self._index = {v: i for i, v in enumerate(self.values.tolist())}
+        return self._index.get(value, -1)
+
+
+def _positions(dimension_ids, fact_ids):
+    """Row positions of fact foreign keys in a sorted dimension id array (-1 if missing)"""
+    if not len(dimension_ids):
+        return np.full(len(fact_ids), -1, dtype=np.int32)
+    positions = np.minimum(np.searchsorted(dimension_ids, fact_ids), len(dimension_ids) - 1)
+    return np.where(dimension_ids[positions] == fact_ids, positions, -1).astype(np.int32)
+
+
+def _from_micro(units: int) -> Decimal:
+    """Integer micro-units back to the DECIMAL value Postgres would return"""
+    return Decimal(units).scaleb(-MONEY_SCALE)
+
+
+def _to_micro(value: Any) -> int:
+    """Money value to integer micro-units"""
+    return int(Decimal(value).scaleb(MONEY_SCALE))
+
+
+class Snapshot:
+    """
+    Immutable columnar copy of the fact table and its dimensions
+
+    Answers routed aggregate queries with vectorized group-by, filter and
+    top-N kernels; results match the fact-table SQL of the same query.
+    """
+
+    def __init__(self, facts, dimensions: Dict[str, Dict[str, list]], generation: int = 0):
+        period, song_id, artist_id, platform_id, geography_id = (facts[:, i] for i in range(5))
+        self.rows = len(facts)
+        self.plays = facts[:, 5]
+        self.money = {"revenue": facts[:, 6], "royalty": facts[:, 7]}
+        self.loaded_at = time.monotonic()
+        self.generation = generation
+
+        def ids(name: str):
+            return np.asarray(dimensions[name]["id"], dtype=np.int64)
+
+        def values(name: str, attribute: str):
+            return np.asarray(dimensions[name][attribute], dtype=object)
+
+        song = _positions(ids("songs"), song_id)
+        artist = _positions(ids("artists"), artist_id)
+        platform = _positions(ids("platforms"), platform_id)
+        self.geography = _positions(ids("geographies"), geography_id)
+        geography = np.maximum(self.geography, 0)
+        label = _positions(ids("labels"), np.asarray(dimensions["songs"]["label_id"], dtype=np.int64))[song]
+
+        period_values = np.unique(period)
+        self.columns = {
+            "period": Column.encode(period),
+            "tenant_id": Column.encode(facts[:, 8]),
+            "year": Column.encode(period // 100),
+            "month": Column.lookup(
+                np.array([MONTHS[p % 100 - 1] for p in period_values.tolist()], dtype=object),
+                np.searchsorted(period_values, period)
+            ),
+            "artist_id": Column.lookup(ids("artists"), artist),
+            "artist_name": Column.lookup(values("artists", "name"), artist),
+            "label_id": Column.lookup(ids("labels"), label),
+            "label_name": Column.lookup(values("labels", "name"), label),
+            "platform_name": Column.lookup(values("platforms", "name"), platform),
+            "revenue_share_percentage": Column.lookup(values("platforms", "share"), platform),
+            "country_code": Column.lookup(values("geographies", "country_code"), geography),
+            "region": Column.lookup(values("geographies", "region"), geography),
+            "isrc": Column.lookup(values("songs", "isrc"), song),
+            "song_name": Column.lookup(values("songs", "title"), song)
+        }
+        # Distinct-count measures, keyed like the fact source's `counts`
+        self.counts = {
+            "songs": song,
+            "isrcs": self.columns["isrc"].codes,
+            "platforms": platform,
+            "artists": artist,
+            "labels": label
+        }
+
+    @classmethod
+    def load(cls, conn: psycopg.Connection) -> "Snapshot":
+        """Read the fact table and dimensions into column arrays"""
+        # One database snapshot for the facts and every dimension
+        conn.isolation_level = psycopg.IsolationLevel.REPEATABLE_READ
+        with conn.cursor() as cur:
+            cur.execute(GENERATION_QUERY)
+            generation = cur.fetchone()[0]
+
+        dimensions = {}
+        for name, sql in DIMENSION_QUERIES.items():
+            with conn.cursor() as cur:
+                cur.execute(sql)
+                names = [column.name for column in cur.description]
+                rows = cur.fetchall()
+            dimensions[name] = {key: [row[i] for row in rows] for i, key in enumerate(names)}
+
+        chunks = []
+        with conn.cursor(name="snapshot_facts") as cur:
+            cur.itersize = LOAD_BATCH
+            cur.execute(FACTS_QUERY)
+            while True:
+                batch = cur.fetchmany(LOAD_BATCH)
+                if not batch:
+                    break
+                chunks.append(np.array(batch, dtype=np.int64))
+        facts = np.concatenate(chunks) if chunks else np.empty((0, 9), dtype=np.int64)
+        return cls(facts, dimensions, generation)
+
+    @property
+    def age(self) -> float:
+        """Seconds since the snapshot was loaded"""
+        return time.monotonic() - self.loaded_at
+
+    def query(
+        self,
+        query: AggregateQuery,
+        params: Dict[str, Any],
+        limit: Optional[int] = None,
+        after: Optional[List[Any]] = None
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        Answer a routed aggregate query
+
+        Returns the (limited) rows and the total number of groups. With
+        `after`, only groups sorting after that sort-key tuple are returned.
+        """
+        predicates = query.predicates(params)
+        referenced = set(query.group_by) | {col for col, _, _ in predicates}
+
+        mask = np.ones(self.rows, dtype=bool)
+        if referenced & GEOGRAPHY_COLUMNS:
+            mask &= self.geography >= 0
+        for col, op, param in predicates:
+            column = self.columns[col]
+            if op == "=":
+                mask &= column.codes == column.code_of(params[param])
+            elif op == "= ANY":
+                mask &= np.isin(column.codes, [code for code in map(column.code_of, params[param]) if code >= 0])
+            elif op == ">=":
+                # Values are sorted, so range filters become code ranges
+                mask &= column.codes >= np.searchsorted(column.values, params[param], side="left")
+            else:
+                mask &= column.codes < np.searchsorted(column.values, params[param], side="right")
+        rows = np.flatnonzero(mask)
+        if not len(rows):
+            return [], 0
+
+        # Group id per selected row, re-compacted after each column to stay in range
+        group = np.zeros(len(rows), dtype=np.int64)
+        for col in query.group_by:
+            codes = self.columns[col].codes[rows]
+            group = group * (int(codes.max()) + 1) + codes
+            _, group = np.unique(group, return_inverse=True)
+        order = np.argsort(group, kind="stable")
+        group, rows = group[order], rows[order]
+        starts = np.flatnonzero(np.r_[True, group[1:] != group[:-1]])
+        first = rows[starts]
+        groups = len(starts)
+
+        output = {col: self.columns[col].values[self.columns[col].codes[first]] for col in query.group_by}
+        sums = {"plays": np.add.reduceat(self.plays[rows], starts)}
+        sums.update({name: np.add.reduceat(array[rows], starts) for name, array in self.money.items()})
+        for alias, measure in query.measures.items():
+            if measure in SUM_MEASURES:
+                output[alias] = sums[measure]
+            elif measure in DERIVED_MEASURES:
+                output[alias] = None
+            else:
+                values = self.counts[measure][rows]
+                pairs = np.unique(group * (int(values.max()) + 1) + values)
+                output[alias] = np.bincount(pairs // (int(values.max()) + 1), minlength=groups)
+
+        order = self._order(query, output, groups)
+        if after is not None:
+            order = order[self._after(query, output, after)[order]]
+        limit = limit or query.limit
+        if limit:
+            order = order[:limit]
+        return self._rows(query, output, sums, order), groups
+
+    def _sort_array(self, query: AggregateQuery, output: Dict[str, Any], name: str):
+        """Numeric array ordering like the named output column"""
+        array = output[name]
+        if array.dtype == object:
+            _, array = np.unique(array, return_inverse=True)
+        return array
+
+    def _order(self, query: AggregateQuery, output: Dict[str, Any], groups: int):
+        """Group positions in the query's ORDER BY order"""
+        if query.sort_key:
+            keys = [(col, True) for col in query.sort_key]
+        else:
+            keys = [(item.split()[0], item.upper().endswith(" DESC")) for item in query.order_by]
+        if not keys:
+            return np.arange(groups)
+        # lexsort sorts by the last key first
+        return np.lexsort([
+            -self._sort_array(query, output, col) if desc else self._sort_array(query, output, col)
+            for col, desc in reversed(keys)
+        ])
+
+    def _after(self, query: AggregateQuery, output: Dict[str, Any], after: List[Any]):
+        """Groups whose sort-key tuple is below `after` (the keyset continuation)"""
+        below = np.zeros(len(next(iter(output.values()))), dtype=bool)
+        equal = np.ones_like(below)
+        for col, value in zip(query.sort_key, after):
+            array = output[col]
+            if query.measures.get(col) in self.money:
+                value = _to_micro(value)
+            below |= equal & (array < value)
+            equal &= array == value
+        return below
+
+    def _rows(self, query: AggregateQuery, output: Dict[str, Any], sums: Dict[str, Any], order) -> List[Dict[str, Any]]:
+        """Convert the selected groups to the dict rows the SQL path returns"""
+        columns = {}
+        for alias, measure in {**{col: None for col in query.group_by}, **query.measures}.items():
+            if measure in self.money:
+                columns[alias] = [_from_micro(v) for v in output[alias][order].tolist()]
+            elif measure in DERIVED_MEASURES:
+                royalty, revenue = sums["royalty"][order].tolist(), sums["revenue"][order].tolist()
+                columns[alias] = [
+                    (Decimal(r) * 100 / Decimal(v)).quantize(Decimal("0.01"), ROUND_HALF_UP) if v else None
+                    for r, v in zip(royalty, revenue)
+                ]
+            else:
+                columns[alias] = output[alias][order].tolist()
+        names = list(columns)
+        return [dict(zip(names, values)) for values in zip(*columns.values())]
+
+
+class SnapshotEngine:
+    """
+    Holds the current snapshot and swaps in a fresh one after imports
+
+    A loaded snapshot only stops being stale if nothing invalidated it while
+    it was loading: invalidations either name the data generation the
+    snapshot must include (imports seen by this process or by the generation
+    listener) or, without one, count as a request to load again.
+    """
+
+    _snapshot: Optional[Snapshot] = None
+    _stale = True
+    _lock = threading.Lock()
+    _reloading = False
+    # Invalidations without a generation, and the highest generation asked for
+    _requests = 0
+    _wanted = 0
+
+    @staticmethod
+    def enabled() -> bool:
+        """Whether the engine is switched on and NumPy is available"""
+        return SNAPSHOT_ENABLED and np is not None
+
+    @staticmethod
+    def reload() -> Optional[Snapshot]:
+        """Load a new snapshot and atomically replace the current one"""
+        started = time.perf_counter()
+        with SnapshotEngine._lock:
+            requests = SnapshotEngine._requests
+        with get_db() as conn:
+            snapshot = Snapshot.load(conn)
+        with SnapshotEngine._lock:
+            SnapshotEngine._snapshot = snapshot
+            SnapshotEngine._stale = (
+                SnapshotEngine._requests != requests or snapshot.generation < SnapshotEngine._wanted
+            )
+        logger.info(
+            "Loaded analytics snapshot: %d rows in %.2fs", snapshot.rows, time.perf_counter() - started
+        )
+        return snapshot
+
+    @staticmethod
+    def schedule_reload(generation: Optional[int] = None):
+        """
+        Stop serving the current snapshot and reload it in the background
+
+        With `generation`, only if the snapshot does not include that data
+        generation yet; a reload already running loads again when it finishes
+        without it.
+        """
+        if not SnapshotEngine.enabled():
+            return
+        with SnapshotEngine._lock:
+            snapshot = SnapshotEngine._snapshot
+            if generation is None:
+                SnapshotEngine._requests += 1
+            elif not SnapshotEngine._stale and snapshot is not None and snapshot.generation >= generation:
+                return
+            else:
+                SnapshotEngine._wanted = max(SnapshotEngine._wanted, generation)
+            SnapshotEngine._stale = True
+        SnapshotEngine._start()
+
+    @staticmethod
+    def _start():
+        """Start the background reload unless one is running; it loads until not stale"""
+        with SnapshotEngine._lock:
+            if SnapshotEngine._reloading:
+                return
+            SnapshotEngine._reloading = True
+
+        def run():
+            try:
+                while True:
+                    SnapshotEngine.reload()
+                    with SnapshotEngine._lock:
+                        if not SnapshotEngine._stale:
+                            SnapshotEngine._reloading = False
+                            return
+                    logger.info("Analytics data changed while the snapshot was loading, loading it again")
+            except Exception as e:
+                logger.error("Error loading analytics snapshot: %s", e)
+                with SnapshotEngine._lock:
+                    SnapshotEngine._reloading = False
+
+        threading.Thread(target=run, name="snapshot-reload", daemon=True).start()
+
+    @staticmethod
+    def current() -> Optional[Snapshot]:
+        """The snapshot to serve from, or None when it is missing, stale or too old"""
+        if not SnapshotEngine.enabled():
+            return None
+        with SnapshotEngine._lock:
+            snapshot = SnapshotEngine._snapshot
+            usable = snapshot is not None and not SnapshotEngine._stale and snapshot.age <= SNAPSHOT_MAX_AGE
+            if not usable:
+                SnapshotEngine._stale = True
+        if not usable:
+            # A reload already running will do; it leaves a fresh snapshot behind
+            SnapshotEngine._start()
+            return None
+        return snapshot
+
+    @staticmethod
+    def execute(
+        name: str,
+        params: Dict[str, Any],
+        limit: Optional[int] = None,
+        after: Optional[List[Any]] = None,
+        fields: Optional[Tuple[str, ...]] = None
+    ) -> Optional[Tuple[List[Dict[str, Any]], int]]:
+        """Answer a routed query (projected onto `fields` if given) from the snapshot, or None to fall back to SQL"""
+        snapshot = SnapshotEngine.current()
+        if snapshot is None:
+            return None
+        query = ROUTED_QUERIES[name].project(fields) if fields else ROUTED_QUERIES[name]
+        return snapshot.query(query, params, limit, after)
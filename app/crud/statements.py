@@ -0,0 +1,215 @@
+import csv
+import io
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from datetime import datetime
+from decimal import Decimal
+from itertools import groupby
+from operator import itemgetter
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import psycopg
+from ..db.database import get_db
+from .queries import Queries
+from .periods import from_period
+
+# Directory statements are written to, one subdirectory per period
+STATEMENT_DIR = os.getenv("STATEMENT_DIR", "statements")
+
+# Rendering processes, and artists handed to a process at a time
+STATEMENT_WORKERS = int(os.getenv("STATEMENT_WORKERS", str(os.cpu_count() or 2)))
+STATEMENT_BATCH = int(os.getenv("STATEMENT_BATCH", "200"))
+
+# Statement lines fetched per round trip
+STATEMENT_FETCH = 10000
+
+STATEMENT_FORMATS = ("csv", "json")
+
+# Columns of a statement line, after the artist
+LINE_COLUMNS = ("isrc", "song_name", "platform_name", "country_code", "plays", "revenue", "royalty")
+
+SUMMARY_FILE = "summary.json"
+
+
+def statement_dir(period: int, tenant_id: Optional[int] = None) -> Path:
+    """Directory holding the statements of a period (of one tenant if given)"""
+    root = Path(STATEMENT_DIR)
+    if tenant_id:
+        root = root / f"tenant-{tenant_id}"
+    return root / str(period)
+
+
+def _write(path: Path, text: str):
+    """Replace a file atomically, so readers never see a partial statement"""
+    partial = path.with_name(path.name + ".partial")
+    partial.write_text(text)
+    os.replace(partial, path)
+
+
+def render_csv(lines: List[tuple]) -> str:
+    """Statement lines followed by a totals row"""
+    out = io.StringIO()
+    writer = csv.writer(out)
+    writer.writerow(LINE_COLUMNS)
+    writer.writerows(lines)
+    totals = _totals(lines)
+    writer.writerow(["TOTAL", "", "", "", totals["plays"], totals["revenue"], totals["royalty"]])
+    return out.getvalue()
+
+
+def render_json(period: int, artist_id: int, artist_name: str, lines: List[tuple]) -> str:
+    """Statement document; money is written as exact decimal strings"""
+    year, month = from_period(period)
+    return json.dumps({
+        "period": period,
+        "year": year,
+        "month": month,
+        "artist_id": artist_id,
+        "artist_name": artist_name,
+        "lines": [dict(zip(LINE_COLUMNS, line)) for line in lines],
+        "totals": _totals(lines)
+    }, default=str, separators=(",", ":"))
+
+
+def _totals(lines: List[tuple]) -> Dict[str, Any]:
+    """Exact totals of a statement's plays, revenue and royalties"""
+    return {
+        "plays": sum(line[4] for line in lines),
+        "revenue": sum((line[5] for line in lines), Decimal(0)),
+        "royalty": sum((line[6] for line in lines), Decimal(0))
+    }
+
+
+def render_batch(directory: str, period: int, fmt: str, artists: List[tuple]) -> Tuple[int, int]:
+    """
+    Write the statements of a batch of artists; runs in a worker process
+
+    Returns the number of statements and lines written.
+    """
+    written = lines = 0
+    for artist_id, artist_name, artist_lines in artists:
+        path = Path(directory) / f"{artist_id}.{fmt}"
+        if fmt == "csv":
+            _write(path, render_csv(artist_lines))
+        else:
+            _write(path, render_json(period, artist_id, artist_name, artist_lines))
+        written += 1
+        lines += len(artist_lines)
+    return written, lines
+
+
+class Statements:
+    """Generates the monthly royalty statement of every artist in one pass"""
+
+    _running = set()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def stream(
+        conn: psycopg.Connection,
+        period: int,
+        tenant_id: Optional[int] = None
+    ) -> Iterator[Tuple[int, str, List[tuple]]]:
+        """
+        Yield (artist_id, artist_name, lines) per artist from one sorted query
+
+        Rows come off a server-side cursor, so only the current artist's
+        lines are held in memory.
+        """
+        with conn.cursor(name="statement_lines") as cur:
+            cur.itersize = STATEMENT_FETCH
+            cur.execute(Queries.statement_lines(), {"period": period, "tenant_id": tenant_id})
+            for (artist_id, artist_name), rows in groupby(cur, key=itemgetter(0, 1)):
+                yield artist_id, artist_name, [row[2:] for row in rows]
+
+    @staticmethod
+    def batches(
+        conn: psycopg.Connection,
+        period: int,
+        tenant_id: Optional[int] = None
+    ) -> Iterator[List[Tuple[int, str, List[tuple]]]]:
+        """Artists of the stream, STATEMENT_BATCH at a time"""
+        batch = []
+        for artist in Statements.stream(conn, period, tenant_id):
+            batch.append(artist)
+            if len(batch) >= STATEMENT_BATCH:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    @staticmethod
+    def running(period: int, tenant_id: Optional[int] = None) -> bool:
+        """Whether statements for the period are being generated"""
+        return (tenant_id, period) in Statements._running
+
+    @staticmethod
+    def summary(period: int, tenant_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """Summary of the last completed run for the period, if any"""
+        path = statement_dir(period, tenant_id) / SUMMARY_FILE
+        return json.loads(path.read_text()) if path.exists() else None
+
+    @staticmethod
+    def generate(
+        period: int,
+        fmt: str = "csv",
+        tenant_id: Optional[int] = None,
+        workers: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Write a statement file per artist with revenue in the period
+
+        The lines are read in a single query sorted by artist and rendered
+        on a process pool while the stream continues; at most two batches
+        per worker are in flight, so memory stays bounded. A summary is
+        written next to the statements once every file is in place.
+
+        Raises:
+            ValueError: for an unknown format
+            RuntimeError: if statements for the period are already being generated
+        """
+        if fmt not in STATEMENT_FORMATS:
+            raise ValueError(f"Unknown statement format {fmt}, expected one of {', '.join(STATEMENT_FORMATS)}")
+        with Statements._lock:
+            if (tenant_id, period) in Statements._running:
+                raise RuntimeError(f"Statements for {period} are already being generated")
+            Statements._running.add((tenant_id, period))
+
+        try:
+            started = time.perf_counter()
+            directory = statement_dir(period, tenant_id)
+            directory.mkdir(parents=True, exist_ok=True)
+            workers = workers or STATEMENT_WORKERS
+            artists = lines = 0
+
+            with get_db() as conn, ProcessPoolExecutor(max_workers=workers) as pool:
+                pending = set()
+                for batch in Statements.batches(conn, period, tenant_id):
+                    if len(pending) >= workers * 2:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            written, count = future.result()
+                            artists, lines = artists + written, lines + count
+                    pending.add(pool.submit(render_batch, str(directory), period, fmt, batch))
+                for future in pending:
+                    written, count = future.result()
+                    artists, lines = artists + written, lines + count
+
+            summary = {
+                "period": period,
+                "tenant_id": tenant_id,
+                "format": fmt,
+                "artists": artists,
+                "lines": lines,
+                "directory": str(directory),
+                "seconds": round(time.perf_counter() - started, 3),
+                "completed_at": datetime.now().isoformat(timespec="seconds")
+            }
+            _write(directory / SUMMARY_FILE, json.dumps(summary))
+            return summary
+        finally:
+            with Statements._lock:
+                Statements._running.discard((tenant_id, period))
@@ -0,0 +1,195 @@
+import os
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from psycopg.types.json import Jsonb
+from ..db.database import get_db, execute_one
+from .queries import Queries
+
+# Measure the peak Python memory of each import stage; off by default since
+# tracemalloc slows allocation-heavy parsing and traces the whole process
+IMPORT_TRACE_MEMORY = os.getenv("IMPORT_TRACE_MEMORY", "false").lower() == "true"
+
+# Imports whose telemetry stays in memory for the job status endpoint
+IMPORT_JOBS_KEPT = int(os.getenv("IMPORT_JOBS_KEPT", "100"))
+
+
+class ImportTelemetry:
+    """
+    Wall time, throughput and peak memory of each stage of one revenue import
+
+    Used as a context manager around the import: the job is recorded as
+    RUNNING on entry and as FAILED if the block raises. Stages are timed
+    with `stage()` and the outcome is recorded by `finish()`. Every job is
+    kept in memory for its status and persisted to analytics.import_history.
+
+    With IMPORT_TRACE_MEMORY, memory is traced process-wide and the peak is
+    reset at the start of every stage, so peaks are not isolated between
+    imports running at the same time: they include each other's
+    allocations, and a stage starting in one import resets the peak a stage
+    of another is measuring. Only trust peak_mb of imports that ran alone.
+    If tracing was already running (e.g. a debugging session), its peak is
+    left alone and a stage that stays below it reports its net growth.
+    """
+
+    _jobs: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+    _lock = threading.Lock()
+    # Imports measuring memory, and whether tracing was started for them
+    _tracing = 0
+    _started_tracing = False
+
+    def __init__(self, tenant_id: Optional[int] = None, source: Optional[str] = None):
+        self.job_id = str(uuid.uuid4())
+        self.tenant_id = tenant_id
+        self.source = source
+        self.status = "RUNNING"
+        self.message = None
+        self.rows = None
+        self.started_at = datetime.now()
+        self.finished_at = None
+        self.stages: List[Dict[str, Any]] = []
+        self._started = time.perf_counter()
+
+    def __enter__(self) -> "ImportTelemetry":
+        if IMPORT_TRACE_MEMORY:
+            with ImportTelemetry._lock:
+                if ImportTelemetry._tracing == 0 and not tracemalloc.is_tracing():
+                    tracemalloc.start()
+                    ImportTelemetry._started_tracing = True
+                ImportTelemetry._tracing += 1
+        self._save()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if IMPORT_TRACE_MEMORY:
+            with ImportTelemetry._lock:
+                ImportTelemetry._tracing -= 1
+                # Leave tracing started by someone else (e.g. a debugging session) running
+                if ImportTelemetry._tracing == 0 and ImportTelemetry._started_tracing:
+                    tracemalloc.stop()
+                    ImportTelemetry._started_tracing = False
+        if self.finished_at is None:
+            self.finish({"success": False, "message": str(exc) if exc else "Import did not finish"})
+        return False
+
+    @contextmanager
+    def stage(self, name: str, rows: Optional[int] = None):
+        """
+        Time a stage; the yielded dict takes the stage's row count as
+        "rows" when it is only known at the end
+        """
+        tracing = IMPORT_TRACE_MEMORY and tracemalloc.is_tracing()
+        if tracing:
+            # Tracing started elsewhere keeps its peak: it is only read here
+            if ImportTelemetry._started_tracing:
+                tracemalloc.reset_peak()
+            baseline, baseline_peak = tracemalloc.get_traced_memory()
+        entry = {"stage": name, "rows": rows}
+        started = time.perf_counter()
+        try:
+            yield entry
+        finally:
+            seconds = time.perf_counter() - started
+            peak = self._peak_growth(baseline, baseline_peak) if tracing else None
+            self.record(name, seconds, entry["rows"], peak)
+
+    @staticmethod
+    def _peak_growth(baseline: int, baseline_peak: int) -> int:
+        """
+        Bytes a stage's peak rose above its starting memory
+
+        When the stage did not raise a peak it could not reset (foreign
+        tracing), its own peak is unknown and its net growth is recorded.
+        """
+        current, peak = tracemalloc.get_traced_memory()
+        if peak > baseline_peak or baseline_peak == baseline:
+            return max(peak - baseline, 0)
+        return max(current - baseline, 0)
+
+    def record(self, name: str, seconds: float, rows: Optional[int] = None, peak_bytes: Optional[int] = None):
+        """Add a stage measured elsewhere"""
+        self.stages.append({
+            "stage": name,
+            "seconds": round(seconds, 4),
+            "rows": rows,
+            "rows_per_sec": round(rows / seconds, 1) if rows and seconds > 0 else None,
+            "peak_mb": round(peak_bytes / 2**20, 2) if peak_bytes is not None else None
+        })
+
+    def finish(self, result: Dict[str, Any]) -> Dict[str, Any]:
+        """Record an import's outcome and add its job ID and telemetry to the result"""
+        self.status = "COMPLETED" if result.get("success") else "THROTTLED" if result.get("throttled") else "FAILED"
+        self.message = result.get("message")
+        self.rows = result.get("rows_processed")
+        self.finished_at = datetime.now()
+        self._save()
+        return {**result, "job_id": self.job_id, "telemetry": self.summary()["stages"]}
+
+    def summary(self) -> Dict[str, Any]:
+        """The job as reported by the status endpoint and stored in import_history"""
+        finished = self.finished_at is not None
+        return {
+            "job_id": self.job_id,
+            "tenant_id": self.tenant_id,
+            "source": self.source,
+            "status": self.status,
+            "message": self.message,
+            "rows": self.rows,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "seconds": round(time.perf_counter() - self._started, 3) if finished else None,
+            "stages": list(self.stages)
+        }
+
+    def _save(self):
+        """Keep the job in memory and upsert it into import_history"""
+        summary = self.summary()
+        with ImportTelemetry._lock:
+            ImportTelemetry._jobs[self.job_id] = summary
+            ImportTelemetry._jobs.move_to_end(self.job_id)
+            while len(ImportTelemetry._jobs) > IMPORT_JOBS_KEPT:
+                ImportTelemetry._jobs.popitem(last=False)
+        try:
+            with get_db() as conn:
+                with conn.cursor() as cur:
+                    cur.execute("""
+                    INSERT INTO analytics.import_history (
+                        job_id, tenant_id, source, status, message, rows_processed,
+                        started_at, finished_at, seconds, stages
+                    ) VALUES (
+                        %(job_id)s, %(tenant_id)s, %(source)s, %(status)s, %(message)s, %(rows)s,
+                        %(started_at)s, %(finished_at)s, %(seconds)s, %(stages)s
+                    )
+                    ON CONFLICT (job_id) DO UPDATE
+                    SET status = EXCLUDED.status,
+                        message = EXCLUDED.message,
+                        rows_processed = EXCLUDED.rows_processed,
+                        finished_at = EXCLUDED.finished_at,
+                        seconds = EXCLUDED.seconds,
+                        stages = EXCLUDED.stages;
+                    """, {**summary, "stages": Jsonb(summary["stages"])})
+                    conn.commit()
+        except Exception as e:
+            print(f"Error saving import history for job {self.job_id}: {e}")
+
+    @staticmethod
+    def job(job_id: str, tenant_id: Optional[int] = None) -> Optional[Dict[str, Any]]:
+        """
+        Status of an import: from memory, or from import_history for older or
+        other workers' jobs; with `tenant_id`, None unless the tenant ran it
+        """
+        with ImportTelemetry._lock:
+            summary = ImportTelemetry._jobs.get(job_id)
+        if summary is not None:
+            return summary if tenant_id is None or summary["tenant_id"] == tenant_id else None
+        try:
+            uuid.UUID(job_id)
+        except ValueError:
+            return None
+        with get_db() as conn:
+            return execute_one(conn, Queries.import_job(), {"job_id": job_id, "tenant_id": tenant_id})
@@ -0,0 +1,106 @@
+from typing import Any, Dict, List, Optional, Tuple
+import psycopg
+from ..db.database import execute_query
+from .aggregates import AggregateRouter
+from .periods import add_months
+
+# Entity kinds with a time series, mapped to their routed query and key filter
+ENTITIES = {
+    "artist": ("artist_timeseries", "artist_id"),
+    "label": ("label_timeseries", "label_id"),
+    "platform": ("platform_timeseries", "platform_name"),
+    "isrc": ("isrc_timeseries", "isrc")
+}
+
+MEASURES = ("total_plays", "total_revenue", "total_royalties")
+
+# Longest range served in one call
+MAX_MONTHS = 120
+
+
+class TimeSeries:
+    """Monthly series for one entity, gap-filled, with optional deltas and rolling sums"""
+
+    @staticmethod
+    def render(points_sql: str, deltas: bool = False, rolling: Optional[int] = None) -> str:
+        """
+        Wrap the routed per-period totals in the series query
+
+        Every month of `period_from`..`period_to` is present (zero when there
+        is no revenue) so LAG and the rolling frame count calendar months.
+        Months before `first_period` only seed the window functions.
+        """
+        select = [f"COALESCE(t.{m}, 0) AS {m}" for m in MEASURES]
+        if deltas:
+            select += [
+                f"COALESCE(t.{m}, 0) - LAG(COALESCE(t.{m}, 0)) OVER w AS {m.replace('total_', '')}_change"
+                for m in MEASURES
+            ]
+            select.append(
+                "ROUND((COALESCE(t.total_revenue, 0) - LAG(COALESCE(t.total_revenue, 0)) OVER w) * 100.0"
+                " / NULLIF(LAG(COALESCE(t.total_revenue, 0)) OVER w, 0), 2) AS revenue_change_pct"
+            )
+        if rolling:
+            frame = f"(w ROWS BETWEEN {int(rolling) - 1} PRECEDING AND CURRENT ROW)"
+            select += [
+                f"SUM(COALESCE(t.{m}, 0)) OVER {frame} AS rolling_{m.replace('total_', '')}"
+                for m in MEASURES
+            ]
+
+        columns = ",\n                ".join(select)
+        return f"""
+        WITH points AS (
+            {points_sql.rstrip().rstrip(';')}
+        ),
+        periods AS (
+            SELECT analytics.to_period(m::date) AS period
+            FROM generate_series(
+                to_date(%(period_from)s::text, 'YYYYMM'),
+                to_date(%(period_to)s::text, 'YYYYMM'),
+                interval '1 month'
+            ) m
+        ),
+        series AS (
+            SELECT
+                p.period,
+                {columns}
+            FROM periods p
+            LEFT JOIN points t ON t.period = p.period
+            WINDOW w AS (ORDER BY p.period)
+        )
+        SELECT *
+        FROM series
+        WHERE period >= %(first_period)s
+        ORDER BY period;
+        """
+
+    @staticmethod
+    def lookback(deltas: bool = False, rolling: Optional[int] = None) -> int:
+        """Months before the first point read for its delta and rolling window"""
+        return max(1 if deltas else 0, (rolling or 1) - 1)
+
+    @staticmethod
+    def execute(
+        conn: psycopg.Connection,
+        entity: str,
+        key: Any,
+        period_from: int,
+        period_to: int,
+        deltas: bool = False,
+        rolling: Optional[int] = None,
+        tenant_id: Optional[int] = None
+    ) -> Tuple[List[Dict[str, Any]], str]:
+        """Run the series for one entity (within one tenant if given), returning its rows and the aggregate source used"""
+        name, key_filter = ENTITIES[entity]
+        lookback = TimeSeries.lookback(deltas, rolling)
+
+        params = {
+            key_filter: key,
+            "period_from": add_months(period_from, -lookback),
+            "period_to": period_to,
+            "first_period": period_from,
+            "tenant_id": tenant_id
+        }
+        points_sql, source = AggregateRouter.plan(conn, name, params)
+        sql = TimeSeries.render(points_sql, deltas, rolling)
+        return execute_query(conn, sql, params, shared=True, name=f"{name}/{source.name}"), source.name
@@ -0,0 +1,102 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+from ..db.database import get_db, execute_query
+from .queries import Queries
+from .periods import from_period, current_period
+from .cache import CACHE_ENABLED, Generations, ResponseCache
+
+# Concurrent endpoint computations while warming (each holds a connection)
+CACHE_WARM_WORKERS = int(os.getenv("CACHE_WARM_WORKERS", "4"))
+
+# Artists warmed per import, those with the most imported royalties first
+CACHE_WARM_MAX_ARTISTS = int(os.getenv("CACHE_WARM_MAX_ARTISTS", "200"))
+
+
+class CacheWarmer:
+    """Precomputes the hot analytics responses an import has just invalidated"""
+
+    @staticmethod
+    def scope(ids: List[str]) -> Tuple[Set[int], List[int]]:
+        """Periods and artists (by imported royalty, capped) touched by processed staged rows"""
+        with get_db() as conn:
+            rows = execute_query(conn, Queries.imported_scope(), {"ids": ids})
+        royalties: Dict[int, float] = {}
+        for row in rows:
+            royalties[row["artist_id"]] = royalties.get(row["artist_id"], 0) + float(row["royalty"])
+        artists = sorted(royalties, key=royalties.get, reverse=True)[:CACHE_WARM_MAX_ARTISTS]
+        return {row["period"] for row in rows}, artists
+
+    @staticmethod
+    def requests(
+        periods: Set[int],
+        artists: List[int],
+        tenant_id: Optional[int] = None
+    ) -> List[Tuple[Callable, Dict[str, Any]]]:
+        """
+        Endpoint calls to warm: per-period views, platform metrics and touched artists
+
+        With a tenant, the tenant-scoped views are warmed as that tenant's
+        dashboards request them; the platform-wide ones stay unscoped.
+        """
+        from ..api import endpoints
+
+        tenant = {"tenant_id": tenant_id} if tenant_id else {}
+        calls = [(endpoints.get_platform_metrics, {})]
+        for period in sorted(periods, reverse=True):
+            year, month = from_period(period)
+            month_params = {"year": year, "month": month}
+            calls += [
+                (endpoints.get_revenue_overview, month_params),
+                (endpoints.get_platform_revenue, {**month_params, **tenant}),
+                (endpoints.get_label_performance, {**month_params, **tenant}),
+            ]
+            calls += [(endpoints.get_artist_earnings, {"artist_id": a, **month_params, **tenant}) for a in artists]
+            # Dashboards without explicit parameters default to the current month
+            if period == current_period():
+                calls += [(endpoints.get_platform_revenue, tenant), (endpoints.get_label_performance, tenant)]
+        calls += [(endpoints.get_artist_performance, {"artist_id": a, **tenant}) for a in artists]
+        calls += [(endpoints.get_artist_earnings, {"artist_id": a, **tenant}) for a in artists]
+        return calls
+
+    @staticmethod
+    def warm(ids: List[str], tenant_id: Optional[int] = None) -> Dict[str, Any]:
+        """
+        Warm the response cache for the rows of an import (of one tenant if given)
+
+        Runs after the views are refreshed, so warmed responses come from
+        fresh aggregates. Returns counts and the elapsed time.
+        """
+        started = time.perf_counter()
+        if not CACHE_ENABLED:
+            return {"skipped": "response cache disabled"}
+        try:
+            # Key by the generations the import just bumped
+            Generations.reload()
+            if not Generations.live() and ResponseCache.shared is None:
+                return {"skipped": "no generation listener in this process and no shared cache"}
+
+            periods, artists = CacheWarmer.scope(ids)
+            calls = CacheWarmer.requests(periods, artists, tenant_id) if periods else []
+
+            def run(call: Tuple[Callable, Dict[str, Any]]) -> bool:
+                endpoint, params = call
+                try:
+                    return endpoint.warm(**params)
+                except Exception as e:
+                    print(f"Error warming {endpoint.__name__}({params}): {e}")
+                    return False
+
+            with ThreadPoolExecutor(max_workers=CACHE_WARM_WORKERS) as pool:
+                warmed = sum(pool.map(run, calls))
+            return {
+                "periods": len(periods),
+                "artists": len(artists),
+                "requests": len(calls),
+                "warmed": warmed,
+                "seconds": round(time.perf_counter() - started, 3)
+            }
+        except Exception as e:
+            print(f"Error warming response cache: {e}")
+            return {"error": str(e), "seconds": round(time.perf_counter() - started, 3)}
@@ -1,9 +1,14 @@
 import os
+import time
 from typing import Dict, Any, List, Optional
 from contextlib import contextmanager
 import psycopg
 from psycopg.rows import dict_row
 from dotenv import load_dotenv
+from .singleflight import SingleFlight
+from .metrics import Metrics, METRICS_ENABLED
+from .slowlog import SlowQueries
+from .profiling import Profiler, PROFILING_ENABLED
 
 # Load environment variables
 load_dotenv()
@@ -20,23 +25,87 @@ DB_CONFIG = {
 @contextmanager
 def get_db():
     """Database connection context manager"""
+    if PROFILING_ENABLED:
+        # Endpoint code in the threadpool joins the request's profile here
+        Profiler.track()
+    started = time.perf_counter()
     conn = psycopg.connect(**DB_CONFIG)
+    if METRICS_ENABLED:
+        Metrics.connect_seconds.observe((), time.perf_counter() - started)
     try:
         yield conn
     finally:
         conn.close()
 
-def execute_query(conn: psycopg.Connection, query: str, params: Dict[str, Any] = None) -> List[Dict[str, Any]]:
-    """Execute a query and return results as a list of dictionaries"""
-    with conn.cursor(row_factory=dict_row) as cur:
-        cur.execute(query, params or {})
-        return cur.fetchall()
+@contextmanager
+def timed(
+    conn: psycopg.Connection,
+    query: str,
+    params: Dict[str, Any] = None,
+    name: Optional[str] = None
+):
+    """
+    Time a query execution; the block reports its row count through the
+    yielded callable. Failed executions are counted as errors, and slow
+    ones are added to the slow query log.
+    """
+    label = Metrics.query_name(query, name)
+    started = time.perf_counter()
+
+    def observe(rows: int):
+        seconds = time.perf_counter() - started
+        if METRICS_ENABLED:
+            Metrics.observe_query(label, seconds, rows)
+        SlowQueries.observe(conn, label, query, params, seconds, rows)
+        if PROFILING_ENABLED:
+            Profiler.record_query(label, seconds, rows)
+
+    try:
+        yield observe
+    except BaseException:
+        if METRICS_ENABLED:
+            Metrics.query_errors.inc((label,))
+        raise
+
+def execute_query(
+    conn: psycopg.Connection,
+    query: str,
+    params: Dict[str, Any] = None,
+    shared: bool = False,
+    name: Optional[str] = None
+) -> List[Dict[str, Any]]:
+    """
+    Execute a query and return results as a list of dictionaries
+
+    With shared=True, concurrent identical read-only queries share one
+    execution (see SingleFlight) and the rows must not be modified.
+    Executions are timed under `name`, or the name of the Queries entry.
+    """
+    if shared:
+        return SingleFlight.do(SingleFlight.key(query, params), lambda: execute_query(conn, query, params, name=name))
+    with timed(conn, query, params, name) as observe:
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(query, params or {})
+            rows = cur.fetchall()
+        observe(len(rows))
+        return rows
 
-def execute_one(conn: psycopg.Connection, query: str, params: Dict[str, Any] = None) -> Optional[Dict[str, Any]]:
-    """Execute a query and return a single result as a dictionary"""
-    with conn.cursor(row_factory=dict_row) as cur:
-        cur.execute(query, params or {})
-        return cur.fetchone()
+def execute_one(
+    conn: psycopg.Connection,
+    query: str,
+    params: Dict[str, Any] = None,
+    shared: bool = False,
+    name: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """Execute a query and return a single result as a dictionary (shared and timed as in execute_query)"""
+    if shared:
+        return SingleFlight.do(("one", SingleFlight.key(query, params)), lambda: execute_one(conn, query, params, name=name))
+    with timed(conn, query, params, name) as observe:
+        with conn.cursor(row_factory=dict_row) as cur:
+            cur.execute(query, params or {})
+            row = cur.fetchone()
+        observe(0 if row is None else 1)
+        return row
 
 def initialize_database():
     """Initialize database with schema and tables"""
@@ -0,0 +1,148 @@
+import bisect
+import os
+import threading
+from typing import Dict, List, Optional, Tuple
+from .singleflight import SingleFlight
+
+# Record query, connection and request timings (exposed at /metrics)
+METRICS_ENABLED = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+# Label value of queries that are not a registered Queries entry
+OTHER_QUERY = "other"
+
+
+def _escape(value) -> str:
+    """Label value escaped for the text format"""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(names: Tuple[str, ...], values: tuple, le: Optional[str] = None) -> str:
+    """Prometheus label set, e.g. {query="top_artists",le="0.1"}"""
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if le is not None:
+        pairs.append(f'le="{le}"')
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic count per label set"""
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, labels: tuple = (), amount: float = 1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def render(self) -> List[str]:
+        with self._lock:
+            values = sorted(self._values.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_labels(self.labels, labels)} {value}" for labels, value in values]
+        return lines
+
+
+class Histogram:
+    """
+    Latency histogram per label set
+
+    An observation is a bisect and two increments under a lock; buckets are
+    only made cumulative when rendered.
+    """
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets: Tuple[float, ...] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        # labels -> [count per bucket..., count above the last bucket, sum]
+        self._series: Dict[tuple, list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, labels: tuple, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    def render(self) -> List[str]:
+        with self._lock:
+            series = sorted((labels, list(values)) for labels, values in self._series.items())
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for labels, values in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), values):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_labels(self.labels, labels, str(bound))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {values[-1]}")
+            lines.append(f"{self.name}_count{_labels(self.labels, labels)} {cumulative}")
+        return lines
+
+
+class Metrics:
+    """Process-wide query, connection and request metrics in Prometheus text format"""
+
+    query_seconds = Histogram("db_query_duration_seconds", "Query execution and fetch time", ("query",))
+    query_rows = Counter("db_query_rows_total", "Rows returned by queries", ("query",))
+    query_errors = Counter("db_query_errors_total", "Queries that raised", ("query",))
+    slow_queries = Counter("db_slow_queries_total", "Queries slower than SLOW_QUERY_MS", ("query",))
+    connect_seconds = Histogram("db_connect_duration_seconds", "Time to obtain a database connection")
+    request_seconds = Histogram("http_request_duration_seconds", "Request latency by route", ("method", "route"))
+    responses = Counter("http_responses_total", "Responses by route and status", ("method", "route", "status"))
+
+    # SQL text of each registered query -> its name
+    _names: Dict[str, str] = {}
+
+    @staticmethod
+    def name_queries(queries: type):
+        """Label the SQL returned by each staticmethod of a class with the method's name"""
+        for name, value in vars(queries).items():
+            if isinstance(value, staticmethod):
+                Metrics._names[getattr(queries, name)()] = name
+
+    @staticmethod
+    def query_name(query: str, name: Optional[str] = None) -> str:
+        """Label of a query: the given name, its registered name, or OTHER_QUERY"""
+        return name or Metrics._names.get(query, OTHER_QUERY)
+
+    @staticmethod
+    def observe_query(name: str, seconds: float, rows: int):
+        Metrics.query_seconds.observe((name,), seconds)
+        Metrics.query_rows.inc((name,), rows)
+
+    @staticmethod
+    def observe_request(method: str, route: str, status: int, seconds: float):
+        Metrics.request_seconds.observe((method, route), seconds)
+        Metrics.responses.inc((method, route, status))
+
+    @staticmethod
+    def render(extra: Optional[Dict[str, Tuple[str, float]]] = None) -> str:
+        """
+        All metrics in Prometheus text exposition format
+
+        `extra` adds counters kept elsewhere, as {name: (help, value)}.
+        """
+        lines = []
+        for metric in (
+            Metrics.query_seconds, Metrics.query_rows, Metrics.query_errors, Metrics.slow_queries,
+            Metrics.connect_seconds, Metrics.request_seconds, Metrics.responses
+        ):
+            lines += metric.render()
+        counters = {
+            "db_single_flight_executed_total": ("Queries executed by a single-flight leader", SingleFlight.executed),
+            "db_single_flight_coalesced_total": ("Queries answered by another caller's execution", SingleFlight.coalesced),
+            **(extra or {})
+        }
+        for name, (help, value) in counters.items():
+            lines += [f"# HELP {name} {help}", f"# TYPE {name} counter", f"{name} {value}"]
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,195 @@
+import asyncio
+import contextvars
+import hmac
+import os
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+# Let requests ask for a profile with PROFILE_HEADER; when off nothing is installed
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() == "true"
+
+# Header requesting a profile; its value must equal PROFILE_TOKEN, and
+# without a token no request is profiled
+PROFILE_HEADER = "X-Profile"
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+
+# Seconds between stack samples
+PROFILE_INTERVAL = float(os.getenv("PROFILE_INTERVAL", "0.001"))
+
+# Profiles kept for the admin endpoint
+PROFILES_KEPT = int(os.getenv("PROFILES_KEPT", "20"))
+
+# Deepest stack recorded per sample, and functions listed in a profile's summary
+MAX_STACK_DEPTH = 128
+TOP_FUNCTIONS = 25
+
+# Frames of this application, used to tell a worker thread is still running the request
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+_active: contextvars.ContextVar = contextvars.ContextVar("profile", default=None)
+
+
+def _label(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class Profile:
+    """
+    Sampled Python stacks and SQL timings of one request
+
+    A sampler thread reads the stacks of the event loop thread (while the
+    request's task is the one running) and of the worker threads that ran
+    the request's code (while that code is still on their stack), every
+    PROFILE_INTERVAL seconds.
+    """
+
+    def __init__(self, method: str, path: str):
+        self.profile_id = str(uuid.uuid4())
+        self.method = method
+        self.path = path
+        self.started_at = datetime.now()
+        self.seconds = None
+        self.samples = 0
+        self.stacks = Counter()
+        self.queries: List[Dict[str, Any]] = []
+        # thread ident -> outermost frame of this request's code on that thread
+        self._workers: Dict[int, Any] = {}
+        self._loop_thread = threading.get_ident()
+        self._loop = asyncio.get_running_loop()
+        self._task = asyncio.current_task()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name="request-profiler", daemon=True)
+
+    def start(self) -> contextvars.Token:
+        self._started = time.perf_counter()
+        self._sampler.start()
+        return _active.set(self)
+
+    def stop(self, token: contextvars.Token):
+        self._stop.set()
+        self._sampler.join()
+        self.seconds = time.perf_counter() - self._started
+        _active.reset(token)
+
+    def track(self):
+        """Sample the calling thread while the application frames now on its stack are running"""
+        ident = threading.get_ident()
+        if ident == self._loop_thread or ident in self._workers:
+            return
+        anchor = None
+        frame = sys._getframe(1)
+        while frame is not None:
+            if frame.f_code.co_filename.startswith(APP_DIR):
+                anchor = frame
+            frame = frame.f_back
+        if anchor is not None:
+            self._workers[ident] = anchor
+
+    def _sample(self):
+        while not self._stop.wait(PROFILE_INTERVAL):
+            frames = sys._current_frames()
+            if asyncio.current_task(self._loop) is self._task:
+                self._record(frames.get(self._loop_thread))
+            for ident, anchor in list(self._workers.items()):
+                self._record(frames.get(ident), anchor)
+
+    def _record(self, frame, anchor=None):
+        stack = []
+        inside = anchor is None
+        while frame is not None and len(stack) < MAX_STACK_DEPTH:
+            inside = inside or frame is anchor
+            stack.append(_label(frame))
+            frame = frame.f_back
+        if stack and inside:
+            self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def collapsed(self) -> str:
+        """Stacks in collapsed format ("outer;inner count" per line), for flame graph tools"""
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+    def summary(self, stacks: bool = True) -> Dict[str, Any]:
+        """Timings, SQL breakdown and hottest functions; with stacks, the collapsed stacks too"""
+        own, total = Counter(), Counter()
+        for stack, count in self.stacks.items():
+            functions = stack.split(";")
+            own[functions[-1]] += count
+            for function in set(functions):
+                total[function] += count
+        sql_seconds = sum(query["ms"] for query in self.queries) / 1000
+        summary = {
+            "profile_id": self.profile_id,
+            "method": self.method,
+            "path": self.path,
+            "started_at": self.started_at,
+            "ms": round(self.seconds * 1000, 1) if self.seconds is not None else None,
+            "sql_ms": round(sql_seconds * 1000, 1),
+            "samples": self.samples,
+            "interval_ms": PROFILE_INTERVAL * 1000,
+            "queries": self.queries,
+            "top": [
+                {"function": function, "own_samples": count, "total_samples": total[function]}
+                for function, count in own.most_common(TOP_FUNCTIONS)
+            ]
+        }
+        if stacks:
+            summary["collapsed"] = self.collapsed()
+        return summary
+
+
+class Profiler:
+    """Opt-in per-request profiles, requested with PROFILE_HEADER and kept in memory"""
+
+    _profiles: "OrderedDict[str, Profile]" = OrderedDict()
+    _lock = threading.Lock()
+
+    @staticmethod
+    def requested(headers: List[tuple]) -> bool:
+        """Whether raw ASGI request headers ask for a profile"""
+        name = PROFILE_HEADER.lower().encode()
+        for key, value in headers:
+            if key == name:
+                return bool(PROFILE_TOKEN) and hmac.compare_digest(value, PROFILE_TOKEN.encode())
+        return False
+
+    @staticmethod
+    def current() -> Optional[Profile]:
+        """Profile of the request being handled, if it is profiled"""
+        return _active.get()
+
+    @staticmethod
+    def track():
+        """Include the calling worker thread in the current request's profile"""
+        profile = _active.get()
+        if profile is not None:
+            profile.track()
+
+    @staticmethod
+    def record_query(name: str, seconds: float, rows: int):
+        profile = _active.get()
+        if profile is not None:
+            profile.queries.append({"query": name, "ms": round(seconds * 1000, 2), "rows": rows})
+
+    @staticmethod
+    def keep(profile: Profile):
+        with Profiler._lock:
+            Profiler._profiles[profile.profile_id] = profile
+            while len(Profiler._profiles) > PROFILES_KEPT:
+                Profiler._profiles.popitem(last=False)
+
+    @staticmethod
+    def get(profile_id: str) -> Optional[Profile]:
+        with Profiler._lock:
+            return Profiler._profiles.get(profile_id)
+
+    @staticmethod
+    def profiles() -> List[Profile]:
+        """Kept profiles, newest first"""
+        with Profiler._lock:
+            return list(reversed(Profiler._profiles.values()))
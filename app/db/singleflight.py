@@ -0,0 +1,70 @@
+import json
+import threading
+from typing import Any, Callable, Dict, Hashable
+
+
+class _Call:
+    """An execution in flight and the callers waiting for it"""
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: BaseException = None
+
+
+class SingleFlight:
+    """
+    Share one execution between concurrent identical calls
+
+    The first caller for a key runs the function; callers arriving while it
+    runs wait for it and receive the same result (or exception). Results are
+    shared objects and must be treated as read-only.
+    """
+
+    _calls: Dict[Hashable, _Call] = {}
+    _lock = threading.Lock()
+    executed = 0
+    coalesced = 0
+
+    @staticmethod
+    def key(query: str, params: Dict[str, Any] = None) -> str:
+        """Normalized key for a query and its parameters"""
+        return query + "\x00" + json.dumps(params or {}, sort_keys=True, default=str)
+
+    @staticmethod
+    def do(key: Hashable, fn: Callable[[], Any]) -> Any:
+        with SingleFlight._lock:
+            call = SingleFlight._calls.get(key)
+            leader = call is None
+            if leader:
+                call = SingleFlight._calls[key] = _Call()
+                SingleFlight.executed += 1
+            else:
+                SingleFlight.coalesced += 1
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with SingleFlight._lock:
+                del SingleFlight._calls[key]
+            call.done.set()
+
+    @staticmethod
+    def stats() -> Dict[str, int]:
+        """Executed versus coalesced calls since startup"""
+        with SingleFlight._lock:
+            return {
+                "executed": SingleFlight.executed,
+                "coalesced": SingleFlight.coalesced,
+                "in_flight": len(SingleFlight._calls)
+            }
@@ -0,0 +1,105 @@
+import logging
+import os
+import random
+import threading
+from collections import deque
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+import psycopg
+from .metrics import Metrics, METRICS_ENABLED
+
+logger = logging.getLogger(__name__)
+
+# Statements slower than this many milliseconds are logged (0 disables the log)
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", "500"))
+
+# Share of slow statements re-run under EXPLAIN (ANALYZE, BUFFERS) to capture their plan
+SLOW_QUERY_EXPLAIN_RATE = float(os.getenv("SLOW_QUERY_EXPLAIN_RATE", "0"))
+
+# Most recent slow statements kept for the admin endpoint
+SLOW_QUERY_LOG_SIZE = int(os.getenv("SLOW_QUERY_LOG_SIZE", "100"))
+
+
+def redact(params: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Parameters with their values replaced by their type (and length for
+    lists); NULLs are kept since they change which filters apply
+    """
+    redacted = {}
+    for key, value in (params or {}).items():
+        if value is None:
+            redacted[key] = None
+        elif isinstance(value, (list, tuple)):
+            redacted[key] = f"<{type(value).__name__}[{len(value)}]>"
+        else:
+            redacted[key] = f"<{type(value).__name__}>"
+    return redacted
+
+
+class SlowQueries:
+    """Log of statements over SLOW_QUERY_MS, with sampled plans, in a ring buffer"""
+
+    _entries = deque(maxlen=SLOW_QUERY_LOG_SIZE)
+    _lock = threading.Lock()
+
+    @staticmethod
+    def observe(
+        conn: psycopg.Connection,
+        name: str,
+        query: str,
+        params: Optional[Dict[str, Any]],
+        seconds: float,
+        rows: int
+    ):
+        """Record a finished statement if it was slow"""
+        if SLOW_QUERY_MS <= 0 or seconds * 1000 < SLOW_QUERY_MS:
+            return
+        entry = {
+            "query": name,
+            "sql": query.strip(),
+            "params": redact(params),
+            "ms": round(seconds * 1000, 1),
+            "rows": rows,
+            "at": datetime.now().isoformat(timespec="seconds"),
+            "plan": None
+        }
+        logger.warning("Slow query %s: %.1f ms, %d rows, params %s", name, entry["ms"], rows, entry["params"])
+        if METRICS_ENABLED:
+            Metrics.slow_queries.inc((name,))
+
+        explainable = not query.lstrip().upper().startswith("EXPLAIN")
+        if explainable and SLOW_QUERY_EXPLAIN_RATE > 0 and random.random() < SLOW_QUERY_EXPLAIN_RATE:
+            entry["plan"] = SlowQueries.explain(conn, query, params)
+        with SlowQueries._lock:
+            SlowQueries._entries.append(entry)
+
+    @staticmethod
+    def explain(conn: psycopg.Connection, query: str, params: Optional[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """
+        Run a statement again under EXPLAIN (ANALYZE, BUFFERS)
+
+        The statement runs inside a transaction (a savepoint if one is open)
+        that is always rolled back, so writes are never applied twice.
+        """
+        try:
+            with conn.transaction(force_rollback=True):
+                with conn.cursor() as cur:
+                    cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + query.strip(), params or {})
+                    return cur.fetchone()[0][0]
+        except Exception as e:
+            logger.warning("Could not capture the plan of a slow query: %s", e)
+            return None
+
+    @staticmethod
+    def entries(limit: Optional[int] = None, plans: bool = True) -> List[Dict[str, Any]]:
+        """Logged slow statements, newest first; with plans=False, without their plans"""
+        with SlowQueries._lock:
+            entries = list(reversed(SlowQueries._entries))[:limit]
+        if not plans:
+            entries = [{**entry, "plan": None} for entry in entries]
+        return entries
+
+    @staticmethod
+    def clear():
+        with SlowQueries._lock:
+            SlowQueries._entries.clear()
@@ -1,9 +1,23 @@
+import logging
+import time
 from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import PlainTextResponse
 from .api.endpoints import router as analytics_router
 from .api.import_endpoints import router as import_router
 from .api.csv_endpoints import router as csv_router
+from .api.export_endpoints import router as export_router
+from .api.statement_endpoints import router as statement_router
+from .api.payout_endpoints import router as payout_router
+from .api.admin_endpoints import router as admin_router
 from .models.base import ResponseModel
+from .crud.snapshot import SnapshotEngine
+from .crud.cache import Generations, ResponseCache
+from .db.singleflight import SingleFlight
+from .db.metrics import Metrics, METRICS_ENABLED
+from .db.profiling import Profile, Profiler, PROFILING_ENABLED, PROFILE_TOKEN
+
+logger = logging.getLogger(__name__)
 
 app = FastAPI(
     title="Royalty Analytics API",
@@ -13,6 +27,85 @@ app = FastAPI(
     redoc_url="/redoc"
 )
 
+def route_template(scope) -> str:
+    """
+    Template of the matched route, e.g. /api/v1/artists/{artist_id}/earnings,
+    which keeps metric label cardinality bounded
+
+    Routes of included routers may carry only their own part of the path, so
+    the router prefix is taken from the leading segments of the request path.
+    """
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+    segments = scope["path"].split("/")
+    return "/".join(segments[:max(1, len(segments) - route.path.count("/"))]) + route.path
+
+class RequestMetrics:
+    """
+    Time every request and count its status by method and route template
+
+    A plain ASGI middleware, so streamed responses are timed to their last
+    chunk and no extra task is spawned per request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+        started = time.perf_counter()
+        status = 500
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            Metrics.observe_request(scope["method"], route_template(scope), status, time.perf_counter() - started)
+
+class RequestProfiler:
+    """
+    Profile requests carrying the profile header (see app.db.profiling)
+
+    The profile is kept for /api/v1/admin/profiles and its ID returned in
+    the X-Profile-ID response header. Only installed with PROFILING_ENABLED
+    and a PROFILE_TOKEN.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not Profiler.requested(scope["headers"]):
+            return await self.app(scope, receive, send)
+        profile = Profile(scope["method"], scope["path"])
+
+        async def send_with_id(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", [])) + [(b"x-profile-id", profile.profile_id.encode())]
+                message = {**message, "headers": headers}
+            await send(message)
+
+        token = profile.start()
+        try:
+            await self.app(scope, receive, send_with_id)
+        finally:
+            profile.stop(token)
+            Profiler.keep(profile)
+
+if METRICS_ENABLED:
+    app.add_middleware(RequestMetrics)
+if PROFILING_ENABLED and not PROFILE_TOKEN:
+    logger.warning("PROFILING_ENABLED is set without PROFILE_TOKEN: requests will not be profiled")
+elif PROFILING_ENABLED:
+    app.add_middleware(RequestProfiler)
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -26,6 +119,20 @@ app.add_middleware(
 app.include_router(analytics_router, prefix="/api/v1", tags=["Analytics"])
 app.include_router(import_router, prefix="/api/v1/import", tags=["Import"])
 app.include_router(csv_router, prefix="/api/v1/import/csv", tags=["CSV Import"])
+app.include_router(export_router, prefix="/api/v1/exports", tags=["Exports"])
+app.include_router(statement_router, prefix="/api/v1/statements", tags=["Statements"])
+app.include_router(payout_router, prefix="/api/v1/payouts", tags=["Payouts"])
+app.include_router(admin_router, prefix="/api/v1/admin", tags=["Admin"])
+
+@app.on_event("startup")
+async def load_snapshot():
+    """Start loading the in-memory analytics snapshot when it is enabled"""
+    SnapshotEngine.schedule_reload()
+
+@app.on_event("startup")
+async def start_generation_listener():
+    """Follow data generations so cached responses and ETags change after imports"""
+    Generations.start()
 
 @app.get("/", response_model=ResponseModel)
 async def root():
@@ -50,8 +157,21 @@ async def health_check():
             message="Service is healthy",
             data={
                 "status": "UP",
-                "timestamp": "utc_timestamp"
+                "timestamp": "utc_timestamp",
+                "single_flight": SingleFlight.stats(),
+                "response_cache": {"hits": ResponseCache.hits, "misses": ResponseCache.misses}
             }
         )
     except Exception as e:
         raise HTTPException(status_code=503, detail=str(e))
+
+@app.get("/metrics", response_class=PlainTextResponse, include_in_schema=False)
+def metrics():
+    """Query, connection and request metrics in Prometheus text format"""
+    return PlainTextResponse(
+        Metrics.render({
+            "response_cache_hits_total": ("Responses served from the cache", ResponseCache.hits),
+            "response_cache_misses_total": ("Responses computed on a cache miss", ResponseCache.misses)
+        }),
+        media_type="text/plain; version=0.0.4; charset=utf-8"
+    )
@@ -72,6 +72,14 @@ class ArtistPerformance(BaseModel):
             }
         }
 
+class ArtistEarnings(BaseModel):
+    """Batch earnings entry for one requested artist"""
+    artist_id: int
+    found: bool = Field(description="Whether the artist exists")
+    earnings: Optional[ArtistPerformance] = Field(
+        default=None, description="Latest period in range; null when not found or without data"
+    )
+
 class PlatformMetrics(BaseModel):
     """Platform performance metrics"""
     platform_name: str
@@ -196,3 +204,103 @@ class PlatformLabelMatrix(BaseModel):
                 "total_royalties": 0.464605
             }
         }
+
+class TimeSeriesPoint(BaseModel):
+    """One month of an entity's revenue time series"""
+    period: int = Field(description="Period key (YYYYMM)")
+    total_plays: int
+    total_revenue: float
+    total_royalties: float
+    plays_change: Optional[int] = Field(default=None, description="Change in plays from the previous month")
+    revenue_change: Optional[float] = Field(default=None, description="Change in revenue from the previous month")
+    royalties_change: Optional[float] = Field(default=None, description="Change in royalties from the previous month")
+    revenue_change_pct: Optional[float] = Field(default=None, description="Revenue change in percent of the previous month")
+    rolling_plays: Optional[int] = Field(default=None, description="Plays over the rolling window")
+    rolling_revenue: Optional[float] = Field(default=None, description="Revenue over the rolling window")
+    rolling_royalties: Optional[float] = Field(default=None, description="Royalties over the rolling window")
+
+    class Config:
+        from_attributes = True
+        json_schema_extra = {
+            "example": {
+                "period": 202304,
+                "total_plays": 120,
+                "total_revenue": 18.42,
+                "total_royalties": 12.89,
+                "plays_change": 15,
+                "revenue_change": 2.10,
+                "royalties_change": 1.47,
+                "revenue_change_pct": 12.87,
+                "rolling_plays": 330,
+                "rolling_revenue": 49.75,
+                "rolling_royalties": 34.82
+            }
+        }
+
+class RollupRow(BaseModel):
+    """One group of a rollup query; dimensions not grouped on are omitted"""
+    period: Optional[int] = Field(default=None, description="Period key (YYYYMM)")
+    artist_id: Optional[int] = None
+    artist_name: Optional[str] = None
+    label_id: Optional[int] = None
+    label_name: Optional[str] = None
+    platform_name: Optional[str] = None
+    country_code: Optional[str] = None
+    fact_rows: int = Field(description="Number of revenue records aggregated")
+    total_plays: int
+    total_revenue: float
+    total_royalties: float
+
+    class Config:
+        from_attributes = True
+        json_schema_extra = {
+            "example": {
+                "period": 202304,
+                "label_id": 1,
+                "label_name": "Abhi",
+                "platform_name": "Apple",
+                "fact_rows": 42,
+                "total_plays": 150,
+                "total_revenue": 35.67,
+                "total_royalties": 24.97
+            }
+        }
+
+class PayoutDue(BaseModel):
+    """Artist whose carried-forward balance reached the payment threshold"""
+    artist_id: int
+    artist_name: str
+    tenant_id: int
+    balance: float = Field(description="Royalties earned and not yet paid out")
+    payment_threshold: float
+    earned: float = Field(description="Royalties credited by imports")
+    paid: float = Field(description="Payouts recorded")
+    last_period: Optional[int] = Field(default=None, description="Latest period credited (YYYYMM)")
+    updated_at: datetime
+
+    class Config:
+        from_attributes = True
+        json_schema_extra = {
+            "example": {
+                "artist_id": 48,
+                "artist_name": "Amrit Nagra",
+                "tenant_id": 1,
+                "balance": 142.37,
+                "payment_threshold": 100.00,
+                "earned": 542.37,
+                "paid": 400.00,
+                "last_period": 202406,
+                "updated_at": "2024-07-03T08:15:00"
+            }
+        }
+
+class PayoutLedgerEntry(BaseModel):
+    """Royalty credit, payout debit or royalty reversal of an artist's balance"""
+    entry_id: int
+    entry_type: str = Field(description="ROYALTY, PAYOUT or REVERSAL")
+    amount: float = Field(description="Credited amount; payouts and reversals are negative")
+    balance_after: float
+    first_period: Optional[int] = Field(default=None, description="First period of a royalty or reversal entry (YYYYMM)")
+    last_period: Optional[int] = Field(default=None, description="Last period of a royalty or reversal entry (YYYYMM)")
+    reference: Optional[str] = None
+    created_at: datetime
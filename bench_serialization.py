@@ -0,0 +1,104 @@
+"""
+Benchmark response serialization for large analytics result sets
+
+Compares, for synthetic geography and platform-label rows shaped like the
+routed query results (money and summed plays as Decimal), the per-row model
+path FastAPI used to take (a model per row, response_model validation and
+encoding) with bulk TypeAdapter validation and the trusted EncodedRows path,
+and checks that all three produce the same JSON.
+
+Usage:
+    python bench_serialization.py [--rows 10000 100000] [--iterations 5]
+
+Needs no database.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+from decimal import Decimal
+from typing import List
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_model_field
+from pydantic import TypeAdapter
+from app.models.base import ResponseModel, EncodedRows, encode_response, orjson
+from app.models.revenue import GeographicMetrics, PlatformLabelMatrix
+
+
+def geography_row(i: int) -> dict:
+    return {
+        "period": 202406, "year": 2024, "month": "Jun", "isrc": f"GEN{i:09d}",
+        "song_name": f"Generated Song {i}", "artist_name": f"Generated Artist {i % 500}",
+        "country_code": "US", "region": "North America", "platform_name": "Spotify",
+        "total_plays": Decimal(1 + i % 1000), "total_revenue": Decimal(i % 997).scaleb(-3),
+        "total_royalties": Decimal(i % 691).scaleb(-3)
+    }
+
+
+def platform_label_row(i: int) -> dict:
+    return {
+        "period": 202406, "year": 2024, "month": "Jun", "artist_id": 1000 + i,
+        "artist_name": f"Generated Artist {i}", "platform_name": "YouTube", "label_id": 1 + i % 29,
+        "label_name": f"Label {1 + i % 29}", "unique_songs": 1 + i % 12,
+        "total_plays": Decimal(1 + i % 1000), "total_revenue": Decimal(i % 997).scaleb(-3),
+        "total_royalties": Decimal(i % 691).scaleb(-3)
+    }
+
+
+FIELD = create_model_field(name="Response", type_=ResponseModel, mode="serialization")
+
+
+def per_row_models(model, rows) -> bytes:
+    """Model per row, then FastAPI's response_model validation and encoding"""
+    response = ResponseModel(success=True, message="ok", data=[model(**row) for row in rows], meta={"limit": None})
+    content = asyncio.run(serialize_response(field=FIELD, response_content=response, is_coroutine=False))
+    return JSONResponse(content).body
+
+
+def bulk_validated(model, rows) -> bytes:
+    """TypeAdapter over the whole list, encoded once"""
+    response = ResponseModel(success=True, message="ok", data=TypeAdapter(List[model]).validate_python(rows), meta={"limit": None})
+    return encode_response(response)
+
+
+def encoded_rows(model, rows) -> bytes:
+    """Trusted database rows encoded straight to JSON"""
+    response = ResponseModel(success=True, message="ok", data=EncodedRows(model, rows), meta={"limit": None})
+    return encode_response(response)
+
+
+def timed(fn, iterations: int) -> float:
+    """Median wall time of `fn` in milliseconds"""
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--iterations", type=int, default=5)
+    args = parser.parse_args()
+
+    if orjson is None:
+        print("orjson is not installed: EncodedRows falls back to bulk validation")
+    print(f"{'model':<22}{'rows':>8}{'per-row':>12}{'bulk':>12}{'encoded':>12}{'speedup':>10}  match")
+    for model, make_row in ((GeographicMetrics, geography_row), (PlatformLabelMatrix, platform_label_row)):
+        for count in args.rows:
+            rows = [make_row(i) for i in range(count)]
+            match = per_row_models(model, rows) == bulk_validated(model, rows) == encoded_rows(model, rows)
+            per_row_ms = timed(lambda: per_row_models(model, rows), args.iterations)
+            bulk_ms = timed(lambda: bulk_validated(model, rows), args.iterations)
+            encoded_ms = timed(lambda: encoded_rows(model, rows), args.iterations)
+            print(
+                f"{model.__name__:<22}{count:>8}{per_row_ms:>10.1f}ms{bulk_ms:>10.1f}ms{encoded_ms:>10.1f}ms"
+                f"{per_row_ms / encoded_ms:>9.1f}x  {'yes' if match else 'NO'}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+"""
+Benchmark the in-memory snapshot engine against the SQL paths
+
+For every routed aggregate query, times the routed SQL (materialized views
+when fresh), the fact-table SQL and the snapshot engine, and checks that the
+snapshot returns exactly the fact-table rows.
+
+Usage:
+    python bench_snapshot.py [--iterations 20] [--period 202304]
+
+Uses the database configured in .env; the period defaults to the latest one loaded.
+"""
+import argparse
+import statistics
+import time
+from app.db.database import get_db, execute_query, execute_one
+from app.crud.aggregates import AggregateRouter, FACT_SOURCE, ROUTED_QUERIES
+from app.crud.snapshot import Snapshot
+
+
+def timed(fn, iterations: int) -> float:
+    """Median wall time of `fn` in milliseconds"""
+    samples = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def canonical(rows: list) -> list:
+    """Rows in a comparable order (ties may come back in any order)"""
+    return sorted(tuple(sorted((k, str(v)) for k, v in row.items())) for row in rows)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("--iterations", type=int, default=20)
+    parser.add_argument("--period", type=int, default=None)
+    args = parser.parse_args()
+
+    with get_db() as conn:
+        period = args.period or execute_one(
+            conn, "SELECT MAX(period) AS period FROM analytics.fact_monthly_revenue;"
+        )["period"]
+        started = time.perf_counter()
+        snapshot = Snapshot.load(conn)
+        print(f"Loaded snapshot of {snapshot.rows} fact rows in {time.perf_counter() - started:.2f}s")
+        conn.rollback()
+
+        params = {
+            "period": period,
+            "period_from": None,
+            "period_to": None,
+            "month": None,
+            "label_id": None,
+            "artist_id": None,
+            "platform_name": None,
+            "label_name": None,
+            "country_code": None,
+            "isrc": None
+        }
+        artist = execute_one(
+            conn,
+            "SELECT artist_id FROM analytics.fact_monthly_revenue WHERE period = %(period)s LIMIT 1;",
+            params
+        )
+        if artist:
+            params["artist_id"] = artist["artist_id"]
+        params["period_from"], params["period_to"] = period - 100, period
+
+        print(f"\n{'query':<24}{'routed sql':>12}{'fact sql':>12}{'snapshot':>12}{'speedup':>10}  match")
+        for name, query in ROUTED_QUERIES.items():
+            fact_sql = FACT_SOURCE.render(query, query.predicates(params))
+            expected = execute_query(conn, fact_sql, params)
+            rows, _ = snapshot.query(query, params)
+            # Limited queries may break revenue ties differently; compare their totals
+            if query.limit:
+                match = [r["total_revenue" if "total_revenue" in r else "revenue"] for r in rows] == \
+                    [r["total_revenue" if "total_revenue" in r else "revenue"] for r in expected]
+            else:
+                match = canonical(rows) == canonical(expected)
+
+            def routed():
+                sql, _ = AggregateRouter.plan(conn, name, params)
+                return execute_query(conn, sql, params)
+
+            routed_ms = timed(routed, args.iterations)
+            fact_ms = timed(lambda: execute_query(conn, fact_sql, params), args.iterations)
+            snapshot_ms = timed(lambda: snapshot.query(query, params), args.iterations)
+            print(
+                f"{name:<24}{routed_ms:>10.2f}ms{fact_ms:>10.2f}ms{snapshot_ms:>10.3f}ms"
+                f"{routed_ms / snapshot_ms:>9.1f}x  {'yes' if match else 'NO'}"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -6,6 +6,13 @@ DROP SCHEMA IF EXISTS analytics CASCADE;
 CREATE SCHEMA whitelabel;
 
 -- Create whitelabel tables
+-- White-label clients; every artist, and so every fact row, belongs to one
+CREATE TABLE whitelabel.tenant (
+    tenant_id SERIAL PRIMARY KEY,
+    tenant_name VARCHAR(100) NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
 CREATE TABLE whitelabel.label (
     label_id SERIAL PRIMARY KEY,
     label_name VARCHAR(100) NOT NULL,
@@ -15,6 +22,7 @@ CREATE TABLE whitelabel.label (
 CREATE TABLE whitelabel.artist (
     artist_id INT PRIMARY KEY,  -- This will match the userid from RevenueSheet
     artist_name VARCHAR(255) NOT NULL,
+    tenant_id INT NOT NULL DEFAULT 1 REFERENCES whitelabel.tenant(tenant_id),
     payment_threshold DECIMAL(15,6) DEFAULT 100.00,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
@@ -55,22 +63,157 @@ CREATE TABLE analytics.platform_config (
     CONSTRAINT valid_share CHECK (revenue_share_percentage BETWEEN 0 AND 100)
 );
 
+-- Sortable period key: YYYYMM as an integer (e.g. 202304 for Apr 2023)
+CREATE OR REPLACE FUNCTION analytics.to_period(d DATE)
+RETURNS INT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT (EXTRACT(YEAR FROM d) * 100 + EXTRACT(MONTH FROM d))::int;
+$$;
+
+-- Period following a YYYYMM period key (202312 -> 202401)
+CREATE OR REPLACE FUNCTION analytics.next_period(p INT)
+RETURNS INT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT CASE WHEN p % 100 = 12 THEN (p / 100 + 1) * 100 + 1 ELSE p + 1 END;
+$$;
+
+-- Monthly range partitions on period; created on demand by the ETL
 CREATE TABLE analytics.fact_monthly_revenue (
-    revenue_id BIGSERIAL PRIMARY KEY,
-    year INT NOT NULL,
-    month VARCHAR(3) NOT NULL,
+    revenue_id BIGSERIAL,
+    period INT NOT NULL,
+    -- year/month are derived from period and kept for existing filters
+    year INT GENERATED ALWAYS AS (period / 100) STORED,
+    month VARCHAR(3) GENERATED ALWAYS AS (
+        (ARRAY['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+               'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'])[period % 100]
+    ) STORED,
     song_id INT NOT NULL REFERENCES whitelabel.song(song_id),
     platform_id INT NOT NULL REFERENCES analytics.platform_config(platform_id),
     geography_id INT REFERENCES analytics.dim_geography(geography_id),
     artist_id INT NOT NULL REFERENCES whitelabel.artist(artist_id),
+    -- The artist's tenant, denormalized so tenant-scoped queries need no join
+    tenant_id INT NOT NULL REFERENCES whitelabel.tenant(tenant_id),
     total_plays INT NOT NULL,
     revenue_amount DECIMAL(15,6) NOT NULL,
     royalty_amount DECIMAL(15,6) NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
     CONSTRAINT valid_amounts CHECK (royalty_amount <= revenue_amount),
+    CONSTRAINT valid_period CHECK (period % 100 BETWEEN 1 AND 12),
     CONSTRAINT valid_month CHECK (month IN ('Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 
-                                          'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'))
-);
+                                          'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec')),
+    -- The partition key has to be part of the primary key
+    PRIMARY KEY (revenue_id, period)
+) PARTITION BY RANGE (period);
+
+-- Detached partitions are moved here instead of being dropped
+CREATE SCHEMA IF NOT EXISTS analytics_archive;
+
+-- Create the monthly partitions covering p_from..p_to that do not exist yet.
+-- Creation is serialized (concurrent imports of a new month would both try
+-- to create it), and the lock is only taken when a partition is missing.
+CREATE OR REPLACE PROCEDURE analytics.ensure_fact_partitions(p_from INT, p_to INT)
+LANGUAGE plpgsql AS $$
+DECLARE
+    p INT := p_from;
+    partition_name TEXT;
+BEGIN
+    WHILE p <= p_to LOOP
+        partition_name := format('fact_monthly_revenue_p%s', p);
+        IF to_regclass('analytics.' || partition_name) IS NULL THEN
+            PERFORM pg_advisory_xact_lock(hashtext('analytics.fact_monthly_revenue partitions'));
+        END IF;
+        -- Checked again: another import may have created it while we waited
+        IF to_regclass('analytics.' || partition_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE analytics.%I PARTITION OF analytics.fact_monthly_revenue '
+                'FOR VALUES FROM (%s) TO (%s)',
+                partition_name, p, analytics.next_period(p)
+            );
+        END IF;
+        p := analytics.next_period(p);
+    END LOOP;
+END;
+$$;
+
+-- Detach a month from the fact table, archiving it or dropping it outright
+CREATE OR REPLACE PROCEDURE analytics.detach_fact_partition(p_period INT, p_archive BOOLEAN DEFAULT true)
+LANGUAGE plpgsql AS $$
+DECLARE
+    partition_name TEXT := format('fact_monthly_revenue_p%s', p_period);
+BEGIN
+    IF to_regclass('analytics.' || partition_name) IS NULL THEN
+        RAISE EXCEPTION 'No partition for period %', p_period;
+    END IF;
+
+    EXECUTE format('ALTER TABLE analytics.fact_monthly_revenue DETACH PARTITION analytics.%I', partition_name);
+    IF p_archive THEN
+        EXECUTE format('ALTER TABLE analytics.%I SET SCHEMA analytics_archive', partition_name);
+    ELSE
+        -- Dropped royalties are no longer owed: post a REVERSAL per artist
+        -- whose balance they were credited to (it may go negative if they
+        -- were already paid out)
+        EXECUTE format($sql$
+            WITH debits AS (
+                SELECT artist_id, SUM(royalty_amount) AS amount
+                FROM analytics.%I
+                GROUP BY artist_id
+                HAVING SUM(royalty_amount) <> 0
+            ),
+            balances AS (
+                UPDATE analytics.payout_balance b
+                SET balance = b.balance - d.amount,
+                    earned = b.earned - d.amount,
+                    updated_at = now()
+                FROM debits d
+                WHERE b.artist_id = d.artist_id
+                RETURNING b.artist_id, b.balance
+            )
+            INSERT INTO analytics.payout_ledger (
+                artist_id, entry_type, amount, balance_after, first_period, last_period, reference
+            )
+            SELECT d.artist_id, 'REVERSAL', -d.amount, b.balance, %s, %s, %L
+            FROM debits d
+            JOIN balances b ON d.artist_id = b.artist_id;
+        $sql$, partition_name, p_period, p_period, 'Dropped partition ' || partition_name);
+
+        EXECUTE format('DROP TABLE analytics.%I', partition_name);
+    END IF;
+
+    CALL analytics.bump_data_generation(ARRAY[p_period]);
+
+    -- The rollup and sketches are maintained per period, so they stay current
+    -- (under the locks their refreshes take, in the same order)
+    PERFORM pg_advisory_xact_lock(hashtext('analytics.revenue_rollup'));
+    PERFORM pg_advisory_xact_lock(hashtext('analytics.distinct_sketch'));
+    DELETE FROM analytics.revenue_rollup WHERE period = p_period;
+    DELETE FROM analytics.distinct_sketch WHERE period = p_period;
+
+    -- The fact data changed, so every other aggregate is stale until refreshed
+    -- (DataImport.detach_partition refreshes them right after the detach)
+    UPDATE analytics.refresh_log
+    SET refreshed_at = now()
+    WHERE relation_name IN ('fact_monthly_revenue', 'revenue_rollup');
+END;
+$$;
+
+-- Covering indexes for the analytics queries (guarded by test_query_plans.py).
+-- Each leads on the filtered dimension and includes the summed measures so
+-- month-level aggregates can be answered from index-only scans.
+CREATE INDEX idx_revenue_period ON analytics.fact_monthly_revenue (period)
+INCLUDE (song_id, platform_id, artist_id, geography_id, total_plays, revenue_amount, royalty_amount);
+
+CREATE INDEX idx_revenue_artist ON analytics.fact_monthly_revenue (artist_id, period)
+INCLUDE (song_id, platform_id, total_plays, revenue_amount, royalty_amount);
+
+CREATE INDEX idx_revenue_song ON analytics.fact_monthly_revenue (song_id, period)
+INCLUDE (platform_id, total_plays, revenue_amount, royalty_amount);
+
+CREATE INDEX idx_revenue_platform ON analytics.fact_monthly_revenue (platform_id, period)
+INCLUDE (total_plays, revenue_amount, royalty_amount);
+
+-- Tenant-scoped queries read only their tenant's slice of each partition
+CREATE INDEX idx_revenue_tenant ON analytics.fact_monthly_revenue (tenant_id, period, artist_id)
+INCLUDE (song_id, platform_id, geography_id, total_plays, revenue_amount, royalty_amount);
 
 -- Clear staging table on create
 DROP TABLE IF EXISTS analytics.stg_revenue_import;
@@ -90,6 +233,8 @@ CREATE TABLE analytics.stg_revenue_import (
     total DECIMAL(15,6) NOT NULL,
     royalty DECIMAL(15,6) NOT NULL,
     userid INT NOT NULL,
+    -- Tenant importing the row; taken from the artist when not given
+    tenant_id INT REFERENCES whitelabel.tenant(tenant_id),
     status VARCHAR(20) DEFAULT 'PENDING',
     error_message TEXT,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
@@ -97,10 +242,81 @@ CREATE TABLE analytics.stg_revenue_import (
     CONSTRAINT positive_amounts CHECK (total >= 0 AND royalty >= 0)
 );
 
+-- One row per revenue import: outcome plus wall time, rows/sec and peak
+-- Python memory of each pipeline stage (parse, wait, stage, etl, refresh:<view>, warm)
+CREATE TABLE analytics.import_history (
+    job_id UUID PRIMARY KEY,
+    tenant_id INT,
+    source TEXT,
+    status VARCHAR(20) NOT NULL,
+    message TEXT,
+    rows_processed INT,
+    started_at TIMESTAMP NOT NULL,
+    finished_at TIMESTAMP,
+    seconds DECIMAL(12,3),
+    stages JSONB NOT NULL DEFAULT '[]'
+);
+
+CREATE INDEX idx_import_history_started ON analytics.import_history (started_at DESC);
+
+-- Refresh bookkeeping used by the API to avoid serving stale aggregates.
+-- The fact table row records the last load; each view row its last refresh.
+CREATE TABLE analytics.refresh_log (
+    relation_name TEXT PRIMARY KEY,
+    refreshed_at TIMESTAMP NOT NULL
+);
+
+-- Data generation per tenant and period, bumped whenever a period's facts
+-- change. Period 0 is a tenant's global generation, bumped on every change;
+-- tenant 0 stands for all tenants and is bumped by every import. The API
+-- keys cached responses on these counters and listens on the data_generation
+-- channel to drop them as soon as an import commits, so one tenant's import
+-- leaves the other tenants' cached responses alone.
+CREATE TABLE analytics.data_generation (
+    tenant_id INT NOT NULL,
+    period INT NOT NULL,
+    generation BIGINT NOT NULL,
+    changed_at TIMESTAMP NOT NULL,
+    PRIMARY KEY (tenant_id, period)
+);
+
+-- Bump the periods of the given tenants (every tenant when NULL)
+CREATE OR REPLACE PROCEDURE analytics.bump_data_generation(p_periods INT[], p_tenants INT[] DEFAULT NULL)
+LANGUAGE plpgsql AS $$
+BEGIN
+    INSERT INTO analytics.data_generation (tenant_id, period, generation, changed_at)
+    SELECT DISTINCT tenant_id, period, 1, now()
+    FROM unnest(COALESCE(p_tenants, ARRAY(SELECT tenant_id FROM whitelabel.tenant)) || 0) AS tenant_id
+    CROSS JOIN unnest(p_periods || 0) AS period
+    ON CONFLICT (tenant_id, period) DO UPDATE
+    SET generation = analytics.data_generation.generation + 1,
+        changed_at = EXCLUDED.changed_at;
+
+    -- Delivered to listeners when the transaction commits
+    PERFORM pg_notify('data_generation', array_to_string(p_periods, ','));
+END;
+$$;
+
+-- Dimension lookups used by the ETL and the analytics joins
+CREATE INDEX idx_platform_name ON analytics.platform_config (platform_name)
+WHERE is_active = true;
+
+CREATE INDEX idx_song_artist ON whitelabel.song (artist_id);
+
+CREATE INDEX idx_song_label ON whitelabel.song (label_id);
+
 -- Add index to help with duplicate detection
 CREATE INDEX idx_stg_revenue_import_natural_key 
 ON analytics.stg_revenue_import (month, isrc, country, service);
 
+-- Pending rows of one tenant's import
+CREATE INDEX idx_stg_revenue_import_tenant
+ON analytics.stg_revenue_import (tenant_id, status);
+
+-- Default tenant owning every artist not assigned elsewhere
+INSERT INTO whitelabel.tenant (tenant_id, tenant_name) VALUES (1, 'Default');
+SELECT setval('whitelabel.tenant_tenant_id_seq', 1);
+
 -- Insert labels from datauuid.csv
 INSERT INTO whitelabel.label (label_name) VALUES
 ('Abhi'),
@@ -232,6 +448,7 @@ INSERT INTO analytics.dim_geography (country_code, country_name, region) VALUES
 -- Create materialized views
 CREATE MATERIALIZED VIEW IF NOT EXISTS analytics.mv_revenue_overview AS
 SELECT
+    fr.period,
     fr.year,
     fr.month,
     COUNT(DISTINCT ws.artist_id) as active_artists,
@@ -250,18 +467,20 @@ JOIN whitelabel.song ws ON fr.song_id = ws.song_id
 JOIN analytics.platform_config pc ON fr.platform_id = pc.platform_id
 WHERE ws.status = 'Released'
 AND pc.is_active = true
-GROUP BY fr.year, fr.month;
+GROUP BY fr.period, fr.year, fr.month;
 
 CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_revenue_overview_unique 
-ON analytics.mv_revenue_overview(year, month);
+ON analytics.mv_revenue_overview(period);
 
 CREATE MATERIALIZED VIEW IF NOT EXISTS analytics.mv_artist_dashboard AS
 SELECT 
     fr.revenue_id,
+    wa.tenant_id,
     ws.artist_id,
     wa.artist_name,
     wl.label_id,
     wl.label_name,
+    fr.period,
     fr.year,
     fr.month,
     ws.isrc,
@@ -281,10 +500,20 @@ WHERE ws.status = 'Released';
 CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_artist_dashboard_unique 
 ON analytics.mv_artist_dashboard(revenue_id);
 
+CREATE INDEX IF NOT EXISTS idx_mv_artist_dashboard_artist 
+ON analytics.mv_artist_dashboard(artist_id, period);
+
+CREATE INDEX IF NOT EXISTS idx_mv_artist_dashboard_period 
+ON analytics.mv_artist_dashboard(period);
+
+CREATE INDEX IF NOT EXISTS idx_mv_artist_dashboard_tenant
+ON analytics.mv_artist_dashboard(tenant_id, period);
+
 CREATE MATERIALIZED VIEW IF NOT EXISTS analytics.mv_platform_analytics AS
 SELECT 
     pc.platform_name,
     pc.revenue_share_percentage,
+    fr.period,
     fr.year,
     fr.month,
     COUNT(DISTINCT ws.song_id) as unique_songs,
@@ -301,16 +530,18 @@ JOIN whitelabel.song ws ON fr.song_id = ws.song_id
 JOIN analytics.platform_config pc ON fr.platform_id = pc.platform_id
 WHERE ws.status = 'Released'
 AND pc.is_active = true
-GROUP BY pc.platform_name, pc.revenue_share_percentage, fr.year, fr.month;
+GROUP BY pc.platform_name, pc.revenue_share_percentage, fr.period, fr.year, fr.month;
 
 CREATE UNIQUE INDEX IF NOT EXISTS idx_mv_platform_analytics_unique 
-ON analytics.mv_platform_analytics(platform_name, year, month);
+ON analytics.mv_platform_analytics(period, platform_name);
 
 -- Artist Earnings View (Monthly earnings by artist)
 CREATE MATERIALIZED VIEW analytics.mv_artist_earnings AS
 SELECT 
+    fr.period,
     fr.year,
     fr.month,
+    wa.tenant_id,
     ws.artist_id,
     wa.artist_name,
     SUM(fr.total_plays) as total_plays,
@@ -324,14 +555,22 @@ JOIN whitelabel.song ws ON fr.song_id = ws.song_id
 JOIN whitelabel.artist wa ON ws.artist_id = wa.artist_id
 JOIN analytics.platform_config pc ON fr.platform_id = pc.platform_id
 WHERE ws.status = 'Released'
-GROUP BY fr.year, fr.month, ws.artist_id, wa.artist_name;
+GROUP BY fr.period, fr.year, fr.month, wa.tenant_id, ws.artist_id, wa.artist_name;
 
 CREATE UNIQUE INDEX idx_mv_artist_earnings_unique 
-ON analytics.mv_artist_earnings(year, month, artist_id);
+ON analytics.mv_artist_earnings(period, artist_id);
+
+-- Per-artist time series
+CREATE INDEX idx_mv_artist_earnings_artist
+ON analytics.mv_artist_earnings(artist_id, period);
+
+CREATE INDEX idx_mv_artist_earnings_tenant
+ON analytics.mv_artist_earnings(tenant_id, period);
 
 -- Platform Revenue View (Revenue breakdown by platform)
 CREATE MATERIALIZED VIEW analytics.mv_platform_revenue AS
 SELECT 
+    fr.period,
     fr.year,
     fr.month,
     pc.platform_name,
@@ -345,16 +584,22 @@ FROM analytics.fact_monthly_revenue fr
 JOIN whitelabel.song ws ON fr.song_id = ws.song_id
 JOIN analytics.platform_config pc ON fr.platform_id = pc.platform_id
 WHERE ws.status = 'Released'
-GROUP BY fr.year, fr.month, pc.platform_name, pc.revenue_share_percentage;
+GROUP BY fr.period, fr.year, fr.month, pc.platform_name, pc.revenue_share_percentage;
 
 CREATE UNIQUE INDEX idx_mv_platform_revenue_unique 
-ON analytics.mv_platform_revenue(year, month, platform_name);
+ON analytics.mv_platform_revenue(period, platform_name);
+
+-- Per-platform time series
+CREATE INDEX idx_mv_platform_revenue_platform
+ON analytics.mv_platform_revenue(platform_name, period);
 
 -- Artist Performance View (Song performance by artist)
 CREATE MATERIALIZED VIEW analytics.mv_artist_performance AS
 SELECT 
+    fr.period,
     fr.year,
     fr.month,
+    wa.tenant_id,
     ws.artist_id,
     wa.artist_name,
     ws.song_id,
@@ -369,14 +614,18 @@ JOIN whitelabel.song ws ON fr.song_id = ws.song_id
 JOIN whitelabel.artist wa ON ws.artist_id = wa.artist_id
 JOIN analytics.platform_config pc ON fr.platform_id = pc.platform_id
 WHERE ws.status = 'Released'
-GROUP BY fr.year, fr.month, ws.artist_id, wa.artist_name, ws.song_id, ws.title, ws.isrc;
+GROUP BY fr.period, fr.year, fr.month, wa.tenant_id, ws.artist_id, wa.artist_name, ws.song_id, ws.title, ws.isrc;
 
 CREATE UNIQUE INDEX idx_mv_artist_performance_unique 
-ON analytics.mv_artist_performance(year, month, song_id);
+ON analytics.mv_artist_performance(period, song_id);
+
+CREATE INDEX idx_mv_artist_performance_tenant
+ON analytics.mv_artist_performance(tenant_id, period);
 
 -- Label Performance View (Revenue by label)
 CREATE MATERIALIZED VIEW analytics.mv_label_performance AS
 SELECT 
+    fr.period,
     fr.year,
     fr.month,
     wl.label_id,
@@ -390,19 +639,30 @@ FROM analytics.fact_monthly_revenue fr
 JOIN whitelabel.song ws ON fr.song_id = ws.song_id
 JOIN whitelabel.label wl ON ws.label_id = wl.label_id
 WHERE ws.status = 'Released'
-GROUP BY fr.year, fr.month, wl.label_id, wl.label_name;
+GROUP BY fr.period, fr.year, fr.month, wl.label_id, wl.label_name;
 
 CREATE UNIQUE INDEX idx_mv_label_performance_unique 
-ON analytics.mv_label_performance(year, month, label_id);
+ON analytics.mv_label_performance(period, label_id);
+
+-- Per-label time series
+CREATE INDEX idx_mv_label_performance_label
+ON analytics.mv_label_performance(label_id, period);
+
+-- Keyset pagination order (scanned backwards for total_revenue DESC)
+CREATE INDEX idx_mv_label_performance_keyset
+ON analytics.mv_label_performance(period, total_revenue, label_id);
 
 -- Artist Platform Label Matrix (Cross-analysis)
 CREATE MATERIALIZED VIEW analytics.mv_artist_platform_label AS
 SELECT 
+    fr.period,
     fr.year,
     fr.month,
+    wa.tenant_id,
     wa.artist_id,
     wa.artist_name,
     pc.platform_name,
+    wl.label_id,
     wl.label_name,
     COUNT(DISTINCT ws.song_id) as unique_songs,
     SUM(fr.total_plays) as total_plays,
@@ -414,18 +674,28 @@ JOIN whitelabel.artist wa ON ws.artist_id = wa.artist_id
 JOIN whitelabel.label wl ON ws.label_id = wl.label_id
 JOIN analytics.platform_config pc ON fr.platform_id = pc.platform_id
 WHERE ws.status = 'Released'
-GROUP BY fr.year, fr.month, wa.artist_id, wa.artist_name, pc.platform_name, wl.label_name;
+GROUP BY fr.period, fr.year, fr.month, wa.tenant_id, wa.artist_id, wa.artist_name, pc.platform_name, wl.label_id, wl.label_name;
 
 CREATE UNIQUE INDEX idx_mv_artist_platform_label_unique 
-ON analytics.mv_artist_platform_label(year, month, artist_id, platform_name, label_name);
+ON analytics.mv_artist_platform_label(period, artist_id, platform_name, label_id);
+
+-- Keyset pagination order (scanned backwards for total_revenue DESC); text
+-- keys use the bytewise collation the router's keyset comparisons use
+CREATE INDEX idx_mv_artist_platform_label_keyset
+ON analytics.mv_artist_platform_label(period, total_revenue, artist_id, platform_name COLLATE "C", label_id);
+
+CREATE INDEX idx_mv_artist_platform_label_tenant
+ON analytics.mv_artist_platform_label(tenant_id, period, total_revenue);
 
 -- Geographic Analysis View
 CREATE MATERIALIZED VIEW analytics.mv_isrc_geo_platform AS
 SELECT 
+    fr.period,
     fr.year,
     fr.month,
     ws.isrc,
     ws.title as song_name,
+    wa.tenant_id,
     wa.artist_name,
     dg.country_code,
     dg.region,
@@ -439,60 +709,434 @@ JOIN whitelabel.artist wa ON ws.artist_id = wa.artist_id
 JOIN analytics.dim_geography dg ON fr.geography_id = dg.geography_id
 JOIN analytics.platform_config pc ON fr.platform_id = pc.platform_id
 WHERE ws.status = 'Released'
-GROUP BY fr.year, fr.month, ws.isrc, ws.title, wa.artist_name, dg.country_code, dg.region, pc.platform_name;
+GROUP BY fr.period, fr.year, fr.month, ws.isrc, ws.title, wa.tenant_id, wa.artist_name, dg.country_code, dg.region, pc.platform_name;
 
 CREATE UNIQUE INDEX idx_mv_isrc_geo_platform_unique 
-ON analytics.mv_isrc_geo_platform(year, month, isrc, country_code, platform_name);
+ON analytics.mv_isrc_geo_platform(period, isrc, country_code, platform_name);
+
+-- Per-song time series
+CREATE INDEX idx_mv_isrc_geo_platform_isrc
+ON analytics.mv_isrc_geo_platform(isrc, period);
+
+-- Keyset pagination order (scanned backwards for total_revenue DESC); text
+-- keys use the bytewise collation the router's keyset comparisons use
+CREATE INDEX idx_mv_isrc_geo_platform_keyset
+ON analytics.mv_isrc_geo_platform(
+    period, total_revenue, isrc COLLATE "C", country_code COLLATE "C", platform_name COLLATE "C"
+);
+
+CREATE INDEX idx_mv_isrc_geo_platform_tenant
+ON analytics.mv_isrc_geo_platform(tenant_id, period, total_revenue);
+
+-- Slice-and-dice rollup: one row per period and every combination of
+-- artist, label, platform and country (GROUP BY period, CUBE(...)).
+-- grouping_set is the GROUPING() bitmask of the rolled-up dimensions:
+-- 8 = artist, 4 = label, 2 = platform, 1 = country (15 = period totals).
+-- Maintained per period by analytics.refresh_revenue_rollup.
+CREATE TABLE analytics.revenue_rollup (
+    grouping_set SMALLINT NOT NULL,
+    period INT NOT NULL,
+    artist_id INT,
+    label_id INT,
+    platform_name VARCHAR(100),
+    country_code CHAR(2),
+    fact_rows BIGINT NOT NULL,
+    total_plays BIGINT NOT NULL,
+    total_revenue DECIMAL(18,6) NOT NULL,
+    total_royalties DECIMAL(18,6) NOT NULL
+);
+
+-- Rolled-up dimensions are NULL and matched with IS NULL, so every lookup
+-- is an index range on (grouping_set, period, ...)
+CREATE INDEX idx_revenue_rollup_lookup
+ON analytics.revenue_rollup(grouping_set, period, artist_id, label_id, platform_name, country_code)
+INCLUDE (fact_rows, total_plays, total_revenue, total_royalties);
 
--- Create ETL stored procedure
-CREATE OR REPLACE PROCEDURE analytics.process_revenue_import()
+-- Rebuild the rollup rows of p_from..p_to (every period when NULL).
+-- Rebuilds are serialized until commit: two imports rebuilding overlapping
+-- months concurrently would each insert them and double-count. Each
+-- statement of the rebuild that waited sees the other's committed facts.
+CREATE OR REPLACE PROCEDURE analytics.refresh_revenue_rollup(p_from INT DEFAULT NULL, p_to INT DEFAULT NULL)
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('analytics.revenue_rollup'));
+
+    DELETE FROM analytics.revenue_rollup
+    WHERE period BETWEEN COALESCE(p_from, 0) AND COALESCE(p_to, 999999);
+
+    INSERT INTO analytics.revenue_rollup (
+        grouping_set, period, artist_id, label_id, platform_name, country_code,
+        fact_rows, total_plays, total_revenue, total_royalties
+    )
+    SELECT
+        GROUPING(fr.artist_id, s.label_id, p.platform_name, g.country_code),
+        fr.period,
+        fr.artist_id,
+        s.label_id,
+        p.platform_name,
+        g.country_code,
+        COUNT(*),
+        SUM(fr.total_plays),
+        SUM(fr.revenue_amount),
+        SUM(fr.royalty_amount)
+    FROM analytics.fact_monthly_revenue fr
+    JOIN whitelabel.song s ON fr.song_id = s.song_id
+    JOIN analytics.platform_config p ON fr.platform_id = p.platform_id
+    LEFT JOIN analytics.dim_geography g ON fr.geography_id = g.geography_id
+    WHERE fr.period BETWEEN COALESCE(p_from, 0) AND COALESCE(p_to, 999999)
+    GROUP BY fr.period, CUBE(fr.artist_id, s.label_id, p.platform_name, g.country_code);
+
+    INSERT INTO analytics.refresh_log (relation_name, refreshed_at)
+    VALUES ('revenue_rollup', now())
+    ON CONFLICT (relation_name) DO UPDATE SET refreshed_at = EXCLUDED.refreshed_at;
+END;
+$$;
+
+-- HyperLogLog distinct-count sketches (precision 12: 4096 one-byte registers,
+-- ~1.6% standard error). Each register holds the highest rank seen for the
+-- values hashed into it; sketches merge by taking the register-wise maximum,
+-- so counts over any set of periods are merged and estimated by the API.
+CREATE OR REPLACE FUNCTION analytics.hll_hash(value TEXT)
+RETURNS BIGINT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT hashtextextended(value, 0);
+$$;
+
+-- Register index: the low 12 bits of the hash
+CREATE OR REPLACE FUNCTION analytics.hll_register(h BIGINT)
+RETURNS INT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT (h & 4095)::int;
+$$;
+
+-- Rank: position of the first 1 bit in the remaining 52 bits (53 if none)
+CREATE OR REPLACE FUNCTION analytics.hll_rank(h BIGINT)
+RETURNS INT
+LANGUAGE sql IMMUTABLE PARALLEL SAFE AS $$
+    SELECT 53 - length(ltrim(((h >> 12)::bit(52))::text, '0'));
+$$;
+
+CREATE OR REPLACE FUNCTION analytics.hll_set(state BYTEA, register INT, rank INT)
+RETURNS BYTEA
+LANGUAGE plpgsql IMMUTABLE AS $$
+BEGIN
+    IF state IS NULL THEN
+        state := decode(repeat('00', 4096), 'hex');
+    END IF;
+    IF rank > get_byte(state, register) THEN
+        state := set_byte(state, register, rank);
+    END IF;
+    RETURN state;
+END;
+$$;
+
+-- Build a sketch from (register, rank) pairs, best pre-reduced with MAX(rank)
+CREATE AGGREGATE analytics.hll_build(INT, INT) (
+    SFUNC = analytics.hll_set,
+    STYPE = BYTEA
+);
+
+-- One sketch per period, dimension value and counted entity:
+-- dimension 'all' (value ''), 'platform' (platform_name) or 'label' (label_id);
+-- metric 'artists' or 'songs'
+CREATE TABLE analytics.distinct_sketch (
+    dimension VARCHAR(20) NOT NULL,
+    dimension_value TEXT NOT NULL,
+    metric VARCHAR(20) NOT NULL,
+    period INT NOT NULL,
+    registers BYTEA NOT NULL,
+    PRIMARY KEY (dimension, dimension_value, metric, period)
+);
+
+-- Rebuild the sketches of p_from..p_to (every period when NULL), serialized
+-- like refresh_revenue_rollup: concurrent rebuilds of a month would both
+-- insert its sketches and violate the primary key
+CREATE OR REPLACE PROCEDURE analytics.refresh_distinct_sketches(p_from INT DEFAULT NULL, p_to INT DEFAULT NULL)
+LANGUAGE plpgsql AS $$
+BEGIN
+    PERFORM pg_advisory_xact_lock(hashtext('analytics.distinct_sketch'));
+
+    DELETE FROM analytics.distinct_sketch
+    WHERE period BETWEEN COALESCE(p_from, 0) AND COALESCE(p_to, 999999);
+
+    INSERT INTO analytics.distinct_sketch (dimension, dimension_value, metric, period, registers)
+    SELECT dimension, dimension_value, metric, period, analytics.hll_build(register, rank)
+    FROM (
+        SELECT
+            d.dimension,
+            d.dimension_value,
+            m.metric,
+            fr.period,
+            analytics.hll_register(analytics.hll_hash(m.value)) AS register,
+            MAX(analytics.hll_rank(analytics.hll_hash(m.value))) AS rank
+        FROM analytics.fact_monthly_revenue fr
+        JOIN whitelabel.song s ON fr.song_id = s.song_id
+        JOIN analytics.platform_config p ON fr.platform_id = p.platform_id
+        CROSS JOIN LATERAL (VALUES
+            ('all', ''),
+            ('platform', p.platform_name::text),
+            ('label', s.label_id::text)
+        ) d(dimension, dimension_value)
+        CROSS JOIN LATERAL (VALUES
+            ('artists', fr.artist_id::text),
+            ('songs', fr.song_id::text)
+        ) m(metric, value)
+        WHERE fr.period BETWEEN COALESCE(p_from, 0) AND COALESCE(p_to, 999999)
+        GROUP BY 1, 2, 3, 4, 5
+    ) registers
+    GROUP BY dimension, dimension_value, metric, period;
+END;
+$$;
+
+-- Payout ledger: a ROYALTY entry per artist and import batch (credited), a
+-- PAYOUT entry per payment (debited, negative) and a REVERSAL entry per
+-- artist when a dropped partition takes credited royalties away (negative),
+-- each with the artist's balance after it
+CREATE TABLE analytics.payout_ledger (
+    entry_id BIGSERIAL PRIMARY KEY,
+    artist_id INT NOT NULL REFERENCES whitelabel.artist(artist_id),
+    entry_type VARCHAR(10) NOT NULL CHECK (entry_type IN ('ROYALTY', 'PAYOUT', 'REVERSAL')),
+    amount DECIMAL(18,6) NOT NULL,
+    balance_after DECIMAL(18,6) NOT NULL,
+    -- Periods covered by a ROYALTY or REVERSAL entry
+    first_period INT,
+    last_period INT,
+    reference TEXT,
+    created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX idx_payout_ledger_artist ON analytics.payout_ledger (artist_id, entry_id);
+
+-- Carried-forward balance per artist, updated with every ledger entry. The
+-- artist's payment_threshold is copied here so that artists due a payout are
+-- a range of a small partial index instead of a full-history aggregation.
+CREATE TABLE analytics.payout_balance (
+    artist_id INT PRIMARY KEY REFERENCES whitelabel.artist(artist_id),
+    tenant_id INT NOT NULL,
+    balance DECIMAL(18,6) NOT NULL DEFAULT 0,
+    earned DECIMAL(18,6) NOT NULL DEFAULT 0,
+    paid DECIMAL(18,6) NOT NULL DEFAULT 0,
+    payment_threshold DECIMAL(15,6),
+    last_period INT,
+    updated_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX idx_payout_balance_due ON analytics.payout_balance (tenant_id, balance DESC)
+WHERE balance >= payment_threshold;
+
+-- Credit the royalties of processed staged rows to their artists' balances
+CREATE OR REPLACE PROCEDURE analytics.post_royalties(p_ids TEXT[])
+LANGUAGE plpgsql AS $$
+BEGIN
+    WITH credits AS (
+        SELECT
+            s.userid AS artist_id,
+            SUM(s.royalty) AS amount,
+            MIN(analytics.to_period(s.month)) AS first_period,
+            MAX(analytics.to_period(s.month)) AS last_period
+        FROM analytics.stg_revenue_import s
+        WHERE s.id = ANY(p_ids)
+        GROUP BY s.userid
+    ),
+    balances AS (
+        INSERT INTO analytics.payout_balance AS b (
+            artist_id, tenant_id, balance, earned, payment_threshold, last_period, updated_at
+        )
+        SELECT c.artist_id, a.tenant_id, c.amount, c.amount, a.payment_threshold, c.last_period, now()
+        FROM credits c
+        JOIN whitelabel.artist a ON c.artist_id = a.artist_id
+        ON CONFLICT (artist_id) DO UPDATE
+        SET balance = b.balance + EXCLUDED.balance,
+            earned = b.earned + EXCLUDED.earned,
+            last_period = GREATEST(b.last_period, EXCLUDED.last_period),
+            updated_at = EXCLUDED.updated_at
+        RETURNING b.artist_id, b.balance
+    )
+    INSERT INTO analytics.payout_ledger (artist_id, entry_type, amount, balance_after, first_period, last_period)
+    SELECT c.artist_id, 'ROYALTY', c.amount, b.balance, c.first_period, c.last_period
+    FROM credits c
+    JOIN balances b ON c.artist_id = b.artist_id;
+END;
+$$;
+
+-- Debit a payout; the balance row lock serializes concurrent payouts
+CREATE OR REPLACE PROCEDURE analytics.record_payout(p_artist_id INT, p_amount DECIMAL, p_reference TEXT DEFAULT NULL)
+LANGUAGE plpgsql AS $$
+DECLARE
+    new_balance DECIMAL(18,6);
+BEGIN
+    IF p_amount <= 0 THEN
+        RAISE EXCEPTION 'Payout amount must be positive';
+    END IF;
+
+    UPDATE analytics.payout_balance
+    SET balance = balance - p_amount,
+        paid = paid + p_amount,
+        updated_at = now()
+    WHERE artist_id = p_artist_id
+    AND balance >= p_amount
+    RETURNING balance INTO new_balance;
+
+    IF new_balance IS NULL THEN
+        RAISE EXCEPTION 'Payout of % exceeds the balance of artist %', p_amount, p_artist_id;
+    END IF;
+
+    INSERT INTO analytics.payout_ledger (artist_id, entry_type, amount, balance_after, reference)
+    VALUES (p_artist_id, 'PAYOUT', -p_amount, new_balance, p_reference);
+END;
+$$;
+
+-- Rebuild every balance from the attached facts and the recorded payouts
+-- (backfill for data loaded before the ledger existed)
+CREATE OR REPLACE PROCEDURE analytics.rebuild_payout_balances()
+LANGUAGE plpgsql AS $$
+BEGIN
+    DELETE FROM analytics.payout_balance;
+
+    INSERT INTO analytics.payout_balance (
+        artist_id, tenant_id, balance, earned, paid, payment_threshold, last_period, updated_at
+    )
+    SELECT
+        a.artist_id,
+        a.tenant_id,
+        COALESCE(f.earned, 0) - COALESCE(p.paid, 0),
+        COALESCE(f.earned, 0),
+        COALESCE(p.paid, 0),
+        a.payment_threshold,
+        f.last_period,
+        now()
+    FROM whitelabel.artist a
+    LEFT JOIN (
+        SELECT artist_id, SUM(royalty_amount) AS earned, MAX(period) AS last_period
+        FROM analytics.fact_monthly_revenue
+        GROUP BY artist_id
+    ) f ON a.artist_id = f.artist_id
+    LEFT JOIN (
+        SELECT artist_id, -SUM(amount) AS paid
+        FROM analytics.payout_ledger
+        WHERE entry_type = 'PAYOUT'
+        GROUP BY artist_id
+    ) p ON a.artist_id = p.artist_id
+    WHERE f.artist_id IS NOT NULL OR p.artist_id IS NOT NULL;
+END;
+$$;
+
+-- Keep the copied threshold and tenant in step with the artist
+CREATE OR REPLACE FUNCTION analytics.sync_payout_artist()
+RETURNS TRIGGER
+LANGUAGE plpgsql AS $$
+BEGIN
+    UPDATE analytics.payout_balance
+    SET payment_threshold = NEW.payment_threshold,
+        tenant_id = NEW.tenant_id
+    WHERE artist_id = NEW.artist_id;
+    RETURN NEW;
+END;
+$$;
+
+CREATE TRIGGER trg_artist_payout_sync
+AFTER UPDATE OF payment_threshold, tenant_id ON whitelabel.artist
+FOR EACH ROW EXECUTE FUNCTION analytics.sync_payout_artist();
+
+-- All views are built together with the (empty) fact table
+INSERT INTO analytics.refresh_log (relation_name, refreshed_at)
+SELECT relation_name, CURRENT_TIMESTAMP
+FROM unnest(ARRAY[
+    'fact_monthly_revenue',
+    'revenue_rollup',
+    'mv_revenue_overview',
+    'mv_artist_dashboard',
+    'mv_platform_analytics',
+    'mv_artist_earnings',
+    'mv_platform_revenue',
+    'mv_artist_performance',
+    'mv_label_performance',
+    'mv_artist_platform_label',
+    'mv_isrc_geo_platform'
+]) AS relation_name;
+
+-- Create ETL stored procedure; with p_tenant_id only that tenant's pending rows are processed
+CREATE OR REPLACE PROCEDURE analytics.process_revenue_import(p_tenant_id INT DEFAULT NULL)
 LANGUAGE plpgsql AS $$
 DECLARE
     processed_ids TEXT[];
     existing_record RECORD;
+    min_period INT;
+    max_period INT;
 BEGIN
+    -- Rows staged without a tenant belong to their artist's
+    UPDATE analytics.stg_revenue_import staging
+    SET tenant_id = artist.tenant_id
+    FROM whitelabel.artist artist
+    WHERE staging.status = 'PENDING'
+    AND staging.tenant_id IS NULL
+    AND artist.artist_id = staging.userid;
+
+    -- Rows whose artist is unknown have no tenant to be processed under, and
+    -- would stay pending through every tenant's import: fail them now
+    UPDATE analytics.stg_revenue_import
+    SET status = 'FAILED',
+        error_message = 'Invalid artist ID'
+    WHERE status = 'PENDING'
+    AND tenant_id IS NULL;
+
+    -- Make sure partitions exist for the incoming months, plus one ahead
+    SELECT MIN(analytics.to_period(month)), MAX(analytics.to_period(month))
+    INTO min_period, max_period
+    FROM analytics.stg_revenue_import
+    WHERE status = 'PENDING'
+    AND (p_tenant_id IS NULL OR tenant_id = p_tenant_id);
+
+    IF min_period IS NOT NULL THEN
+        CALL analytics.ensure_fact_partitions(min_period, analytics.next_period(max_period));
+    END IF;
+
     -- Mark duplicates as 'SKIPPED'
     UPDATE analytics.stg_revenue_import staging
     SET status = 'SKIPPED',
         error_message = 'Record already exists for this month/isrc/country/service'
     WHERE status = 'PENDING'
+    AND (p_tenant_id IS NULL OR tenant_id = p_tenant_id)
     AND EXISTS (
         SELECT 1 
         FROM analytics.fact_monthly_revenue fact
         JOIN whitelabel.song songs ON fact.song_id = songs.song_id
         JOIN analytics.platform_config platform ON fact.platform_id = platform.platform_id
         WHERE songs.isrc = staging.isrc 
-        AND EXTRACT(YEAR FROM staging.month)::int = fact.year
-        AND TO_CHAR(staging.month, 'Mon') = fact.month
+        AND fact.period = analytics.to_period(staging.month)
         AND platform.platform_name = staging.service
     );
 
         -- Transform and load non-duplicate records
     WITH staging_data AS (
-        SELECT s.id, s.month, s.isrc, s.service, s.userid, s.total, s.royalty,
+        SELECT s.id, s.month, s.isrc, s.service, s.userid, s.tenant_id, s.total, s.royalty,
                songs.song_id, platform.platform_id, platform.revenue_share_percentage,
                geo.geography_id
         FROM analytics.stg_revenue_import s
         JOIN whitelabel.song songs ON s.isrc = songs.isrc
+        -- A tenant can only import revenue of its own artists
+        JOIN whitelabel.artist artist ON s.userid = artist.artist_id
+            AND s.tenant_id = artist.tenant_id
         JOIN analytics.platform_config platform ON s.service = platform.platform_name
             AND s.month >= platform.effective_from
             AND (platform.effective_to IS NULL OR s.month <= platform.effective_to)
         LEFT JOIN analytics.dim_geography geo ON s.country = geo.country_code
         WHERE s.status = 'PENDING'
+        AND (p_tenant_id IS NULL OR s.tenant_id = p_tenant_id)
         AND songs.status = 'Released'
         AND platform.is_active = true
     ),
     inserted_records AS (
         INSERT INTO analytics.fact_monthly_revenue (
-            year, month, song_id, platform_id, artist_id,
+            period, song_id, platform_id, artist_id, tenant_id,
             total_plays, revenue_amount, royalty_amount, geography_id
         )
         SELECT 
-            EXTRACT(YEAR FROM month)::int as year,
-            TO_CHAR(month, 'Mon') as month,
+            analytics.to_period(month) as period,
             song_id,
             platform_id,
             userid as artist_id,
+            tenant_id,
             total::int as total_plays,
             (royalty * 100.0 / revenue_share_percentage) as revenue_amount,
             royalty as royalty_amount,
@@ -526,24 +1170,48 @@ BEGIN
                 SELECT 1 FROM whitelabel.artist artist 
                 WHERE artist.artist_id = stg_revenue_import.userid
             ) THEN 'Invalid artist ID'
+            WHEN NOT EXISTS (
+                SELECT 1 FROM whitelabel.artist artist
+                WHERE artist.artist_id = stg_revenue_import.userid
+                AND artist.tenant_id = stg_revenue_import.tenant_id
+            ) THEN 'Artist belongs to another tenant'
             ELSE 'Song not released'
         END
-    WHERE status = 'PENDING';
+    WHERE status = 'PENDING'
+    AND (p_tenant_id IS NULL OR tenant_id = p_tenant_id);
 
-    -- Refresh materialized views only if we processed any records
+    -- Publish the batch only if we processed any records
     IF processed_ids IS NOT NULL THEN
-        -- Core views (required)
-        REFRESH MATERIALIZED VIEW analytics.mv_revenue_overview;
-        REFRESH MATERIALIZED VIEW analytics.mv_artist_dashboard;
-        REFRESH MATERIALIZED VIEW analytics.mv_platform_analytics;
-
-        -- Additional analytics views
-        REFRESH MATERIALIZED VIEW analytics.mv_artist_earnings;
-        REFRESH MATERIALIZED VIEW analytics.mv_platform_revenue;
-        REFRESH MATERIALIZED VIEW analytics.mv_artist_performance;
-        REFRESH MATERIALIZED VIEW analytics.mv_label_performance;
-        REFRESH MATERIALIZED VIEW analytics.mv_artist_platform_label;
-        REFRESH MATERIALIZED VIEW analytics.mv_isrc_geo_platform;
+        -- Carry the batch's royalties forward into the payout balances
+        CALL analytics.post_royalties(processed_ids);
+
+        -- Invalidate cached API responses for the imported months and tenants
+        CALL analytics.bump_data_generation(
+            ARRAY(
+                SELECT DISTINCT analytics.to_period(month)
+                FROM analytics.stg_revenue_import
+                WHERE id = ANY(processed_ids)
+            ),
+            ARRAY(
+                SELECT DISTINCT tenant_id
+                FROM analytics.stg_revenue_import
+                WHERE id = ANY(processed_ids)
+            )
+        );
+
+        -- Record the load so views refreshed before it are treated as stale
+        INSERT INTO analytics.refresh_log (relation_name, refreshed_at)
+        VALUES ('fact_monthly_revenue', now())
+        ON CONFLICT (relation_name) DO UPDATE SET refreshed_at = EXCLUDED.refreshed_at;
+
+        -- Incrementally rebuild the rollup and sketches for the imported months
+        -- only; both wait for a concurrent import's rebuild to commit
+        CALL analytics.refresh_revenue_rollup(min_period, max_period);
+        CALL analytics.refresh_distinct_sketches(min_period, max_period);
+
+        -- The materialized views are refreshed by the caller once this
+        -- commits (DataImport.refresh_materialized_views, CONCURRENTLY and
+        -- timed per view); until then refresh_log marks them stale
     END IF;
 END;
 $$;
@@ -0,0 +1,30 @@
+"""
+Generate the monthly royalty statement of every artist
+
+Writes one file per artist with revenue in the month (lines by song,
+platform and country, plus totals) under STATEMENT_DIR/<period>, rendered
+on a process pool from a single sorted query.
+
+Usage:
+    python generate_statements.py 2024-06 [--format csv|json] [--tenant 2] [--workers 8]
+"""
+import argparse
+import json
+from app.crud.periods import parse_period
+from app.crud.statements import Statements, STATEMENT_FORMATS
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[1])
+    parser.add_argument("period", help="Statement month (YYYY-MM)")
+    parser.add_argument("--format", choices=STATEMENT_FORMATS, default="csv")
+    parser.add_argument("--tenant", type=int, default=None, help="Only this tenant's artists")
+    parser.add_argument("--workers", type=int, default=None, help="Rendering processes (STATEMENT_WORKERS)")
+    args = parser.parse_args()
+
+    summary = Statements.generate(parse_period(args.period), args.format, args.tenant, args.workers)
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,250 @@
+"""
+Response cache tests
+
+Run without a database or redis: the generation listener is replaced by a
+hand-set generation table and responses are encoded by a stub, so the
+tests cover cache keys, generation invalidation, ETag revalidation and
+LRU eviction only.
+"""
+import pytest
+from starlette.requests import Request
+from app.crud import cache
+from app.crud.cache import Generations, LRUCache, ResponseCache, cached, dependent_periods, etag, etag_matches
+from app.api.endpoints import time_series_lookback
+from app.models.base import ResponseModel
+
+
+@pytest.fixture
+def generations(monkeypatch):
+    """A live listener whose generations the test sets by hand"""
+    table = {}
+    monkeypatch.setattr(Generations, "_generations", table)
+    monkeypatch.setattr(Generations, "_live", True)
+    monkeypatch.setattr(Generations, "_started", True)
+    return table
+
+
+@pytest.fixture
+def encoded(monkeypatch):
+    """Stub encoder recording the responses it encodes"""
+    calls = []
+
+    def encode(response):
+        calls.append(response)
+        return f'{{"message":"{response.message}"}}'.encode()
+
+    monkeypatch.setattr(cache, "encode_response", encode)
+    monkeypatch.setattr(cache, "CACHE_ENABLED", True)
+    monkeypatch.setattr(ResponseCache, "local", LRUCache(16))
+    monkeypatch.setattr(ResponseCache, "shared", None)
+    return calls
+
+
+def bump(table, tenant_id=0, *periods):
+    """Bump generations like analytics.bump_data_generation, global period included"""
+    for period in periods + (0,):
+        table[(tenant_id, period)] = table.get((tenant_id, period), 0) + 1
+
+
+def request(if_none_match=None) -> Request:
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "path": "/", "headers": headers})
+
+
+@pytest.fixture
+def endpoint(generations, encoded):
+    """A cached endpoint counting how often it really runs"""
+    calls = []
+
+    @cached("test_endpoint")
+    def get_revenue(period_from=None, period_to=None, tenant_id=None):
+        calls.append((period_from, period_to, tenant_id))
+        return ResponseModel(success=True, message=f"run {len(calls)}")
+
+    get_revenue.calls = calls
+    return get_revenue
+
+
+def test_key_ignores_parameter_order_and_unset_parameters(generations):
+    first = ResponseCache.key("revenue", {"period_from": "2024-01", "period_to": "2024-03", "artist_id": None})
+    second = ResponseCache.key("revenue", {"period_to": "2024-03", "period_from": "2024-01"})
+    assert first == second
+
+
+def test_key_depends_on_endpoint_values_and_tenant(generations):
+    params = {"period_from": "2024-01", "period_to": "2024-03"}
+    key = ResponseCache.key("revenue", params)
+    assert ResponseCache.key("royalties", params) != key
+    assert ResponseCache.key("revenue", {**params, "period_to": "2024-04"}) != key
+    assert ResponseCache.key("revenue", {**params, "tenant_id": 7}) != key
+
+
+def test_key_changes_only_with_dependent_generations(generations):
+    params = {"period_from": "2024-01", "period_to": "2024-03"}
+    key = ResponseCache.key("revenue", params)
+
+    bump(generations, 0, 202406)
+    assert ResponseCache.key("revenue", params) == key
+
+    bump(generations, 0, 202402)
+    assert ResponseCache.key("revenue", params) != key
+
+
+def test_key_without_periods_uses_the_global_generation(generations):
+    key = ResponseCache.key("revenue", {})
+    bump(generations, 0, 202406)
+    assert ResponseCache.key("revenue", {}) != key
+
+
+def test_tenant_key_ignores_other_tenants_imports(generations):
+    params = {"period_from": "2024-01", "period_to": "2024-03", "tenant_id": 7}
+    key = ResponseCache.key("revenue", params)
+
+    bump(generations, 8, 202402)
+    assert ResponseCache.key("revenue", params) == key
+
+    bump(generations, 7, 202402)
+    assert ResponseCache.key("revenue", params) != key
+
+
+def test_lookback_extends_dependent_periods():
+    params = {"period_from": "2024-03", "period_to": "2024-04"}
+    assert dependent_periods(params) == (202403, 202404)
+    assert dependent_periods(params, 1) == (202402, 202403, 202404)
+    assert dependent_periods(params, 3) == (202312, 202401, 202402, 202403, 202404)
+
+
+@pytest.mark.parametrize("deltas,rolling,lookback", [
+    (False, None, 0),
+    (True, None, 1),
+    (False, 3, 2),
+    (True, 6, 5)
+])
+def test_time_series_lookback(deltas, rolling, lookback):
+    assert time_series_lookback({"deltas": deltas, "rolling": rolling}) == lookback
+
+
+def test_time_series_key_changes_with_months_before_the_range(generations, encoded):
+    calls = []
+
+    @cached("series", lookback=time_series_lookback)
+    def get_series(period_from=None, period_to=None, deltas=False, rolling=None, tenant_id=None):
+        calls.append(1)
+        return ResponseModel(success=True, message=f"run {len(calls)}")
+
+    params = {"period_from": "2024-03", "period_to": "2024-04", "rolling": 3}
+    tag = get_series(request(), **params).headers["etag"]
+
+    # Two months before `from` feed the first rolling sum
+    bump(generations, 0, 202401)
+    response = get_series(request(tag), **params)
+    assert response.status_code == 200 and response.headers["etag"] != tag
+    assert len(calls) == 2
+
+    # Earlier months do not
+    tag = response.headers["etag"]
+    bump(generations, 0, 202312)
+    assert get_series(request(tag), **params).status_code == 304
+    assert len(calls) == 2
+
+
+def test_cached_endpoint_runs_once_per_generation(endpoint, generations, encoded):
+    first = endpoint(request(), period_from="2024-01", period_to="2024-03")
+    second = endpoint(request(), period_from="2024-01", period_to="2024-03")
+    assert len(endpoint.calls) == 1
+    assert len(encoded) == 1
+    assert first.body == second.body == b'{"message":"run 1"}'
+
+    bump(generations, 0, 202401)
+    third = endpoint(request(), period_from="2024-01", period_to="2024-03")
+    assert len(endpoint.calls) == 2
+    assert third.body == b'{"message":"run 2"}'
+
+
+def test_failed_response_is_not_cached_or_tagged(generations, encoded):
+    calls = []
+
+    @cached("failing")
+    def get_revenue(period_from=None, period_to=None, tenant_id=None):
+        calls.append(1)
+        return ResponseModel(success=len(calls) > 1, message=f"run {len(calls)}")
+
+    failed = get_revenue(request(), period_from="2024-01", period_to="2024-03")
+    assert failed.body == b'{"message":"run 1"}'
+    assert "etag" not in failed.headers
+
+    retried = get_revenue(request(), period_from="2024-01", period_to="2024-03")
+    assert retried.body == b'{"message":"run 2"}'
+    assert "etag" in retried.headers
+    assert get_revenue(request(), period_from="2024-01", period_to="2024-03").body == retried.body
+    assert len(calls) == 2
+
+
+def test_matching_etag_is_answered_with_304_without_running(endpoint):
+    response = endpoint(request(), period_from="2024-01", period_to="2024-03")
+    tag = response.headers["etag"]
+    assert tag.startswith('W/"')
+
+    revalidated = endpoint(request(tag), period_from="2024-01", period_to="2024-03")
+    assert revalidated.status_code == 304
+    assert revalidated.headers["etag"] == tag
+    assert revalidated.body == b""
+    assert len(endpoint.calls) == 1
+
+
+def test_etag_changes_with_the_generation(endpoint, generations):
+    tag = endpoint(request(), period_from="2024-01", period_to="2024-03").headers["etag"]
+    bump(generations, 0, 202403)
+
+    response = endpoint(request(tag), period_from="2024-01", period_to="2024-03")
+    assert response.status_code == 200
+    assert response.headers["etag"] != tag
+    assert len(endpoint.calls) == 2
+
+
+def test_listener_down_bypasses_cache_and_etags(endpoint, monkeypatch):
+    monkeypatch.setattr(Generations, "_live", False)
+    for _ in range(2):
+        response = endpoint(request('W/"anything"'), period_from="2024-01", period_to="2024-03")
+        assert response.status_code == 200
+        assert "etag" not in response.headers
+    assert len(endpoint.calls) == 2
+
+
+@pytest.mark.parametrize("header,expected", [
+    (None, False),
+    ('W/"abc"', True),
+    ('"abc"', True),
+    ('W/"xyz", W/"abc"', True),
+    ("*", True),
+    ('W/"xyz"', False)
+])
+def test_etag_matching(header, expected):
+    assert etag_matches(header, 'W/"abc"') is expected
+
+
+def test_etag_is_stable_per_key():
+    assert etag("a") == etag("a")
+    assert etag("a") != etag("b")
+
+
+def test_lru_evicts_least_recently_used():
+    lru = LRUCache(2)
+    lru.set("a", b"1")
+    lru.set("b", b"2")
+    assert lru.get("a") == b"1"
+    lru.set("c", b"3")
+    assert lru.get("b") is None
+    assert lru.get("a") == b"1"
+    assert lru.get("c") == b"3"
+    assert len(lru.entries) == 2
+
+
+def test_lru_overwrite_refreshes_entry():
+    lru = LRUCache(2)
+    lru.set("a", b"1")
+    lru.set("b", b"2")
+    lru.set("a", b"3")
+    lru.set("c", b"4")
+    assert lru.get("a") == b"3"
+    assert lru.get("b") is None
@@ -80,6 +80,11 @@ def test_revenue_import():
             for view, success in result['view_refresh'].items():
                 status = "✓" if success else "✗"
                 print(f"{status} {view}")
+
+        if 'telemetry' in result:
+            print(f"\nStage Telemetry (job {result['job_id']}):")
+            for stage in result['telemetry']:
+                print(f"  {stage['stage']}: {stage['seconds']}s, {stage['rows_per_sec']} rows/s, {stage['peak_mb']} MB")
                 
         return result['success']
                 
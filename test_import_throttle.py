@@ -0,0 +1,191 @@
+"""
+ImportThrottle and ImportTelemetry tests
+
+Run without a database: imports are stood in for by threads holding a
+slot, with IMPORT_WAIT cut to a fraction of a second.
+"""
+import threading
+import time
+import tracemalloc
+import pytest
+from fastapi import HTTPException
+from app.crud import data_import, telemetry
+from app.crud.csv_import import CSVImport
+from app.crud.data_import import ImportThrottle, ImportThrottled
+from app.crud.telemetry import ImportTelemetry
+from app.api.import_endpoints import import_revenue_from_path
+
+WAIT = 0.1
+TIMEOUT = 5.0
+
+
+@pytest.fixture(autouse=True)
+def throttle(monkeypatch):
+    """One import per tenant, two overall, and a short wait"""
+    monkeypatch.setattr(data_import, "IMPORT_WAIT", WAIT)
+    monkeypatch.setattr(data_import, "TENANT_IMPORT_CONCURRENCY", 1)
+    monkeypatch.setattr(data_import, "IMPORT_CONCURRENCY", 2)
+    monkeypatch.setattr(ImportThrottle, "_tenants", {})
+    monkeypatch.setattr(ImportThrottle, "_all", threading.BoundedSemaphore(2))
+
+
+class Holder:
+    """A thread holding a tenant's import slot until released"""
+
+    def __init__(self, tenant_id):
+        self.acquired = threading.Event()
+        self.release = threading.Event()
+        self.thread = threading.Thread(target=self._run, args=(tenant_id,))
+        self.thread.start()
+        assert self.acquired.wait(TIMEOUT)
+
+    def _run(self, tenant_id):
+        with ImportThrottle.slot(tenant_id):
+            self.acquired.set()
+            self.release.wait(TIMEOUT)
+
+    def stop(self):
+        self.release.set()
+        self.thread.join(TIMEOUT)
+
+
+def test_tenant_slot_blocks_the_same_tenant_only():
+    holder = Holder(1)
+    try:
+        started = time.perf_counter()
+        with pytest.raises(ImportThrottled, match="Tenant 1"):
+            with ImportThrottle.slot(1):
+                pass
+        assert time.perf_counter() - started >= WAIT * 0.9
+
+        with ImportThrottle.slot(2):
+            pass
+    finally:
+        holder.stop()
+
+    with ImportThrottle.slot(1):
+        pass
+
+
+def test_queued_import_gets_the_slot_when_it_frees(monkeypatch):
+    monkeypatch.setattr(data_import, "IMPORT_WAIT", TIMEOUT)
+    holder = Holder(1)
+    entered = threading.Event()
+
+    def queued():
+        with ImportThrottle.slot(1):
+            entered.set()
+
+    thread = threading.Thread(target=queued)
+    thread.start()
+    assert not entered.wait(WAIT)
+    holder.stop()
+    assert entered.wait(TIMEOUT)
+    thread.join(TIMEOUT)
+
+
+def test_global_slots_cap_all_tenants():
+    holders = [Holder(1), Holder(2)]
+    try:
+        with pytest.raises(ImportThrottled, match="2 imports are already running"):
+            with ImportThrottle.slot(3):
+                pass
+        # The tenant slot taken while waiting for a global one was given back
+        assert ImportThrottle._tenants[3].acquire(blocking=False)
+        ImportThrottle._tenants[3].release()
+    finally:
+        for holder in holders:
+            holder.stop()
+
+    with ImportThrottle.slot(3):
+        pass
+
+
+def test_imports_without_tenant_share_one_slot():
+    holder = Holder(None)
+    try:
+        with pytest.raises(ImportThrottled, match="Tenant None"):
+            with ImportThrottle.slot(None):
+                pass
+    finally:
+        holder.stop()
+
+
+def test_slots_are_released_when_the_import_fails():
+    with pytest.raises(RuntimeError):
+        with ImportThrottle.slot(1):
+            raise RuntimeError("ETL failed")
+    with ImportThrottle.slot(1):
+        pass
+    assert ImportThrottle._all.acquire(blocking=False) and ImportThrottle._all.acquire(blocking=False)
+    ImportThrottle._all.release()
+    ImportThrottle._all.release()
+
+
+def test_throttled_import_is_answered_with_429(monkeypatch):
+    def no_database():
+        raise ConnectionError("no database in unit tests")
+
+    # Stay off the database: no file to read, and import history is only kept in memory
+    monkeypatch.setattr(CSVImport, "read_revenue_csv", staticmethod(lambda file_path: [{"isrc": "X"}]))
+    monkeypatch.setattr(telemetry, "get_db", no_database)
+
+    holder = Holder(1)
+    try:
+        with pytest.raises(HTTPException) as raised:
+            import_revenue_from_path("throttled.csv", 1)
+        result = CSVImport.import_revenue_from_csv("throttled.csv", 1)
+    finally:
+        holder.stop()
+
+    assert raised.value.status_code == 429
+    assert "Tenant 1" in raised.value.detail
+    assert result["throttled"] and not result["success"]
+    assert [stage["stage"] for stage in result["telemetry"]] == ["parse", "wait"]
+    assert result["telemetry"][1]["seconds"] >= WAIT * 0.9
+    assert ImportTelemetry.job(result["job_id"])["status"] == "THROTTLED"
+
+
+@pytest.fixture
+def traced(monkeypatch):
+    """Memory traced for the import stages; job history kept in memory only"""
+    def no_database():
+        raise ConnectionError("no database in unit tests")
+
+    monkeypatch.setattr(telemetry, "IMPORT_TRACE_MEMORY", True)
+    monkeypatch.setattr(telemetry, "get_db", no_database)
+    monkeypatch.setattr(ImportTelemetry, "_tracing", 0)
+    monkeypatch.setattr(ImportTelemetry, "_started_tracing", False)
+    yield
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+
+def test_stage_peaks_when_the_import_traces_memory(traced):
+    with ImportTelemetry() as job:
+        assert tracemalloc.is_tracing()
+        with job.stage("parse"):
+            buffer = bytearray(4 * 2**20)
+            del buffer
+        with job.stage("etl"):
+            pass
+    assert not tracemalloc.is_tracing()
+    assert job.stages[0]["peak_mb"] >= 4
+    # The peak was reset for the second stage
+    assert job.stages[1]["peak_mb"] < 1
+
+
+def test_foreign_tracing_keeps_its_peak(traced):
+    tracemalloc.start()
+    buffer = bytearray(8 * 2**20)
+    del buffer
+    peak = tracemalloc.get_traced_memory()[1]
+
+    with ImportTelemetry() as job:
+        with job.stage("parse"):
+            kept = bytearray(2 * 2**20)
+    assert tracemalloc.is_tracing()
+    assert tracemalloc.get_traced_memory()[1] >= peak
+    # Below the foreign peak, the stage reports its net growth
+    assert 2 <= job.stages[0]["peak_mb"] < 3
+    del kept
@@ -0,0 +1,100 @@
+"""
+Keyset cursor and keyset SQL tests
+
+Runs without a database: cursors are checked by round-tripping and
+tampering with them, and the keyset SQL by rendering it.
+"""
+import base64
+import json
+from decimal import Decimal
+import pytest
+from app.crud.pagination import InvalidCursor, encode_cursor, decode_cursor
+from app.crud.aggregates import ROUTED_QUERIES, SOURCES, FACT_SOURCE
+
+
+def _raw(payload) -> str:
+    """Cursor with an arbitrary JSON payload, encoded like encode_cursor"""
+    raw = json.dumps(payload).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+@pytest.mark.parametrize("values", [
+    [Decimal("1234.5678"), 42],
+    [Decimal("0.01"), "USRC17607839", "GB", "Spotify", 202401],
+    [Decimal("-3.50"), None, "Ünïcödé", 7],
+    [1.5, 0]
+])
+def test_cursor_round_trip(values):
+    cursor = encode_cursor(values)
+    assert "=" not in cursor
+    decoded = decode_cursor(cursor, len(values))
+    assert decoded == values
+    assert [type(v) for v in decoded] == [type(v) for v in values]
+
+
+def test_cursor_is_url_safe():
+    cursor = encode_cursor(["??>>~~", Decimal("1")])
+    assert set(cursor) <= set("ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyz0123456789-_")
+
+
+@pytest.mark.parametrize("cursor", [
+    "",
+    "not a cursor",
+    "%%%%",
+    encode_cursor([Decimal("1"), 2])[:-3],
+    _raw({"d": "1"}),
+    _raw("202401"),
+    _raw([{"d": "not a number"}, 1]),
+    _raw([{"x": "1"}, 1]),
+    _raw([{"d": "1", "x": 1}, 1]),
+    _raw([{"d": 1}, 1]),
+    _raw([[1, 2], 1]),
+    _raw([{"d": "1"}, {"k": "v"}])
+])
+def test_tampered_cursor_is_rejected(cursor):
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, 2)
+
+
+def test_cursor_size_must_match_sort_key():
+    cursor = encode_cursor([Decimal("1"), 2, 3])
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, 2)
+    with pytest.raises(InvalidCursor):
+        decode_cursor(cursor, 4)
+
+
+def test_invalid_cursor_is_a_value_error():
+    # Endpoints turn ValueErrors from bad input into 400 responses
+    assert issubclass(InvalidCursor, ValueError)
+
+
+@pytest.mark.parametrize("source", [s for s in SOURCES if s.can_answer(ROUTED_QUERIES["geographic_analysis"], [])])
+def test_keyset_compares_text_bytewise(source):
+    # The snapshot orders Python strings, so SQL must not use the database collation
+    query = ROUTED_QUERIES["geographic_analysis"]
+    sql = source.render(query, [], 100, keyset=True)
+    for col in ("isrc", "country_code", "platform_name"):
+        expr = source.columns[col]
+        assert sql.count(f'{expr} COLLATE "C"') == 2, f"{col} not bytewise in {source.name}"
+    assert 'period COLLATE "C"' not in sql
+    assert 'total_revenue COLLATE "C"' not in sql
+
+
+def test_fact_table_keyset_page_aggregates_in_having():
+    query = ROUTED_QUERIES["label_performance"]
+    sql = FACT_SOURCE.render(query, [], 100, keyset=True)
+    having = sql.split("HAVING")[1]
+    assert "%(after_0)s, %(after_1)s" in having
+    assert "SUM(" in having
+
+
+@pytest.mark.parametrize("export,query", [
+    ("geography_export", "geographic_analysis"),
+    ("platform_label_export", "platform_label_matrix")
+])
+def test_exports_filter_like_their_json_queries(export, query):
+    assert set(ROUTED_QUERIES[export].filters) == set(ROUTED_QUERIES[query].filters)
+    predicates = ROUTED_QUERIES[export].predicates({"period": None, "month": "03"})
+    assert predicates == [("month", "=", "month")]
+    assert "fr.month = %(month)s" in FACT_SOURCE.render(ROUTED_QUERIES[export], predicates)
@@ -0,0 +1,226 @@
+"""
+Request profiler tests
+
+Run without a database: requests are sent straight to a small ASGI app
+behind RequestProfiler (as app.main installs it with PROFILING_ENABLED),
+whose endpoints burn CPU in this module. Connections fail on purpose, so
+get_db only gets as far as joining the worker thread to the profile.
+"""
+import asyncio
+import os
+import time
+from collections import Counter
+import pytest
+from fastapi import FastAPI
+from app.api.admin_endpoints import router as admin_router
+from app.db import database, profiling
+from app.db.profiling import Profile, Profiler
+from app.main import RequestProfiler
+
+BUSY_SECONDS = 0.2
+TOKEN = "s3cret"
+
+
+def crunch(seconds: float = BUSY_SECONDS) -> int:
+    """Burn CPU in a function the samples can be checked for"""
+    total = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        total += sum(range(100))
+    return total
+
+
+def refuse(**kwargs):
+    raise ConnectionError("no database in unit tests")
+
+
+def report():
+    """A threadpool endpoint: joins the profile through get_db, like the real ones"""
+    try:
+        with database.get_db():
+            pass
+    except ConnectionError:
+        pass
+    return {"total": crunch()}
+
+
+async def async_report():
+    """An endpoint running on the event loop thread"""
+    return {"total": crunch()}
+
+
+def build_app() -> FastAPI:
+    app = FastAPI()
+    app.get("/work")(report)
+    app.get("/async-work")(async_report)
+    app.include_router(admin_router, prefix="/api/v1/admin")
+    app.add_middleware(RequestProfiler)
+    return app
+
+
+def request(app, path: str, headers=None, query: bytes = b""):
+    """Send one GET through the ASGI app; returns status, headers and body"""
+    messages = []
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        messages.append(message)
+
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "root_path": "",
+        "query_string": query,
+        "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+        "client": ("testclient", 50000),
+        "server": ("testserver", 80)
+    }
+    asyncio.run(app(scope, receive, send))
+    start = next(message for message in messages if message["type"] == "http.response.start")
+    body = b"".join(message.get("body", b"") for message in messages if message["type"] == "http.response.body")
+    return start["status"], {name.decode(): value.decode() for name, value in start["headers"]}, body
+
+
+@pytest.fixture
+def profiled(monkeypatch):
+    """Profiling switched on, frames of this repository counted as application code"""
+    monkeypatch.setattr(database, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(profiling, "PROFILING_ENABLED", True)
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", TOKEN)
+    monkeypatch.setattr(profiling, "APP_DIR", os.path.dirname(os.path.abspath(__file__)))
+    monkeypatch.setattr(database.psycopg, "connect", refuse)
+    monkeypatch.setattr(Profiler, "_profiles", profiling.OrderedDict())
+    return build_app()
+
+
+def raw_headers(*pairs):
+    return [(name.encode(), value.encode()) for name, value in pairs]
+
+
+@pytest.mark.parametrize("token,sent,expected", [
+    ("", None, False),
+    ("", "1", False),
+    ("", "true", False),
+    ("", "0", False),
+    ("", "false", False),
+    ("", "", False),
+    ("s3cret", None, False),
+    ("s3cret", "1", False),
+    ("s3cret", "s3cre", False),
+    ("s3cret", "s3cret", True)
+])
+def test_profile_header_and_token(monkeypatch, token, sent, expected):
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", token)
+    sent_headers = raw_headers(("accept", "*/*")) + (raw_headers(("x-profile", sent)) if sent is not None else [])
+    assert Profiler.requested(sent_headers) is expected
+
+
+def test_unrequested_request_is_not_profiled(profiled):
+    status, response_headers, _ = request(profiled, "/work")
+    assert status == 200
+    assert "x-profile-id" not in response_headers
+    assert Profiler.profiles() == []
+
+
+def test_wrong_token_is_not_profiled(profiled):
+    _, response_headers, _ = request(profiled, "/work", {"X-Profile": "1"})
+    assert "x-profile-id" not in response_headers
+
+
+def test_nothing_is_profiled_without_a_token(profiled, monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILE_TOKEN", "")
+    _, response_headers, _ = request(profiled, "/work", {"X-Profile": "1"})
+    assert "x-profile-id" not in response_headers
+    assert Profiler.profiles() == []
+
+
+def test_worker_thread_is_sampled(profiled):
+    status, response_headers, _ = request(profiled, "/work", {"X-Profile": TOKEN})
+    assert status == 200
+    profile = Profiler.get(response_headers["x-profile-id"])
+    assert profile is not None and profile.path == "/work"
+    assert profile.seconds >= BUSY_SECONDS
+    assert profile.samples > 0
+    # Worker samples are kept only while the request's code runs on the thread;
+    # the rest were taken on the event loop, whenever the request's task ran there
+    workers = [stack for stack in profile.stacks if stack.startswith("threading.py:")]
+    assert workers
+    assert all("test_profiling.py:report" in stack for stack in workers)
+    assert any(stack.endswith("test_profiling.py:crunch") for stack in workers)
+    assert profile.summary()["top"][0]["function"] == "test_profiling.py:crunch"
+
+
+def test_event_loop_thread_is_sampled(profiled):
+    _, response_headers, _ = request(profiled, "/async-work", {"X-Profile": TOKEN})
+    profile = Profiler.get(response_headers["x-profile-id"])
+    assert profile.samples > 0
+    assert any("test_profiling.py:async_report;test_profiling.py:crunch" in stack for stack in profile.stacks)
+
+
+def test_collapsed_profile_from_admin_endpoint(profiled):
+    _, response_headers, _ = request(profiled, "/work", {"X-Profile": TOKEN})
+    profile_id = response_headers["x-profile-id"]
+
+    status, _, body = request(profiled, f"/api/v1/admin/profiles/{profile_id}", query=b"format=collapsed")
+    assert status == 200
+    lines = body.decode().splitlines()
+    assert lines
+    for line in lines:
+        stack, count = line.rsplit(" ", 1)
+        assert int(count) > 0 and ";" in stack
+    assert sum(int(line.rsplit(" ", 1)[1]) for line in lines) == Profiler.get(profile_id).samples
+
+    status, _, _ = request(profiled, "/api/v1/admin/profiles/unknown")
+    assert status == 404
+
+
+def make_profile() -> Profile:
+    async def create():
+        return Profile("GET", "/test")
+    return asyncio.run(create())
+
+
+def test_collapsed_format_and_summary():
+    profile = make_profile()
+    profile.stacks = Counter({"main;handler;query": 5, "main;handler": 2, "main;render": 3})
+    profile.samples = 10
+    profile.seconds = 0.0123
+    profile.queries = [{"query": "top_artists", "ms": 4.0, "rows": 10}]
+
+    assert profile.collapsed() == "main;handler;query 5\nmain;render 3\nmain;handler 2\n"
+    summary = profile.summary()
+    assert summary["ms"] == 12.3 and summary["sql_ms"] == 4.0
+    assert summary["collapsed"] == profile.collapsed()
+    top = {entry["function"]: entry for entry in summary["top"]}
+    assert top["query"] == {"function": "query", "own_samples": 5, "total_samples": 5}
+    assert top["handler"]["own_samples"] == 2 and top["handler"]["total_samples"] == 7
+    assert "main" not in top
+    assert "collapsed" not in profile.summary(stacks=False)
+
+
+def test_queries_are_recorded_only_inside_a_profile():
+    Profiler.record_query("outside", 0.5, 1)
+    profile = make_profile()
+    token = profiling._active.set(profile)
+    try:
+        Profiler.record_query("top_artists", 0.0042, 10)
+    finally:
+        profiling._active.reset(token)
+    assert profile.queries == [{"query": "top_artists", "ms": 4.2, "rows": 10}]
+
+
+def test_only_the_latest_profiles_are_kept(monkeypatch):
+    monkeypatch.setattr(profiling, "PROFILES_KEPT", 2)
+    monkeypatch.setattr(Profiler, "_profiles", profiling.OrderedDict())
+    profiles = [make_profile() for _ in range(3)]
+    for profile in profiles:
+        Profiler.keep(profile)
+    assert Profiler.profiles() == [profiles[2], profiles[1]]
+    assert Profiler.get(profiles[0].profile_id) is None
@@ -0,0 +1,603 @@
+"""
+Query-plan regression suite
+
+Loads a generated dataset into a scratch Postgres database and runs
+EXPLAIN (ANALYZE, BUFFERS) for every `Queries` method and every routed
+aggregate query. Checks the plan shape (partition pruning, no sequential
+scans on the fact table for selective filters) and buffer/latency budgets.
+
+Configuration (environment):
+    PLAN_TEST_DB            scratch database, rebuilt from db_setup.sql (royalty_plan_test)
+    PLAN_TEST_ROWS          fact rows to generate (200000)
+    PLAN_TEST_MONTHS        months of history to spread them over (36)
+    PLAN_TEST_MAX_MS        latency budget for selective queries in ms (250)
+    PLAN_TEST_BUDGET_SCALE  multiplier applied to every budget (1.0)
+
+The module is skipped when the database server cannot be reached.
+"""
+import csv
+import io
+import json
+import os
+from pathlib import Path
+import psycopg
+from psycopg.rows import dict_row
+import pytest
+from app.db.database import DB_CONFIG, execute_query
+from app.db.metrics import Metrics
+from app.db import slowlog
+from app.db.slowlog import SlowQueries
+from app.crud.queries import Queries
+from app.crud.aggregates import AggregateRouter, ROUTED_QUERIES, SOURCES
+from app.crud.timeseries import ENTITIES, TimeSeries
+from app.crud.rollup import Rollup
+from app.crud.sketches import DistinctCounts, RELATIVE_ERROR
+from app.crud.export import Export, EXPORTS, FORMATS
+from app.crud.statements import Statements, render_batch
+
+TEST_DB = os.getenv("PLAN_TEST_DB", "royalty_plan_test")
+ROWS = int(os.getenv("PLAN_TEST_ROWS", "200000"))
+MONTHS = int(os.getenv("PLAN_TEST_MONTHS", "36"))
+MAX_MS = float(os.getenv("PLAN_TEST_MAX_MS", "250"))
+BUDGET_SCALE = float(os.getenv("PLAN_TEST_BUDGET_SCALE", "1.0"))
+
+FIRST_PERIOD = 202101
+ARTISTS = 500
+SONGS = 5000
+
+# A small second tenant owning the last few generated artists
+SMALL_TENANT = 2
+SMALL_TENANT_ARTISTS = 10
+
+# Representative parameters shared by every query
+PARAMS = {
+    "period": 202206,
+    "period_from": None,
+    "period_to": None,
+    "year": 2022,
+    "month": None,
+    "artist_id": 1001,
+    "label_id": 3,
+    "platform_name": "Spotify",
+    "label_name": None,
+    "country_code": None,
+    "isrc": None,
+    "dimension": "all",
+    "dimension_value": "",
+    "month_number": None,
+    "ids": ["00000000-0000-0000-0000-000000000000"],
+    "artist_ids": [1001, 1002, 1003],
+    "tenant_id": None,
+    "limit": 100,
+    "job_id": "00000000-0000-0000-0000-000000000000"
+}
+
+# Queries whose filters select a small slice of the fact table: they must not
+# sequentially scan it and must touch a small share of its pages.
+# Month-filtered queries may scan their single pruned partition.
+SELECTIVE = {
+    "validate_month": {"max_partitions": 1},
+    "revenue_by_platform": {"max_partitions": 1},
+    "top_artists": {"max_partitions": 1},
+    "label_performance": {"max_partitions": 1},
+    "artist_performance": {"no_seq_scan": True}
+}
+
+GENERATE_DATA = """
+SELECT setseed(0.42);
+
+INSERT INTO analytics.platform_config (platform_name, revenue_share_percentage, effective_from, is_active)
+VALUES ('Spotify', 65.00, '2020-01-01', true),
+       ('YouTube', 60.00, '2020-01-01', true),
+       ('Amazon', 68.00, '2020-01-01', true);
+
+INSERT INTO whitelabel.tenant (tenant_id, tenant_name)
+VALUES (%(small_tenant)s, 'Small Tenant');
+
+INSERT INTO whitelabel.artist (artist_id, artist_name, tenant_id)
+SELECT 1000 + g, 'Generated Artist ' || g,
+       CASE WHEN g > %(artists)s - %(small_tenant_artists)s THEN %(small_tenant)s ELSE 1 END
+FROM generate_series(1, %(artists)s) g;
+
+INSERT INTO whitelabel.song (isrc, title, artist_id, label_id)
+SELECT 'GEN' || lpad(g::text, 9, '0'), 'Generated Song ' || g, 1001 + g %% %(artists)s, 1 + g %% 29
+FROM generate_series(0, %(songs)s - 1) g;
+
+CALL analytics.ensure_fact_partitions(%(first_period)s, %(last_period)s);
+
+WITH songs AS (
+    SELECT s.song_id, s.artist_id, a.tenant_id, row_number() OVER (ORDER BY s.song_id) - 1 AS idx
+    FROM whitelabel.song s
+    JOIN whitelabel.artist a ON s.artist_id = a.artist_id
+    WHERE s.isrc LIKE 'GEN%%'
+),
+facts AS (
+    SELECT
+        g,
+        (g / %(songs)s) %% %(months)s AS month_offset,
+        g %% %(songs)s AS song_idx,
+        round((random() * 10)::numeric, 6) AS revenue
+    FROM generate_series(0, %(rows)s - 1) g
+)
+INSERT INTO analytics.fact_monthly_revenue (
+    period, song_id, platform_id, geography_id, artist_id, tenant_id,
+    total_plays, revenue_amount, royalty_amount
+)
+SELECT
+    (%(first_year)s + f.month_offset / 12) * 100 + f.month_offset %% 12 + 1,
+    s.song_id,
+    1 + f.g %% 4,
+    1 + (f.g / 4) %% 10,
+    s.artist_id,
+    s.tenant_id,
+    1 + (random() * 1000)::int,
+    f.revenue,
+    round(f.revenue * 0.7, 6)
+FROM facts f
+JOIN songs s ON s.idx = f.song_idx;
+"""
+
+REFRESH_VIEWS = [
+    "mv_revenue_overview", "mv_artist_dashboard", "mv_platform_analytics",
+    "mv_artist_earnings", "mv_platform_revenue", "mv_artist_performance",
+    "mv_label_performance", "mv_artist_platform_label", "mv_isrc_geo_platform"
+]
+
+
+def last_period() -> int:
+    """Last generated period, plus one month of empty partition ahead"""
+    offset = MONTHS
+    return (FIRST_PERIOD // 100 + offset // 12) * 100 + offset % 12 + 1
+
+
+def create_test_database():
+    """Create the scratch database, skipping the module if Postgres is unreachable"""
+    config = {**DB_CONFIG, "dbname": "postgres"}
+    try:
+        conn = psycopg.connect(**config, connect_timeout=3)
+    except psycopg.OperationalError as e:
+        pytest.skip(f"Postgres not available: {e}", allow_module_level=True)
+
+    conn.autocommit = True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1 FROM pg_database WHERE datname = %s", (TEST_DB,))
+            if not cur.fetchone():
+                cur.execute(f'CREATE DATABASE "{TEST_DB}"')
+    finally:
+        conn.close()
+
+
+@pytest.fixture(scope="module")
+def plan_db():
+    """Scratch database with the schema and a generated dataset"""
+    create_test_database()
+    conn = psycopg.connect(**{**DB_CONFIG, "dbname": TEST_DB})
+    conn.autocommit = True
+
+    script = (Path(__file__).parent / "db_setup.sql").read_text()
+    # Client-side binding: the generator is a multi-statement script
+    with psycopg.ClientCursor(conn) as cur:
+        cur.execute(script)
+        cur.execute(GENERATE_DATA, {
+            "artists": ARTISTS,
+            "small_tenant": SMALL_TENANT,
+            "small_tenant_artists": SMALL_TENANT_ARTISTS,
+            "songs": SONGS,
+            "rows": ROWS,
+            "months": MONTHS,
+            "first_year": FIRST_PERIOD // 100,
+            "first_period": FIRST_PERIOD,
+            "last_period": last_period()
+        })
+        for view in REFRESH_VIEWS:
+            cur.execute(f"REFRESH MATERIALIZED VIEW analytics.{view};")
+        cur.execute("CALL analytics.refresh_revenue_rollup();")
+        cur.execute("CALL analytics.refresh_distinct_sketches();")
+        cur.execute("CALL analytics.rebuild_payout_balances();")
+        cur.execute("UPDATE analytics.refresh_log SET refreshed_at = clock_timestamp() WHERE relation_name LIKE 'mv\\_%';")
+        cur.execute("ANALYZE;")
+
+    yield conn
+    conn.close()
+
+
+@pytest.fixture(scope="module")
+def fact_pages(plan_db) -> int:
+    """Total heap pages across the fact partitions"""
+    with plan_db.cursor() as cur:
+        cur.execute("""
+            SELECT COALESCE(SUM(relpages), 0)
+            FROM pg_class
+            WHERE relname LIKE 'fact\\_monthly\\_revenue\\_p%' AND relkind = 'r';
+        """)
+        return cur.fetchone()[0]
+
+
+def explain(conn: psycopg.Connection, sql: str, params: dict) -> dict:
+    """Run EXPLAIN (ANALYZE, BUFFERS) with literal parameters so partitions prune at plan time"""
+    with psycopg.ClientCursor(conn) as cur:
+        cur.execute("EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + sql.strip(), params)
+        return cur.fetchone()[0][0]
+
+
+def plan_nodes(node: dict):
+    """Yield every node of a JSON plan tree"""
+    yield node
+    for child in node.get("Plans", []):
+        yield from plan_nodes(child)
+
+
+def fact_scans(plan: dict) -> list:
+    """Scan nodes reading fact partitions"""
+    return [
+        node for node in plan_nodes(plan["Plan"])
+        if node.get("Relation Name", "").startswith("fact_monthly_revenue")
+    ]
+
+
+def buffers(plan: dict) -> int:
+    """Shared buffers hit or read by the whole plan"""
+    root = plan["Plan"]
+    return root.get("Shared Hit Blocks", 0) + root.get("Shared Read Blocks", 0)
+
+
+def check_plan(name: str, plan: dict, pages: int):
+    """Assert the shape and budgets expected for a query"""
+    expectation = SELECTIVE.get(name)
+    scans = fact_scans(plan)
+
+    if expectation is None:
+        # Broad queries only have to finish within a relaxed latency budget
+        assert plan["Execution Time"] <= MAX_MS * 20 * BUDGET_SCALE, \
+            f"{name} took {plan['Execution Time']:.1f} ms"
+        return
+
+    if expectation.get("no_seq_scan"):
+        seq = [node["Relation Name"] for node in scans if node["Node Type"] == "Seq Scan"]
+        assert not seq, f"{name} sequentially scans {seq}"
+
+    max_partitions = expectation.get("max_partitions")
+    if max_partitions is not None:
+        touched = {node["Relation Name"] for node in scans}
+        assert len(touched) <= max_partitions, f"{name} scans partitions {sorted(touched)}"
+
+    # Selective queries stay well below a full scan of the fact table
+    budget = (pages * 0.25 + 200) * BUDGET_SCALE
+    assert buffers(plan) <= budget, f"{name} touched {buffers(plan)} buffers (budget {budget:.0f})"
+    assert plan["Execution Time"] <= MAX_MS * BUDGET_SCALE, \
+        f"{name} took {plan['Execution Time']:.1f} ms"
+
+
+QUERY_METHODS = sorted(
+    name for name, value in vars(Queries).items()
+    if isinstance(value, staticmethod)
+)
+
+
+@pytest.mark.parametrize("name", QUERY_METHODS)
+def test_query_plan(plan_db, fact_pages, name):
+    """Every hand-written query keeps its expected plan shape and budget"""
+    plan = explain(plan_db, getattr(Queries, name)(), PARAMS)
+    check_plan(name, plan, fact_pages)
+
+
+ROUTED_PLANS = [
+    (name, source.name)
+    for name, query in ROUTED_QUERIES.items()
+    for source in SOURCES
+    if source.can_answer(query, query.predicates(PARAMS))
+]
+
+
+@pytest.mark.parametrize("name,source_name", ROUTED_PLANS)
+def test_routed_query_plan(plan_db, fact_pages, name, source_name):
+    """Every source the router may pick for a query stays within budget"""
+    query = ROUTED_QUERIES[name]
+    source = next(s for s in SOURCES if s.name == source_name)
+    plan = explain(plan_db, source.render(query, query.predicates(PARAMS)), PARAMS)
+    check_plan(name, plan, fact_pages)
+    if source_name != "fact_monthly_revenue":
+        assert not fact_scans(plan), f"{name} via {source_name} reads the fact table"
+
+
+# Routed queries of the small tenant, without filters narrowing them further
+TENANT_PARAMS = {
+    **PARAMS, "artist_id": None, "label_id": None, "platform_name": None,
+    "artist_ids": [1000 + ARTISTS], "tenant_id": SMALL_TENANT
+}
+
+
+@pytest.mark.parametrize("name", sorted(ROUTED_QUERIES))
+def test_small_tenant_reads_only_its_rows(plan_db, fact_pages, name):
+    """A small tenant's queries go through tenant-leading indexes, never the whole month"""
+    query = ROUTED_QUERIES[name]
+    sources = [s for s in SOURCES if s.can_answer(query, query.predicates(TENANT_PARAMS))]
+    assert sources and all("tenant_id" in s.columns for s in sources)
+    for source in sources:
+        plan = explain(plan_db, source.render(query, query.predicates(TENANT_PARAMS)), TENANT_PARAMS)
+        seq = [n["Relation Name"] for n in plan_nodes(plan["Plan"]) if n["Node Type"] == "Seq Scan"
+               and n.get("Relation Name", "").startswith(("fact_monthly_revenue", "mv_"))]
+        assert not seq, f"{name} via {source.name} sequentially scans {seq}"
+        budget = (fact_pages * 0.05 + 200) * BUDGET_SCALE
+        assert buffers(plan) <= budget, \
+            f"{name} via {source.name} touched {buffers(plan)} buffers (budget {budget:.0f})"
+
+
+def test_period_range_prunes_partitions(plan_db):
+    """A period range only touches the partitions inside it"""
+    query = ROUTED_QUERIES["label_performance"]
+    params = {**PARAMS, "period": None, "period_from": 202201, "period_to": 202203}
+    source = next(s for s in SOURCES if s.name == "fact_monthly_revenue")
+    plan = explain(plan_db, source.render(query, query.predicates(params)), params)
+    touched = {node["Relation Name"] for node in fact_scans(plan)}
+    assert touched <= {f"fact_monthly_revenue_p{p}" for p in (202201, 202202, 202203)}
+
+
+# Keys of generated entities with a full history
+SERIES_KEYS = {"artist_id": 1001, "label_id": 3, "platform_name": "Spotify", "isrc": "GEN000000001"}
+
+
+@pytest.mark.parametrize("entity", sorted(ENTITIES))
+def test_time_series_plan(plan_db, fact_pages, entity):
+    """A 24-month series with deltas and rolling sums reads one aggregate, not the facts"""
+    name, key_filter = ENTITIES[entity]
+    query = ROUTED_QUERIES[name]
+    params = {
+        key_filter: SERIES_KEYS[key_filter],
+        "period_from": 202011,
+        "period_to": 202212,
+        "first_period": 202101
+    }
+    source = next(s for s in SOURCES if s.can_answer(query, query.predicates(params)))
+    sql = TimeSeries.render(source.render(query, query.predicates(params)), deltas=True, rolling=3)
+    plan = explain(plan_db, sql, params)
+    assert not fact_scans(plan), f"{entity} series via {source.name} reads the fact table"
+    budget = (fact_pages * 0.25 + 200) * BUDGET_SCALE
+    assert buffers(plan) <= budget, f"{entity} series touched {buffers(plan)} buffers (budget {budget:.0f})"
+
+
+ROLLUP_CASES = [
+    ([], {"period": 202206}),
+    (["platform"], {"period_from": 202201, "period_to": 202212}),
+    (["period", "label"], {"period_from": 202201, "period_to": 202206, "platform_name": "Spotify"}),
+    (["artist", "platform", "country"], {"period": 202206, "label_id": 3})
+]
+
+
+@pytest.mark.parametrize("group_by,filters", ROLLUP_CASES)
+def test_rollup_plan(plan_db, fact_pages, group_by, filters):
+    """Rollup queries are index lookups on the rollup table that never touch the facts"""
+    sql, params = Rollup.render(group_by, filters)
+    plan = explain(plan_db, sql, params)
+    assert not fact_scans(plan), f"rollup {group_by} reads the fact table"
+    seq = [n for n in plan_nodes(plan["Plan"]) if n.get("Relation Name") == "revenue_rollup" and n["Node Type"] == "Seq Scan"]
+    assert not seq, f"rollup {group_by} sequentially scans revenue_rollup"
+    assert plan["Execution Time"] <= MAX_MS * BUDGET_SCALE
+
+
+def test_rollup_matches_facts(plan_db):
+    """A rollup slice adds up to the same totals as the fact table"""
+    sql, params = Rollup.render(["platform"], {"period": 202206, "label_id": 3})
+    with plan_db.cursor() as cur:
+        cur.execute(sql, params)
+        rollup = {row[0]: row[3] for row in cur.fetchall()}
+        cur.execute("""
+            SELECT p.platform_name, SUM(fr.revenue_amount)
+            FROM analytics.fact_monthly_revenue fr
+            JOIN whitelabel.song s ON fr.song_id = s.song_id
+            JOIN analytics.platform_config p ON fr.platform_id = p.platform_id
+            WHERE fr.period = 202206 AND s.label_id = 3
+            GROUP BY p.platform_name;
+        """)
+        facts = dict(cur.fetchall())
+    assert rollup == facts
+
+
+@pytest.mark.parametrize("filters", [
+    {"period_from": 202101, "period_to": 202312},
+    {"period_from": 202201, "period_to": 202203, "platform_name": "Spotify"},
+    {"period_from": 202207, "period_to": 202212, "label_id": 3}
+])
+def test_distinct_sketches_match_exact_counts(plan_db, filters):
+    """Merged sketches stay within three standard errors of COUNT(DISTINCT)"""
+    params = {"period": None, "month": None, "platform_name": None, "label_id": None, **filters}
+    approximate = DistinctCounts.approximate(plan_db, params)
+    exact = DistinctCounts.exact(plan_db, params)
+    for field, count in exact.items():
+        assert abs(approximate[field] - count) <= 3 * RELATIVE_ERROR * count + 2, \
+            f"{field}: estimated {approximate[field]}, exact {count}"
+
+
+@pytest.fixture(scope="module")
+def snapshot(plan_db):
+    """Columnar snapshot of the generated dataset"""
+    pytest.importorskip("numpy")
+    from app.crud.snapshot import Snapshot
+    with psycopg.connect(**{**DB_CONFIG, "dbname": TEST_DB}) as conn:
+        return Snapshot.load(conn)
+
+
+def canonical(rows: list) -> list:
+    """Rows in a comparable order (SQL may return ties in any order)"""
+    return sorted(tuple(sorted((k, str(v)) for k, v in row.items())) for row in rows)
+
+
+@pytest.mark.parametrize("name", sorted(ROUTED_QUERIES))
+@pytest.mark.parametrize("params", [
+    PARAMS,
+    {**PARAMS, "period": None, "period_from": 202201, "period_to": 202206, "label_id": None, "platform_name": None},
+    TENANT_PARAMS
+])
+def test_snapshot_matches_fact_sql(plan_db, snapshot, name, params):
+    """The snapshot engine returns exactly the rows of the fact-table SQL"""
+    query = ROUTED_QUERIES[name]
+    source = next(s for s in SOURCES if s.name == "fact_monthly_revenue")
+    with plan_db.cursor(row_factory=dict_row) as cur:
+        cur.execute(source.render(query, query.predicates(params)), params)
+        expected = cur.fetchall()
+    rows, _ = snapshot.query(query, params)
+    if query.limit:
+        # Top-N may break ties differently; the ranked measures must agree
+        measure = next(iter(query.measures)) if not query.order_by else query.order_by[0].split()[0]
+        assert [r[measure] for r in rows] == [r[measure] for r in expected]
+    else:
+        assert canonical(rows) == canonical(expected)
+
+
+@pytest.mark.parametrize("export", sorted(EXPORTS))
+@pytest.mark.parametrize("fmt", sorted(FORMATS))
+def test_export_streams_routed_rows(plan_db, export, fmt):
+    """Exports stream exactly the rows of their routed query, in order"""
+    query = ROUTED_QUERIES[EXPORTS[export]]
+    source = next(s for s in SOURCES if s.name == "fact_monthly_revenue")
+    with plan_db.cursor(row_factory=dict_row) as cur:
+        cur.execute(source.render(query, query.predicates(PARAMS)), PARAMS)
+        expected = [{k: str(v) for k, v in row.items()} for row in cur.fetchall()]
+
+    body = b"".join(bytes(block) for block in Export.copy(plan_db, export, PARAMS, fmt)).decode()
+    if fmt == "csv":
+        rows = list(csv.DictReader(io.StringIO(body)))
+    else:
+        rows = [json.loads(line, parse_float=str) for line in body.splitlines()]
+    rows = [{k: "" if v is None else str(v) for k, v in row.items()} for row in rows]
+    expected = [{k: "" if v == "None" else v for k, v in row.items()} for row in expected]
+    assert rows == expected
+
+
+@pytest.mark.parametrize("name,fields", [
+    ("platform_label_matrix", ("artist_name", "total_revenue", "total_royalties")),
+    ("geographic_analysis", ("isrc", "total_plays")),
+    ("label_performance", ("label_name", "total_revenue"))
+])
+def test_projection_matches_full_query(plan_db, name, fields):
+    """A projected query returns the requested columns of the full query's rows"""
+    full, projected = ROUTED_QUERIES[name], ROUTED_QUERIES[name].project(fields)
+    results = []
+    for query in (full, projected):
+        for source in SOURCES:
+            if not source.can_answer(query, query.predicates(PARAMS)):
+                continue
+            with plan_db.cursor(row_factory=dict_row) as cur:
+                cur.execute(source.render(query, query.predicates(PARAMS)), PARAMS)
+                results.append([{k: row[k] for k in fields} for row in cur.fetchall()])
+    assert results and all(rows == results[0] for rows in results)
+
+
+def test_statements_add_up_to_facts(plan_db, tmp_path):
+    """Streamed statements cover each artist once, in order, with the fact table's totals"""
+    with plan_db.transaction():
+        artists = list(Statements.stream(plan_db, PARAMS["period"]))
+    with plan_db.cursor() as cur:
+        cur.execute("""
+            SELECT artist_id, SUM(total_plays), SUM(revenue_amount), SUM(royalty_amount)
+            FROM analytics.fact_monthly_revenue
+            WHERE period = %(period)s
+            GROUP BY artist_id
+            ORDER BY artist_id;
+        """, PARAMS)
+        facts = cur.fetchall()
+    totals = [
+        (artist_id, sum(l[4] for l in lines), sum(l[5] for l in lines), sum(l[6] for l in lines))
+        for artist_id, _, lines in artists
+    ]
+    assert totals == facts
+
+    artist_id, _, lines = artists[0]
+    assert render_batch(str(tmp_path), PARAMS["period"], "csv", artists[:1]) == (1, len(lines))
+    rows = list(csv.reader(io.StringIO((tmp_path / f"{artist_id}.csv").read_text())))
+    assert len(rows) == len(lines) + 2
+    assert rows[-1][0] == "TOTAL" and rows[-1][5] == str(totals[0][2])
+
+
+def test_payout_balances_match_facts(plan_db):
+    """Rebuilt balances carry each artist's royalties; payouts debit them through the ledger"""
+    with plan_db.cursor() as cur:
+        cur.execute("""
+            SELECT fr.artist_id
+            FROM analytics.fact_monthly_revenue fr
+            JOIN whitelabel.artist a ON fr.artist_id = a.artist_id
+            GROUP BY fr.artist_id, a.payment_threshold
+            HAVING SUM(fr.royalty_amount) >= a.payment_threshold
+            ORDER BY SUM(fr.royalty_amount) DESC, fr.artist_id
+            LIMIT %(limit)s;
+        """, PARAMS)
+        expected = [row[0] for row in cur.fetchall()]
+        cur.execute(Queries.payouts_due(), PARAMS)
+        assert [row[0] for row in cur.fetchall()] == expected
+
+    artist_id = expected[0]
+    with plan_db.transaction(force_rollback=True), plan_db.cursor() as cur:
+        cur.execute(Queries.payout_balance(), {"artist_id": artist_id, "tenant_id": None})
+        balance = cur.fetchone()[2]
+        cur.execute("CALL analytics.record_payout(%s, %s, 'test');", (artist_id, balance))
+        cur.execute(Queries.payout_ledger(), {"artist_id": artist_id, "tenant_id": None, "limit": 1})
+        entry = cur.fetchone()
+        assert entry[1] == "PAYOUT" and entry[2] == -balance and entry[3] == 0
+        cur.execute(Queries.payouts_due(), PARAMS)
+        assert artist_id not in [row[0] for row in cur.fetchall()]
+
+
+def test_dropped_partition_reverses_royalties(plan_db):
+    """Dropping a month debits its royalties back out of the balances; archiving keeps them"""
+    period = PARAMS["period"]
+    with plan_db.transaction(force_rollback=True), plan_db.cursor() as cur:
+        cur.execute("""
+            SELECT artist_id, SUM(royalty_amount)
+            FROM analytics.fact_monthly_revenue
+            WHERE period = %s
+            GROUP BY artist_id
+            HAVING SUM(royalty_amount) <> 0;
+        """, (period,))
+        dropped = dict(cur.fetchall())
+        cur.execute("SELECT artist_id, balance, earned FROM analytics.payout_balance;")
+        before = {artist_id: (balance, earned) for artist_id, balance, earned in cur.fetchall()}
+
+        cur.execute("CALL analytics.detach_fact_partition(%s, false);", (period,))
+        cur.execute("SELECT artist_id, balance, earned FROM analytics.payout_balance;")
+        after = {artist_id: (balance, earned) for artist_id, balance, earned in cur.fetchall()}
+        for artist_id, (balance, earned) in before.items():
+            amount = dropped.get(artist_id, 0)
+            assert after[artist_id] == (balance - amount, earned - amount)
+
+        cur.execute("""
+            SELECT artist_id, amount, balance_after, first_period, last_period
+            FROM analytics.payout_ledger
+            WHERE entry_type = 'REVERSAL';
+        """)
+        reversals = {row[0]: row[1:] for row in cur.fetchall()}
+        assert set(reversals) == set(dropped) & set(before)
+        for artist_id, (amount, balance_after, first_period, last_period) in reversals.items():
+            assert amount == -dropped[artist_id]
+            assert balance_after == after[artist_id][0]
+            assert first_period == last_period == period
+
+    with plan_db.transaction(force_rollback=True), plan_db.cursor() as cur:
+        cur.execute("CALL analytics.detach_fact_partition(%s, true);", (period,))
+        cur.execute("SELECT artist_id, balance, earned FROM analytics.payout_balance;")
+        assert {artist_id: (balance, earned) for artist_id, balance, earned in cur.fetchall()} == before
+        cur.execute("SELECT count(*) FROM analytics.payout_ledger WHERE entry_type = 'REVERSAL';")
+        assert cur.fetchone()[0] == 0
+
+
+def test_query_metrics_are_named(plan_db):
+    """Executions are timed under the Queries method name, or the routed query and source"""
+    execute_query(plan_db, Queries.top_artists(), PARAMS)
+    _, source = AggregateRouter.execute(plan_db, "artist_performance", PARAMS)
+    text = Metrics.render()
+    assert 'db_query_duration_seconds_count{query="top_artists"}' in text
+    assert 'db_query_rows_total{query="top_artists"}' in text
+    assert f'db_query_duration_seconds_count{{query="artist_performance/{source}"}}' in text
+
+
+def test_slow_query_log_captures_plans(plan_db, monkeypatch):
+    """Statements over the threshold are logged with redacted parameters and a sampled plan"""
+    monkeypatch.setattr(slowlog, "SLOW_QUERY_MS", 0.001)
+    monkeypatch.setattr(slowlog, "SLOW_QUERY_EXPLAIN_RATE", 1.0)
+    SlowQueries.clear()
+    execute_query(plan_db, Queries.top_artists(), PARAMS)
+    entry = SlowQueries.entries()[0]
+    assert entry["query"] == "top_artists"
+    assert entry["params"]["year"] == "<int>" and entry["params"]["month"] is None
+    assert entry["plan"]["Plan"] and "Execution Time" in entry["plan"]
+    assert SlowQueries.entries(plans=False)[0]["plan"] is None
@@ -0,0 +1,58 @@
+"""
+Row encoding tests
+
+Run without a database: rows are dicts shaped like the cursor's, and the
+trusted orjson path is checked against pydantic's own validation and
+encoding of the same rows.
+"""
+import json
+from decimal import Decimal
+import pytest
+from pydantic import TypeAdapter
+from typing import List
+from app.models import base
+from app.models.base import ResponseModel, EncodedRows, encode_response, encode_rows
+from app.models.revenue import RollupRow
+
+ROLLUP_ROWS = [
+    # Grouped on artist: the artist's dimensions present
+    {"artist_id": 7, "artist_name": "Ada", "fact_rows": Decimal(3), "total_plays": Decimal(120),
+     "total_revenue": Decimal("1.50"), "total_royalties": Decimal("0.75")},
+    # ROLLUP's grand total: grouped dimensions NULL
+    {"artist_id": None, "artist_name": None, "fact_rows": 3, "total_plays": 120,
+     "total_revenue": 1.5, "total_royalties": 0.75},
+    # Not grouped on anything: no dimension columns at all
+    {"fact_rows": 3, "total_plays": 120, "total_revenue": 1.5, "total_royalties": 0.75}
+]
+
+
+def expected(model, rows):
+    adapter = TypeAdapter(List[model])
+    return json.loads(adapter.dump_json(adapter.validate_python(rows)))
+
+
+@pytest.fixture(params=["orjson", "pydantic"])
+def encoder(request, monkeypatch):
+    """Both encoding paths: orjson's when installed, and the bulk validation fallback"""
+    if request.param == "orjson":
+        pytest.importorskip("orjson")
+    else:
+        monkeypatch.setattr(base, "orjson", None)
+    return request.param
+
+
+def test_rollup_rows_with_null_or_absent_dimensions(encoder):
+    encoded = json.loads(encode_rows(RollupRow, ROLLUP_ROWS))
+    assert encoded == expected(RollupRow, ROLLUP_ROWS)
+    assert encoded[2]["artist_id"] is None and encoded[2]["period"] is None
+    assert encoded[0]["total_plays"] == 120 and encoded[0]["total_revenue"] == 1.5
+
+
+def test_encoded_rows_in_a_response(encoder):
+    response = ResponseModel(success=True, message="ok", data=EncodedRows(RollupRow, ROLLUP_ROWS[2:]))
+    assert json.loads(encode_response(response)) == {
+        "success": True,
+        "message": "ok",
+        "data": expected(RollupRow, ROLLUP_ROWS[2:]),
+        "meta": None
+    }
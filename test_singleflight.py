@@ -0,0 +1,125 @@
+"""
+SingleFlight tests
+
+Run without a database: the shared function is a plain callable that
+blocks until every concurrent caller has joined its flight.
+"""
+import threading
+import time
+import pytest
+from app.db.singleflight import SingleFlight
+
+CALLERS = 8
+TIMEOUT = 5.0
+
+
+@pytest.fixture(autouse=True)
+def counters(monkeypatch):
+    monkeypatch.setattr(SingleFlight, "executed", 0)
+    monkeypatch.setattr(SingleFlight, "coalesced", 0)
+    monkeypatch.setattr(SingleFlight, "_calls", {})
+
+
+def wait_for(condition):
+    deadline = time.monotonic() + TIMEOUT
+    while not condition():
+        assert time.monotonic() < deadline, "timed out waiting for callers"
+        time.sleep(0.001)
+
+
+def run_concurrently(key, fn, callers=CALLERS):
+    """Call SingleFlight.do from several threads; returns results and errors by thread"""
+    results, errors = {}, {}
+
+    def call(i):
+        try:
+            results[i] = SingleFlight.do(key, fn)
+        except Exception as e:
+            errors[i] = e
+
+    threads = [threading.Thread(target=call, args=(i,)) for i in range(callers)]
+    for thread in threads:
+        thread.start()
+    return threads, results, errors
+
+
+def test_concurrent_calls_share_one_execution():
+    release = threading.Event()
+    runs = []
+
+    def fn():
+        runs.append(threading.get_ident())
+        release.wait(TIMEOUT)
+        return {"rows": [1, 2, 3]}
+
+    threads, results, errors = run_concurrently("q", fn)
+    wait_for(lambda: SingleFlight.coalesced == CALLERS - 1)
+    assert SingleFlight.stats()["in_flight"] == 1
+    release.set()
+    for thread in threads:
+        thread.join(TIMEOUT)
+
+    assert len(runs) == 1
+    assert not errors
+    assert len(results) == CALLERS
+    # Every caller gets the very same (read-only) object
+    assert len({id(result) for result in results.values()}) == 1
+    assert SingleFlight.stats() == {"executed": 1, "coalesced": CALLERS - 1, "in_flight": 0}
+
+
+def test_error_is_raised_to_every_waiter():
+    release = threading.Event()
+
+    def fn():
+        release.wait(TIMEOUT)
+        raise RuntimeError("connection lost")
+
+    threads, results, errors = run_concurrently("q", fn)
+    wait_for(lambda: SingleFlight.coalesced == CALLERS - 1)
+    release.set()
+    for thread in threads:
+        thread.join(TIMEOUT)
+
+    assert not results
+    assert len(errors) == CALLERS
+    assert all(isinstance(e, RuntimeError) and str(e) == "connection lost" for e in errors.values())
+    assert SingleFlight.stats() == {"executed": 1, "coalesced": CALLERS - 1, "in_flight": 0}
+
+
+def test_failed_flight_is_not_reused():
+    def fail():
+        raise ValueError("boom")
+
+    with pytest.raises(ValueError):
+        SingleFlight.do("q", fail)
+    assert SingleFlight.do("q", lambda: 42) == 42
+    assert SingleFlight.stats() == {"executed": 2, "coalesced": 0, "in_flight": 0}
+
+
+def test_sequential_calls_each_execute():
+    assert [SingleFlight.do("q", lambda: i) for i in range(3)] == [0, 1, 2]
+    assert SingleFlight.stats() == {"executed": 3, "coalesced": 0, "in_flight": 0}
+
+
+def test_different_keys_do_not_coalesce():
+    release = threading.Event()
+    started = []
+
+    def fn():
+        started.append(1)
+        release.wait(TIMEOUT)
+        return len(started)
+
+    first, _, _ = run_concurrently("a", fn, callers=1)
+    second, _, _ = run_concurrently("b", fn, callers=1)
+    wait_for(lambda: len(started) == 2)
+    release.set()
+    for thread in first + second:
+        thread.join(TIMEOUT)
+    assert SingleFlight.stats() == {"executed": 2, "coalesced": 0, "in_flight": 0}
+
+
+def test_key_normalizes_parameter_order():
+    assert SingleFlight.key("SELECT 1", {"a": 1, "b": 2}) == SingleFlight.key("SELECT 1", {"b": 2, "a": 1})
+    assert SingleFlight.key("SELECT 1", {"a": 1}) != SingleFlight.key("SELECT 1", {"a": 2})
+    assert SingleFlight.key("SELECT 1") == SingleFlight.key("SELECT 1", {})